@@ -0,0 +1,277 @@
+"""
+Headless HTTP API for ingest, retrieval, chat and ESG scoring
+
+Run with:
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+
+Replicas are independent of the Streamlit UI. They share ingest outputs
+and the job table through DATA_DIR, so point every replica at the same
+volume. Each job records the worker process running it; a worker starting
+up only fails unfinished jobs of workers on its host that have exited.
+"""
+import asyncio
+from typing import Optional
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from pydantic import BaseModel
+from models.llm import get_llm
+from utils.rag_engine import get_index_registry
+from utils.chat_pipeline import answer_query, stream_answer
+from utils.esg_scorer import generate_score_summary, analyze_esg_gaps
+from utils.job_queue import get_job_queue, content_hash
+from utils.score_store import get_score_store
+from utils.precompute import submit_precompute_job, lookup_answer
+from utils.report_analysis import analyze_report
+from utils.metrics import render_prometheus
+from config.config import TOP_K_RESULTS, API_WORKERS, API_JOB_TIMEOUT, JOB_POLL_INTERVAL
+
+app = FastAPI(title="ESG Risk Intelligence API")
+
+# Retrieval and LLM calls are blocking; run them off the event loop
+_pool = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="esg-api")
+_llm = None
+
+
+class RetrieveRequest(BaseModel):
+    query: str
+    top_k: int = TOP_K_RESULTS
+
+
+class ChatRequest(BaseModel):
+    query: str
+    response_mode: str = "Concise"
+    use_web_search: bool = True
+    top_k: int = TOP_K_RESULTS
+    stream: bool = True
+    whole_report: bool = False
+    session_id: Optional[str] = None  # Fair-scheduling key; defaults to the document
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the API worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool, partial(func, *args, **kwargs))
+
+
+_END = object()
+
+
+def _close_generator(generator, pending=None):
+    """Close a blocking generator once its in-progress next() (if any) has returned"""
+    if pending is not None:
+        wait([pending])
+    generator.close()
+
+
+async def iterate_blocking(generator):
+    """
+    Iterate a blocking generator on the API worker pool
+
+    The generator is closed as soon as the stream ends or is abandoned (e.g.
+    the client disconnects), so an LLM stream gives its scheduler slot back
+    right away instead of at garbage collection.
+
+    Args:
+        generator: Sync generator, e.g. from stream_answer
+
+    Yields:
+        Items of the generator
+    """
+    pending = None
+    try:
+        while True:
+            pending = _pool.submit(next, generator, _END)
+            item = await asyncio.wrap_future(pending)
+            pending = None
+            if item is _END:
+                return
+            yield item
+    finally:
+        _pool.submit(_close_generator, generator, pending)
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that closes its body iterator however the response ends"""
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+
+async def get_job(job_id):
+    """Look up a job off the event loop (the SQLite job table waits on worker writes)"""
+    return await run_blocking(lambda: get_job_queue().get(job_id))
+
+
+async def submit_job(kind, payload, key):
+    """Submit a job off the event loop"""
+    return await run_blocking(lambda: get_job_queue().submit(kind, payload, key=key))
+
+
+async def submit_precompute(doc_id, ingest_result):
+    """Queue the standard questions for an ingested document off the event loop"""
+    return await run_blocking(lambda: submit_precompute_job(get_job_queue(), doc_id, ingest_result))
+
+
+async def wait_for_job(job_id, timeout=API_JOB_TIMEOUT):
+    """Poll a background job without blocking the event loop"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = await get_job(job_id)
+        if job is None or job["status"] in ("done", "failed"):
+            return job
+        if asyncio.get_running_loop().time() > deadline:
+            return job
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+def get_shared_llm():
+    """LLM manager shared by all requests of this worker"""
+    global _llm
+    if _llm is None:
+        _llm = get_llm()
+    return _llm
+
+
+async def load_engine(doc_id):
+    """Get the RAG engine for an ingested document, or raise an HTTP error"""
+    job = await get_job(f"ingest:{doc_id}")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown document")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=422, detail=job["error"])
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Document is still processing ({job['progress']}%)")
+
+    result = job["result"]
+    engine = await run_blocking(get_index_registry().get_or_load, doc_id, result["store_path"], result["embeddings_path"])
+    if engine is None:
+        raise HTTPException(status_code=500, detail="Failed to load document index")
+    return engine
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_prometheus())
+
+
+@app.post("/documents")
+async def ingest(request: Request, wait: bool = False):
+    """
+    Ingest a PDF sent as the raw request body
+
+    Returns the document id (content hash). Identical uploads share one ingest job.
+    """
+    pdf_bytes = await request.body()
+    if not pdf_bytes:
+        raise HTTPException(status_code=400, detail="Empty request body")
+
+    doc_id = await run_blocking(content_hash, pdf_bytes)
+    job_id = await submit_job("ingest", pdf_bytes, key=doc_id)
+    job = await wait_for_job(job_id) if wait else await get_job(job_id)
+    if job["status"] == "done":
+        await submit_precompute(doc_id, job["result"])
+    return {"doc_id": doc_id, "status": job["status"], "progress": job["progress"], "error": job["error"]}
+
+
+@app.get("/documents/{doc_id}")
+async def document_status(doc_id: str):
+    job = await get_job(f"ingest:{doc_id}")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown document")
+    if job["status"] == "done":
+        await submit_precompute(doc_id, job["result"])
+    return {
+        "doc_id": doc_id,
+        "status": job["status"],
+        "progress": job["progress"],
+        "message": job["message"],
+        "num_chunks": (job["result"] or {}).get("num_chunks"),
+        "error": job["error"],
+    }
+
+
+@app.post("/documents/{doc_id}/retrieve")
+async def retrieve(doc_id: str, body: RetrieveRequest):
+    engine = await load_engine(doc_id)
+    results = await run_blocking(engine.retrieve_with_metadata, body.query, body.top_k)
+    return {"doc_id": doc_id, "results": results}
+
+
+@app.post("/documents/{doc_id}/chat")
+async def chat(doc_id: str, body: ChatRequest):
+    engine = await load_engine(doc_id)
+    llm = (await run_blocking(get_shared_llm)).bind(session_id=body.session_id or doc_id)
+
+    if body.whole_report:
+        response = await run_blocking(analyze_report, body.query, llm, engine.store, doc_id, body.response_mode)
+        if body.stream:
+            return StreamingResponse(iter([response]), media_type="text/plain; charset=utf-8")
+        return {"doc_id": doc_id, "response": response, "precomputed": False}
+
+    precomputed = await run_blocking(lambda: lookup_answer(get_job_queue(), doc_id, body.query, body.response_mode))
+    if precomputed is not None:
+        if body.stream:
+            return StreamingResponse(iter([precomputed]), media_type="text/plain; charset=utf-8")
+        return {"doc_id": doc_id, "response": precomputed, "precomputed": True}
+
+    kwargs = dict(
+        rag_engine=engine,
+        use_web_search=body.use_web_search,
+        response_mode=body.response_mode,
+        top_k=body.top_k,
+    )
+
+    if body.stream:
+        return ClosingStreamingResponse(
+            iterate_blocking(stream_answer(body.query, llm, **kwargs)), media_type="text/plain; charset=utf-8"
+        )
+
+    response = await run_blocking(answer_query, body.query, llm, **kwargs)
+    return {"doc_id": doc_id, "response": response, "precomputed": False}
+
+
+@app.post("/documents/{doc_id}/score")
+async def score(doc_id: str, wait: bool = True, company: str = "", sector: str = "", year: int = 0):
+    """
+    Score a document; identical requests share one scoring job
+
+    The score is recorded with company, sector and year and compared with
+    earlier reports from the same sector and year. Parameters left out keep
+    the values recorded for the document earlier.
+    """
+    ingest_job = await get_job(f"ingest:{doc_id}")
+    if ingest_job is None or ingest_job["status"] != "done":
+        raise HTTPException(status_code=409, detail="Document is not ingested")
+
+    job_id = await submit_job("score", ingest_job["result"]["store_path"], key=doc_id)
+    job = await wait_for_job(job_id) if wait else await get_job(job_id)
+
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != "done":
+        return {"doc_id": doc_id, "status": job["status"], "progress": job["progress"]}
+
+    scores = job["result"]
+    score_store = get_score_store()
+    await run_blocking(score_store.add, doc_id, scores, company=company, sector=sector, year=year)
+    peer_stats = await run_blocking(
+        score_store.peer_stats, scores, sector=sector or None, year=year or None, exclude_doc_id=doc_id
+    )
+    return {
+        "doc_id": doc_id,
+        "status": "done",
+        "scores": scores,
+        "peers": peer_stats,
+        "summary": generate_score_summary(scores, peer_stats),
+        "gaps": analyze_esg_gaps(scores),
+    }
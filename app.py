@@ -1,12 +1,21 @@
 import streamlit as st
 from models.llm import get_llm
 from models.embeddings import get_embedding_model
-from utils.pdf_processor import process_pdf, extract_text_from_pdf
-from utils.rag_engine import get_rag_engine
-from utils.web_search import search_web, format_search_results
-from utils.esg_scorer import calculate_overall_esg_score, generate_score_summary, analyze_esg_gaps
-from config.config import CONCISE_MAX_TOKENS, DETAILED_MAX_TOKENS
+from utils.rag_engine import get_index_registry
+from utils.chat_pipeline import answer_query
+from utils.esg_scorer import generate_score_summary, analyze_esg_gaps
+from utils.job_queue import get_job_queue, content_hash
+from utils.score_store import get_score_store
+from utils.precompute import submit_precompute_job, lookup_answer
+from utils.report_analysis import analyze_report
+from utils.session_store import get_session_manager
+from utils.metrics import start_metrics_server
+from config.config import (
+    METRICS_ENABLED, METRICS_PORT, JOB_POLL_INTERVAL, APP_CACHE_MAX_DOCUMENTS, CHAT_RECENT_MESSAGES,
+    TOP_K_RESULTS
+)
 import time
+import uuid
 
 # Page configuration
 st.set_page_config(
@@ -15,17 +24,157 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize session state
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+# Metrics endpoint (started once per process, survives reruns)
+if METRICS_ENABLED and METRICS_PORT:
+    start_metrics_server(METRICS_PORT)
+
+# Initialize session state (heavy state - messages, score, chunks - lives in the session manager)
 if "rag_ready" not in st.session_state:
     st.session_state.rag_ready = False
 if "uploaded_file_name" not in st.session_state:
     st.session_state.uploaded_file_name = None
-if "full_text" not in st.session_state:
-    st.session_state.full_text = None
-if "esg_score" not in st.session_state:
-    st.session_state.esg_score = None
+if "doc_hash" not in st.session_state:
+    st.session_state.doc_hash = None
+if "store_path" not in st.session_state:
+    st.session_state.store_path = None
+if "embeddings_path" not in st.session_state:
+    st.session_state.embeddings_path = None
+if "ingest_job" not in st.session_state:
+    st.session_state.ingest_job = None
+if "score_job" not in st.session_state:
+    st.session_state.score_job = None
+if "score_to_chat" not in st.session_state:
+    # Score requested from the chat; its result is posted there when the job finishes
+    st.session_state.score_to_chat = False
+if "session_id" not in st.session_state:
+    # Fair share of the LLM scheduler is per session
+    st.session_state.session_id = uuid.uuid4().hex
+
+# Process-wide resources: created on the first run, shared by every session and rerun
+@st.cache_resource(show_spinner="Loading embedding model...")
+def load_embedding_model():
+    return get_embedding_model()
+
+@st.cache_resource
+def load_llm(provider):
+    """LLM client per provider; each session binds its own scheduling key to it"""
+    return get_llm(provider=provider)
+
+@st.cache_resource
+def load_index_registry():
+    return get_index_registry()
+
+@st.cache_resource
+def load_job_queue():
+    return get_job_queue()
+
+@st.cache_resource
+def load_score_store():
+    return get_score_store()
+
+@st.cache_resource
+def load_session_manager():
+    return get_session_manager()
+
+load_embedding_model()
+job_queue = load_job_queue()
+score_store = load_score_store()
+session_manager = load_session_manager()
+# Spilled to disk while idle, reloaded transparently on access
+session = session_manager.get(st.session_state.session_id)
+
+# Document data, keyed by upload content hash (finished job results never change)
+@st.cache_data(max_entries=APP_CACHE_MAX_DOCUMENTS, show_spinner=False)
+def finished_job_result(kind, doc_hash):
+    """Result of a document's finished job; raises LookupError (not cached) until it is done"""
+    job = job_queue.get(f"{kind}:{doc_hash}")
+    if job is None or job["status"] != "done":
+        raise LookupError(f"No finished {kind} job")
+    return job["result"]
+
+def job_result(kind, doc_hash):
+    """Cached result of a finished ingest or score job, or None"""
+    try:
+        return finished_job_result(kind, doc_hash)
+    except LookupError:
+        return None
+
+@st.cache_data(max_entries=APP_CACHE_MAX_DOCUMENTS, show_spinner=False)
+def cached_score_report(doc_hash, sector, year, store_version, _score):
+    """Score summary, peer percentile and recommendations; recomputed when the peer group or store changes"""
+    peer_stats = score_store.peer_stats(_score, sector=sector, year=year, exclude_doc_id=doc_hash)
+    summary = generate_score_summary(_score, peer_stats=peer_stats)
+    gaps = analyze_esg_gaps(_score)
+    return {
+        "response": summary + "\n\n### 📋 Recommendations:\n" + "\n".join(gaps),
+        "percentile": peer_stats["percentiles"]["overall"] if peer_stats else None,
+        "peers": peer_stats["peers"] if peer_stats else 0,
+    }
+
+def get_document_engine():
+    """RAG engine of the current document, loaded through the shared index registry"""
+    if not st.session_state.rag_ready:
+        return None
+    return load_index_registry().get_or_load(
+        st.session_state.doc_hash, st.session_state.store_path, st.session_state.embeddings_path
+    )
+
+def submit_score_job():
+    """Queue ESG scoring for the current document (identical requests share one job)"""
+    st.session_state.score_job = job_queue.submit(
+        "score", st.session_state.store_path, key=st.session_state.doc_hash
+    )
+
+def save_score(score):
+    """Keep a finished score in the session and record it for peer comparisons"""
+    session.esg_score = score
+    score_store.add(
+        st.session_state.doc_hash, score,
+        company=st.session_state.get("company", ""),
+        sector=st.session_state.get("sector", ""),
+        year=st.session_state.get("report_year", 0)
+    )
+
+def score_report(score):
+    """Score report for the current document and the peer group from the sidebar report details"""
+    return cached_score_report(
+        st.session_state.doc_hash,
+        st.session_state.get("sector") or None,
+        st.session_state.get("report_year") or None,
+        score_store.version(),
+        score
+    )
+
+def score_response(score):
+    """Chat response with the score summary, peer comparison and recommendations"""
+    return score_report(score)["response"]
+
+def poll_score_job():
+    """
+    Check the background score job once per rerun
+
+    A finished score is saved, and posted to the chat if it was requested there.
+
+    Returns:
+        dict: The job, or None if it finished or failed
+    """
+    job = job_queue.get(st.session_state.score_job)
+    if job["status"] not in ("done", "failed"):
+        return job
+    
+    st.session_state.score_job = None
+    if job["status"] == "done":
+        save_score(job["result"])
+        st.success("✅ ESG analysis complete!")
+        response = score_response(job["result"])
+    else:
+        st.error(f"Error during ESG scoring: {job['error']}")
+        response = "Failed to calculate ESG score. Please try again."
+    
+    if st.session_state.score_to_chat:
+        st.session_state.score_to_chat = False
+        session.messages.append({"role": "assistant", "content": response})
+    return None
 
 # Sidebar
 with st.sidebar:
@@ -45,6 +194,14 @@ with st.sidebar:
         help="Concise: Short summaries | Detailed: In-depth analysis"
     )
     
+    # Whole-report analysis
+    whole_report = st.checkbox(
+        "Whole-Report Analysis",
+        value=False,
+        help="Answer from summaries of every report section instead of the top matching chunks. "
+             "The first question on a report takes a while; later ones reuse the summaries."
+    )
+    
     st.divider()
     
     # PDF Upload
@@ -57,74 +214,72 @@ with st.sidebar:
     
     if uploaded_file:
         if st.session_state.uploaded_file_name != uploaded_file.name:
-            with st.spinner("Processing PDF..."):
-                try:
-                    # Extract full text for scoring
-                    full_text = extract_text_from_pdf(uploaded_file)
-                    st.session_state.full_text = full_text
-                    
-                    # Reset file pointer for chunk processing
-                    uploaded_file.seek(0)
-                    
-                    # Process PDF
-                    chunks = process_pdf(uploaded_file)
-                    
-                    if chunks:
-                        # Build RAG index
-                        rag_engine = get_rag_engine()
-                        success = rag_engine.build_index(chunks)
-                        
-                        if success:
-                            st.session_state.rag_ready = True
-                            st.session_state.uploaded_file_name = uploaded_file.name
-                            st.success(f"✅ Processed: {uploaded_file.name}")
-                            st.info(f"📊 Created {len(chunks)} text chunks")
-                        else:
-                            st.error("Failed to build RAG index")
-                    else:
-                        st.error("Failed to process PDF")
-                        
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
+            # Ingest in the background - re-uploading the same report reuses the same job
+            pdf_bytes = uploaded_file.getvalue()
+            st.session_state.doc_hash = content_hash(pdf_bytes)
+            st.session_state.ingest_job = job_queue.submit("ingest", pdf_bytes, key=st.session_state.doc_hash)
+            st.session_state.uploaded_file_name = uploaded_file.name
+            st.session_state.rag_ready = False
+            st.session_state.score_job = None
+            st.session_state.score_to_chat = False
+            session.esg_score = None
+            session.set_document(None)
+    
+    # Report details used to record the score and pick its peers
+    with st.expander("🏢 Report details (for peer comparison)"):
+        st.text_input("Company", key="company")
+        st.text_input("Sector", key="sector", help="Scores are compared with reports from the same sector")
+        st.number_input("Report year", key="report_year", min_value=0, max_value=2100, value=0, help="0 = any year")
+    
+    # Poll the ingest job instead of blocking the session
+    if st.session_state.ingest_job:
+        job = job_queue.get(st.session_state.ingest_job)
+        if job["status"] == "done":
+            st.session_state.ingest_job = None
+            result = job["result"]
+            engine = load_index_registry().get_or_load(
+                st.session_state.doc_hash, result["store_path"], result["embeddings_path"]
+            )
+            
+            if engine is not None:
+                session.set_document(result["store_path"])
+                st.session_state.store_path = result["store_path"]
+                st.session_state.embeddings_path = result["embeddings_path"]
+                st.session_state.rag_ready = True
+                # Answer the standard questions in the background
+                submit_precompute_job(job_queue, st.session_state.doc_hash, result)
+                st.success(f"✅ Processed: {st.session_state.uploaded_file_name}")
+                st.info(f"📊 Created {len(engine.store)} text chunks")
+            else:
+                st.error("Failed to build RAG index")
+        elif job["status"] == "failed":
+            st.session_state.ingest_job = None
+            st.error(f"Failed to process PDF: {job['error']}")
+        else:
+            st.progress(job["progress"] / 100, text=job["message"])
     
     if st.session_state.rag_ready:
         st.success("✅ RAG System Ready")
         
         # Add ESG Score button
         if st.button("📊 Calculate ESG Score", use_container_width=True):
-            if st.session_state.full_text:
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                def update_progress(progress, message):
-                    progress_bar.progress(progress / 100)
-                    status_text.text(message)
-                
-                try:
-                    score_result = calculate_overall_esg_score(
-                        st.session_state.full_text,
-                        progress_callback=update_progress,
-                        use_parallel=True
-                    )
-                    if score_result:
-                        st.session_state.esg_score = score_result
-                        progress_bar.empty()
-                        status_text.empty()
-                        st.success("✅ ESG analysis complete!")
-                        st.rerun()
-                    else:
-                        st.error("Failed to calculate ESG score")
-                except Exception as e:
-                    st.error(f"Error during ESG scoring: {str(e)}")
-                finally:
-                    progress_bar.empty()
-                    status_text.empty()
+            if job_result("score", st.session_state.doc_hash):
+                # Scored before (in any session) - reuse it
+                save_score(job_result("score", st.session_state.doc_hash))
+            elif session.chunk_store:
+                submit_score_job()
             else:
                 st.warning("Please upload an ESG report pdf first.")
+        
+        # Poll the score job (requested here or from the chat)
+        if st.session_state.score_job:
+            job = poll_score_job()
+            if job:
+                st.progress(job["progress"] / 100, text=job["message"])
   
         # Display score if available
-        if st.session_state.esg_score:
-            score = st.session_state.esg_score
+        if session.esg_score:
+            score = session.esg_score
             st.metric(
                 label="Overall ESG Score",
                 value=f"{score['overall_score']}/5.0",
@@ -138,6 +293,10 @@ with st.sidebar:
                 st.metric("👥 Social", f"{score['social']['score']}/5")
             with col3:
                 st.metric("🏛️ Governance", f"{score['governance']['score']}/5")
+            
+            report = score_report(score)
+            if report["peers"]:
+                st.caption(f"📈 Better than {report['percentile']}% of {report['peers']} peer reports")
     
     st.divider()
     
@@ -152,7 +311,7 @@ with st.sidebar:
     
     # Clear chat
     if st.button("🗑️ Clear Chat"):
-        st.session_state.messages = []
+        session.clear_messages()
         st.rerun()
 
 # Main content
@@ -178,78 +337,59 @@ with st.expander("💡 Example Queries"):
     - "Identify compliance gaps"
     """)
 
-# Display chat messages
-for message in st.session_state.messages:
+# Display chat messages: only the most recent ones on every rerun, older ones on request
+# (messages beyond the session's memory budget are archived to disk)
+messages = session.messages
+collapsed = max(0, len(messages) - CHAT_RECENT_MESSAGES)
+if session.archived + collapsed and st.toggle(f"🗄️ Show {session.archived + collapsed} earlier messages"):
+    for message in session.archived_messages() + messages[:collapsed]:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+for message in messages[collapsed:]:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
 # Chat input
 if prompt := st.chat_input("Ask about ESG risks, sustainability metrics, or regulations..."):
     # Add user message
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    session.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user"):
         st.markdown(prompt)
     
     # Check for special commands (calculate score via chat)
     if prompt.lower() in ["calculate score", "esg score", "show score", "analyze score"]:
         with st.chat_message("assistant"):
-            if st.session_state.esg_score:
+            if session.esg_score:
                 # Use existing score
-                summary = generate_score_summary(st.session_state.esg_score)
-                gaps = analyze_esg_gaps(st.session_state.esg_score)
-                
-                response = summary + "\n\n### 📋 Recommendations:\n" + "\n".join(gaps)
+                response = score_response(session.esg_score)
                 st.markdown(response)
                 
-                st.session_state.messages.append({
+                session.messages.append({
                     "role": "assistant",
                     "content": response
                 })
-            elif st.session_state.full_text:
-                # Calculate new score with real-time progress in chat
-                progress_placeholder = st.empty()
-                
-                with progress_placeholder.container():
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-                    
-                    def update_progress(progress, message):
-                        progress_bar.progress(progress / 100)
-                        status_text.text(message)
-                    
-                    score_result = calculate_overall_esg_score(
-                        st.session_state.full_text,
-                        progress_callback=update_progress,
-                        use_parallel=True
-                    )
-                    
-                    # Clear progress UI
-                    progress_placeholder.empty()
+            elif job_result("score", st.session_state.doc_hash):
+                # Scored before (in any session) - reuse it
+                score_result = job_result("score", st.session_state.doc_hash)
+                save_score(score_result)
+                response = score_response(score_result)
+                st.markdown(response)
                 
-                if score_result:
-                    st.session_state.esg_score = score_result
-                    
-                    summary = generate_score_summary(score_result)
-                    gaps = analyze_esg_gaps(score_result)
-                    
-                    response = summary + "\n\n### 📋 Recommendations:\n" + "\n".join(gaps)
-                    st.markdown(response)
-                    
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": response
-                    })
-                else:
-                    error_msg = "Failed to calculate ESG score. Please try again."
-                    st.error(error_msg)
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": error_msg
-                    })
+                session.messages.append({
+                    "role": "assistant",
+                    "content": response
+                })
+            elif session.chunk_store:
+                # Score in the background; the sidebar polls the job across reruns
+                # and posts the result to the chat when it finishes
+                submit_score_job()
+                st.session_state.score_to_chat = True
+                st.info("⏳ Calculating the ESG score in the background. The result will appear here when it's ready.")
             else:
                 error_msg = "Please upload an ESG report first to calculate the score."
                 st.error(error_msg)
-                st.session_state.messages.append({
+                session.messages.append({
                     "role": "assistant",
                     "content": error_msg
                 })
@@ -258,81 +398,61 @@ if prompt := st.chat_input("Ask about ESG risks, sustainability metrics, or regu
         with st.chat_message("assistant"):
             with st.spinner("Analyzing..."):
                 try:
-                    llm = get_llm(provider=llm_provider)
-                    context_parts = []
-
-                    # RAG context
-                    if st.session_state.rag_ready:
-                        rag_engine = get_rag_engine()
-                        relevant_chunks = rag_engine.retrieve(prompt, top_k=3)
-
-                        if relevant_chunks:
-                            context_parts.append("=== Document Context ===")
-                            context_parts.append("\n\n".join(relevant_chunks))
-
-                    # Web search context
-                    if use_web_search and any(
-                        keyword in prompt.lower()
-                        for keyword in ["latest", "recent", "current", "news", "regulation", "2025", "2024"]
-                    ):
-                        search_results = search_web(f"ESG {prompt}", max_results=3)
-                        if search_results:
-                            context_parts.append(format_search_results(search_results))
+                    llm = load_llm(llm_provider).bind(session_id=st.session_state.session_id)
                     
-                    # Build Prompt
-                    max_tokens = (
-                        CONCISE_MAX_TOKENS 
-                        if response_mode == "Concise" 
-                        else DETAILED_MAX_TOKENS
-                    )
-
-                    system_context = (
-                        "\n\n".join(context_parts) 
-                        if context_parts 
-                        else "No additional context available."
-                    )
-
-                    if response_mode == "Concise":
-                        mode_instruction = (
-                            "Provide a concise, brief response (2-4 sentences). "
-                            "Focus on key insights only."
-                        )
-                    else:
-                        mode_instruction = (
-                            "Provide a detailed, comprehensive analysis with specific metrics, "
-                            "data points, and actionable insights."
-                        )
+                    # Standard questions are answered ahead of time after ingest
+                    response = None
+                    if st.session_state.rag_ready and not whole_report:
+                        response = lookup_answer(job_queue, st.session_state.doc_hash, prompt, response_mode)
                     
-                    full_prompt = f"""You are an ESG (Environmental, Social, Governance) risk analyst. Analyze the following query and provide insights.    
-Context:
-{system_context}
-
-Query: {prompt}
-
-Instructions:
-- {mode_instruction}
-- If analyzing a report, focus on ESG risks, strengths, and gaps
-- Provide specific metrics and data when available
-- Be objective and evidence-based
-- If asked for a score, use a 1-5 scale (1=High Risk, 5=Low Risk)
-
-Response:"""
+                    if whole_report and st.session_state.rag_ready:
+                        # Map-reduce over the whole report, with progress shown in the chat
+                        progress_bar = st.progress(0)
+                        status_text = st.empty()
+                        
+                        def update_progress(progress, message):
+                            progress_bar.progress(progress / 100)
+                            status_text.text(message)
+                        
+                        response = analyze_report(
+                            prompt,
+                            llm,
+                            session.chunk_store,
+                            st.session_state.doc_hash,
+                            response_mode=response_mode,
+                            progress_callback=update_progress
+                        )
+                        progress_bar.empty()
+                        status_text.empty()
+                    elif response is None:
+                        rag_engine = get_document_engine()
 
-                    # Generate response
-                    response = llm.generate_response(full_prompt, max_tokens=max_tokens)
+                        # Retrieve context, build the prompt (with the conversation so far) and generate the response
+                        response = answer_query(
+                            prompt,
+                            llm,
+                            rag_engine=rag_engine,
+                            use_web_search=use_web_search,
+                            response_mode=response_mode,
+                            top_k=TOP_K_RESULTS,
+                            memory=session.conversation
+                        )
 
                     # Display response
                     st.markdown(response)
+                    
+                    # Remember the turn for follow-ups; older turns are summarized in the background
+                    session.conversation.add_turn(prompt, response, llm)
 
                     # Add to chat history
-                    st.session_state.messages.append({
+                    session.messages.append({
                         "role": "assistant",
                         "content": response
                     })
                 except Exception as e:
                     error_msg = f"Error generating response: {str(e)}"
                     st.error(error_msg)
-                    st.session_state.messages.append({
+                    session.messages.append({
                         "role": "assistant",
                         "content": error_msg
                     })
@@ -346,4 +466,12 @@ st.markdown(
 </div>
 """,
     unsafe_allow_html=True
-)
\ No newline at end of file
+)
+
+# Apply per-session and global memory budgets; idle sessions are spilled to disk
+session_manager.enforce(current=st.session_state.session_id)
+
+# Keep polling while background jobs run (the rest of the page stays interactive)
+if st.session_state.ingest_job or st.session_state.score_job:
+    time.sleep(JOB_POLL_INTERVAL)
+    st.rerun()
\ No newline at end of file
@@ -0,0 +1,305 @@
+"""
+Concurrent-session load test for the chat path
+
+Drives N headless sessions through ingest and the app's chat flow
+(retrieve -> optional search -> prompt build -> LLM) against a local fake
+Groq endpoint and a stub search backend.
+
+Usage:
+    python -m benchmarks.load_test --sessions 16 --turns 5 --llm-latency 0.8
+    python -m benchmarks.load_test --sessions 16 --engine shared
+
+By default every session's document gets its own RAGEngine, as with the
+IndexRegistry used by app.py and api.py. With --engine shared every
+session ingests into the single get_rag_engine() instance instead, so the
+report shows how often a session gets context from another session's
+document.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from benchmarks.synthetic import generate_esg_pages
+from benchmarks.mocks import fake_search_web, fake_fetch_pages, install_fake_embeddings, FakeLLM
+
+SESSION_QUERIES = [
+    "Analyze the ESG risks in this report",
+    "What is the company's carbon emission reduction target?",
+    "Evaluate the diversity and inclusion metrics",
+    "What are the latest ESG regulations in 2025?",
+    "Identify compliance gaps",
+]
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    """Answers OpenAI-style chat completion requests after a configurable delay"""
+
+    latency = 0.5
+    jitter = 0.1
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        body = json.dumps({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "Synthetic ESG analysis from the fake endpoint."},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 8, "total_tokens": 8},
+        }).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_groq(latency=0.5, jitter=0.1, host="127.0.0.1", port=0):
+    """
+    Start a local fake Groq endpoint on a background thread
+
+    Args:
+        latency (float): Mean response delay in seconds
+        jitter (float): Uniform jitter around the delay
+        host (str): Interface to bind
+        port (int): Port (0 picks a free one)
+
+    Returns:
+        tuple: (server, base_url)
+    """
+    handler = type("ConfiguredFakeGroqHandler", (FakeGroqHandler,), {"latency": latency, "jitter": jitter})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def session_marker(session_id):
+    return f"sessionmarker{session_id:04d}"
+
+
+def run_session(session_id, engine, llm, args, report, barrier):
+    """
+    Run one headless analyst session: ingest a document, then chat
+
+    Args:
+        session_id (int): Session number
+        engine (RAGEngine): Engine used by this session (may be shared)
+        llm: LLMManager or FakeLLM
+        args: Parsed command-line arguments
+        report (dict): Shared report to append results to
+        barrier (threading.Barrier): Starts all sessions together
+    """
+    from utils.pdf_processor import split_text_into_spans, join_pages
+    from utils.chunk_store import ChunkStore
+    from utils.chat_pipeline import build_context, build_prompt, max_tokens_for_mode
+
+    marker = session_marker(session_id)
+    pages = generate_esg_pages(num_pages=args.pages, seed=session_id, company=f"Company {marker}")
+    # Tag every page so retrieved context can be traced back to its session's document
+    pages = [f"{page}\nDocument {marker}." for page in pages]
+    text, page_starts = join_pages(pages)
+    store = ChunkStore.from_spans(text, split_text_into_spans(text, page_starts))
+    messages = []
+    llm = llm.bind(session_id=f"session-{session_id}")
+
+    barrier.wait()
+
+    start = time.perf_counter()
+    engine.build_index(store)
+    ingest_s = time.perf_counter() - start
+
+    turns = []
+    for turn in range(args.turns):
+        query = SESSION_QUERIES[(session_id + turn) % len(SESSION_QUERIES)]
+        messages.append({"role": "user", "content": query})
+
+        t0 = time.perf_counter()
+        context_parts = build_context(query, engine, use_web_search=True, top_k=3,
+                                      search_fn=fake_search_web, fetch_fn=fake_fetch_pages)
+        t1 = time.perf_counter()
+        full_prompt = build_prompt(query, context_parts, "Concise")
+        t2 = time.perf_counter()
+        response = llm.generate_response(full_prompt, max_tokens=max_tokens_for_mode("Concise"))
+        t3 = time.perf_counter()
+
+        messages.append({"role": "assistant", "content": response})
+        context_text = "\n".join(context_parts)
+        turns.append({
+            "latency_s": t3 - t0,
+            "context_s": t1 - t0,
+            "prompt_s": t2 - t1,
+            "llm_s": t3 - t2,
+            "foreign_context": "sessionmarker" in context_text and marker not in context_text,
+            "mixed_context": marker in context_text and context_text.count("sessionmarker") > context_text.count(marker),
+        })
+
+        if args.think_time:
+            time.sleep(args.think_time)
+
+    with report["lock"]:
+        report["ingest_s"].append(ingest_s)
+        report["turns"].extend(turns)
+        report["messages"] += len(messages)
+
+
+def run_load_test(args):
+    """
+    Run the load test and build the summary report
+
+    Args:
+        args: Parsed command-line arguments
+
+    Returns:
+        dict: Summary report
+    """
+    if args.fake_embeddings:
+        install_fake_embeddings()
+
+    from utils.rag_engine import RAGEngine, get_rag_engine
+    from utils.metrics import enable_metrics, get_registry
+
+    enable_metrics(True, log_file=args.metrics_log)
+
+    server = None
+    if args.llm == "http":
+        import models.llm
+        from models.llm import LLMManager, LLMScheduler
+        # The fake endpoint has no quota; measure the app, not the default rate limit
+        models.llm._llm_scheduler = LLMScheduler(requests_per_minute=args.llm_rpm)
+        server, base_url = start_fake_groq(args.llm_latency, args.llm_jitter)
+        llm = LLMManager(api_key="fake-key", base_url=base_url)
+    else:
+        llm = FakeLLM(latency=args.llm_latency)
+
+    shared = get_rag_engine() if args.engine == "shared" else None
+    engines = [shared or RAGEngine() for _ in range(args.sessions)]
+
+    report = {"lock": threading.Lock(), "ingest_s": [], "turns": [], "messages": 0}
+    barrier = threading.Barrier(args.sessions)
+
+    tracemalloc.start()
+    baseline_bytes = tracemalloc.get_traced_memory()[0]
+    wall_start = time.perf_counter()
+
+    threads = [
+        threading.Thread(target=run_session, args=(i, engines[i], llm, args, report, barrier))
+        for i in range(args.sessions)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    wall_s = time.perf_counter() - wall_start
+    traced_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if server is not None:
+        server.shutdown()
+
+    distinct_engines = {id(e): e for e in engines}.values()
+    index_bytes = sum(e.index.ntotal * e.dimension * 4 for e in distinct_engines if e.index is not None)
+
+    turns = report["turns"]
+    latencies = [t["latency_s"] for t in turns]
+    summary = {
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "sessions": args.sessions,
+        "turns": len(turns),
+        "wall_s": round(wall_s, 3),
+        "throughput_turns_per_s": round(len(turns) / wall_s, 3) if wall_s else 0.0,
+        "latency_s": {
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(max(latencies, default=0.0), 4),
+        },
+        "stage_mean_s": {
+            stage: round(sum(t[f"{stage}_s"] for t in turns) / len(turns), 4) if turns else 0.0
+            for stage in ("context", "prompt", "llm")
+        },
+        "ingest_s": {
+            "p50": round(percentile(report["ingest_s"], 50), 4),
+            "max": round(max(report["ingest_s"], default=0.0), 4),
+        },
+        "memory": {
+            "python_bytes_per_session": int((traced_bytes - baseline_bytes) / args.sessions),
+            "python_peak_bytes": peak_bytes,
+            "index_bytes_per_session": int(index_bytes / args.sessions),
+        },
+        "correctness": {
+            "engine_mode": args.engine,
+            "turns_with_foreign_context": sum(t["foreign_context"] for t in turns),
+            "turns_with_mixed_context": sum(t["mixed_context"] for t in turns),
+        },
+        "stages": get_registry().snapshot()["stages"],
+    }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the chat path")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions")
+    parser.add_argument("--turns", type=int, default=5, help="Chat turns per session")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per synthetic report")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pause between turns (s)")
+    parser.add_argument("--engine", choices=["per-document", "shared"], default="per-document",
+                        help="per-document = one engine per document as in app.py; shared = one get_rag_engine()")
+    parser.add_argument("--llm", choices=["http", "inprocess"], default="http",
+                        help="http = LLMManager against the local fake Groq endpoint")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--llm-rpm", type=float, default=0, help="Scheduler rate limit for --llm http (0 = none)")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Use a hashing embedder (no model)")
+    parser.add_argument("--metrics-log", default="", help="File for JSON span logs (stderr if empty)")
+    parser.add_argument("--output", help="Where to save the JSON report")
+    args = parser.parse_args(argv)
+
+    summary = run_load_test(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"✅ Saved report to {args.output}")
+
+    lat = summary["latency_s"]
+    print(f"Sessions: {summary['sessions']}  turns: {summary['turns']}  wall: {summary['wall_s']} s")
+    print(f"Throughput: {summary['throughput_turns_per_s']} turns/s")
+    print(f"Latency p50 {lat['p50']} s  p95 {lat['p95']} s  p99 {lat['p99']} s")
+    print(f"Memory per session: {summary['memory']['python_bytes_per_session'] / 1e6:.2f} MB python, "
+          f"{summary['memory']['index_bytes_per_session'] / 1e6:.2f} MB index")
+
+    correctness = summary["correctness"]
+    if correctness["turns_with_foreign_context"] or correctness["turns_with_mixed_context"]:
+        print(f"❌ {correctness['turns_with_foreign_context']} turns answered from another session's document, "
+              f"{correctness['turns_with_mixed_context']} with mixed context ({correctness['engine_mode']} engine)")
+    else:
+        print("✅ Every turn used its own session's document")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
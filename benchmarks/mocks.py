@@ -0,0 +1,84 @@
+import re
+import time
+import zlib
+import numpy as np
+from config.config import EMBEDDING_DIMENSION
+
+_WORD = re.compile(r"\w+")
+
+
+class FakeLLM:
+    """Stand-in for LLMManager with a fixed latency and canned answer"""
+
+    def __init__(self, latency=0.0, answer="Synthetic ESG analysis."):
+        self.provider = "fake"
+        self.latency = latency
+        self.answer = answer
+        self.calls = 0
+
+    def bind(self, session_id=None, priority=None):
+        return self
+
+    def generate_response(self, prompt, max_tokens=500, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return f"{self.answer} ({len(prompt)} prompt chars)"
+
+    def get_provider_info(self):
+        return {"provider": self.provider, "model": "fake"}
+
+
+def fake_search_web(query, max_results=5):
+    """Stand-in for search_web returning deterministic results without network access"""
+    return [
+        {
+            "title": f"Result {i} for {query}",
+            "snippet": f"Synthetic snippet {i} about {query} and ESG disclosure rules.",
+            "link": f"https://example.com/{i}"
+        }
+        for i in range(1, max_results + 1)
+    ]
+
+
+def fake_fetch_pages(urls):
+    """Stand-in for fetch_pages returning a synthetic ESG page per URL without network access"""
+    from benchmarks.synthetic import generate_esg_pages
+    return [
+        {"url": url, "text": generate_esg_pages(num_pages=1, seed=zlib.crc32(url.encode()))[0]}
+        for url in urls
+    ]
+
+
+class HashEmbeddingModel:
+    """
+    Deterministic bag-of-words hashing embedder with the EmbeddingModel interface
+
+    Used with --fake-embeddings so index and retrieval benchmarks run without torch
+    or a model download. Its timings say nothing about the real encoder.
+    """
+
+    def __init__(self, dimension=EMBEDDING_DIMENSION):
+        self.dimension = dimension
+        self.tokenizer = None
+
+    def encode_texts(self, texts):
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in _WORD.findall(text.lower()):
+                embeddings[i, zlib.crc32(word.encode()) % self.dimension] += 1.0
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-9)
+
+    def encode_text(self, text):
+        return self.encode_texts([text])[0]
+
+    def get_embedding_dimension(self):
+        return self.dimension
+
+
+def install_fake_embeddings():
+    """Make get_embedding_model() return a HashEmbeddingModel"""
+    import models.embeddings as embeddings
+    embeddings._embedding_model = HashEmbeddingModel()
+    return embeddings._embedding_model
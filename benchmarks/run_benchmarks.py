@@ -0,0 +1,197 @@
+"""
+Offline benchmark suite for the ingest, retrieval and scoring hot paths
+
+Usage:
+    python -m benchmarks.run_benchmarks --pages 10 50 --output benchmarks/results.json
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json --threshold 0.15
+
+The LLM and web search are mocked, so no API key or network access is needed.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+from benchmarks.synthetic import generate_esg_pages, write_pdf
+from benchmarks.mocks import FakeLLM, fake_search_web, fake_fetch_pages, install_fake_embeddings
+
+DEFAULT_OUTPUT = os.path.join("benchmarks", "results.json")
+DEFAULT_THRESHOLD = 0.15
+BENCH_QUERIES = [
+    "What is the carbon emission reduction target?",
+    "Evaluate the diversity and inclusion metrics",
+    "What are the governance strengths and weaknesses?",
+]
+
+
+def time_call(func, repeat=5, warmup=1):
+    """
+    Time a zero-argument callable
+
+    Args:
+        func (callable): Function to time
+        repeat (int): Timed runs
+        warmup (int): Untimed runs first
+
+    Returns:
+        dict: min / median / mean seconds over the timed runs
+    """
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+
+    return {
+        "min_s": round(min(samples), 6),
+        "median_s": round(statistics.median(samples), 6),
+        "mean_s": round(statistics.fmean(samples), 6),
+        "runs": repeat,
+    }
+
+
+def run_suite(page_counts, repeat=5, keyword_density=0.05, fake_embeddings=False):
+    """
+    Run every benchmark for each synthetic report size
+
+    Args:
+        page_counts (list): Report sizes in pages
+        repeat (int): Timed runs per benchmark
+        keyword_density (float): ESG keyword density of the synthetic text
+        fake_embeddings (bool): Use the hashing embedder instead of the transformer model
+
+    Returns:
+        dict: Benchmark name -> timing stats
+    """
+    if fake_embeddings:
+        install_fake_embeddings()
+
+    from models.embeddings import get_embedding_model
+    from utils.pdf_processor import extract_text_from_pdf, split_text_into_chunks
+    from utils.rag_engine import RAGEngine
+    from utils.corpus_index import CorpusIndex
+    from utils.esg_scorer import calculate_overall_esg_score
+    from utils.chat_pipeline import answer_query
+
+    embedding_model = get_embedding_model()
+    llm = FakeLLM()
+    results = {}
+
+    for pages in page_counts:
+        page_texts = generate_esg_pages(num_pages=pages, keyword_density=keyword_density)
+        pdf_bytes = write_pdf(page_texts).getvalue()
+        text = "".join(page + "\n" for page in page_texts)
+        chunks = split_text_into_chunks(text)
+
+        def extract():
+            import io
+            extract_text_from_pdf(io.BytesIO(pdf_bytes))
+
+        engine = RAGEngine()
+        engine.build_index(chunks)
+
+        # Updating one page of a report in a corpus should not depend on the report size
+        corpus = CorpusIndex()
+        corpus.add_document("report", page_texts)
+        revisions = iter(range(10 ** 9))
+
+        def replace_page():
+            corpus.replace_pages("report", {1: f"{page_texts[0]}\nRevision {next(revisions)}."})
+
+        def chat_turn():
+            answer_query("What are the latest emission rules?", llm, rag_engine=engine,
+                         search_fn=fake_search_web, fetch_fn=fake_fetch_pages)
+
+        cases = {
+            "extract_text_from_pdf": extract,
+            "split_text_into_chunks": lambda: split_text_into_chunks(text),
+            "encode_texts": lambda: embedding_model.encode_texts(chunks),
+            "build_index": lambda: RAGEngine().build_index(chunks),
+            "retrieve": lambda: [engine.retrieve(q) for q in BENCH_QUERIES],
+            "retrieve_many": lambda: engine.retrieve_many(BENCH_QUERIES),
+            "calculate_overall_esg_score": lambda: calculate_overall_esg_score(text),
+            "calculate_overall_esg_score_semantic": lambda: calculate_overall_esg_score(text, embeddings=engine.embeddings),
+            "corpus_replace_page": replace_page,
+            "chat_turn_mocked": chat_turn,
+        }
+
+        for name, func in cases.items():
+            key = f"{name}[pages={pages}]"
+            print(f"🔄 {key}")
+            results[key] = time_call(func, repeat=repeat)
+            results[key]["chunks"] = len(chunks)
+
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Find benchmarks that got slower than the baseline
+
+    Args:
+        results (dict): Current benchmark results
+        baseline (dict): Baseline benchmark results
+        threshold (float): Allowed relative slowdown of the median (0.15 = 15%)
+
+    Returns:
+        list: (name, baseline_median, current_median, ratio) for each regression
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get("median_s"):
+            continue
+        ratio = current["median_s"] / previous["median_s"]
+        if ratio > 1 + threshold:
+            regressions.append((name, previous["median_s"], current["median_s"], round(ratio, 3)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ESG assistant offline benchmarks")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50], help="Synthetic report sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument("--keyword-density", type=float, default=0.05)
+    parser.add_argument("--fake-embeddings", action="store_true", help="Use a hashing embedder (no model)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to save results JSON")
+    parser.add_argument("--baseline", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.pages, args.repeat, args.keyword_density, args.fake_embeddings)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "fake_embeddings": args.fake_embeddings,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Saved results to {args.output}")
+
+    for name, stats in results.items():
+        print(f"{name:<50} median {stats['median_s'] * 1000:10.2f} ms")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        for name, before, after, ratio in regressions:
+            print(f"❌ {name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms ({ratio}x)")
+        if regressions:
+            return 1
+        print(f"✅ No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import io
+import random
+from utils.esg_scorer import ESG_SCORING_KEYWORDS
+
+FILLER_WORDS = [
+    "the", "company", "report", "year", "our", "we", "performance", "target", "group",
+    "operations", "strategy", "progress", "across", "sites", "total", "increase", "decrease",
+    "compared", "baseline", "percent", "million", "tonnes", "policy", "management", "global",
+    "business", "customers", "suppliers", "value", "chain", "annual", "results", "approach",
+]
+
+ESG_PHRASES = [
+    phrase
+    for category in ESG_SCORING_KEYWORDS.values()
+    for sentiment in category.values()
+    for phrase in sentiment
+]
+
+
+def generate_esg_pages(num_pages=20, words_per_page=400, keyword_density=0.05,
+                       company="Acme Holdings", year=2024, seed=0):
+    """
+    Generate synthetic ESG report pages
+
+    Args:
+        num_pages (int): Number of pages
+        words_per_page (int): Approximate words per page
+        keyword_density (float): Share of word slots filled with ESG keyword phrases
+        company (str): Company name used in headers
+        year (int): Report year used in headers
+        seed (int): Random seed, so runs are reproducible
+
+    Returns:
+        list: Page texts with a repeated header and footer, as real reports have
+    """
+    rng = random.Random(seed)
+    pages = []
+
+    for page_num in range(1, num_pages + 1):
+        lines = [f"{company} Sustainability Report {year}"]
+        paragraph, sentence, words = [], [], 0
+
+        while words < words_per_page:
+            if rng.random() < keyword_density:
+                sentence.append(rng.choice(ESG_PHRASES))
+            else:
+                sentence.append(rng.choice(FILLER_WORDS))
+            words += 1
+
+            if len(sentence) >= rng.randint(8, 20):
+                paragraph.append(" ".join(sentence).capitalize() + ".")
+                sentence = []
+            if len(paragraph) >= rng.randint(3, 6):
+                lines.append(" ".join(paragraph))
+                lines.append("")
+                paragraph = []
+
+        if sentence:
+            paragraph.append(" ".join(sentence).capitalize() + ".")
+        if paragraph:
+            lines.append(" ".join(paragraph))
+
+        lines.append(f"Page {page_num} of {num_pages}")
+        pages.append("\n".join(lines))
+
+    return pages
+
+
+def generate_esg_text(num_pages=20, words_per_page=400, keyword_density=0.05, seed=0):
+    """Generate a synthetic ESG report as one text (pages joined like the PDF extractor does)"""
+    pages = generate_esg_pages(num_pages, words_per_page, keyword_density, seed=seed)
+    return "".join(page + "\n" for page in pages)
+
+
+def _pdf_escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(line, width=95):
+    """Wrap a long line so it fits the page"""
+    words, current, out = line.split(), [], []
+    for word in words:
+        if current and len(" ".join(current + [word])) > width:
+            out.append(" ".join(current))
+            current = []
+        current.append(word)
+    out.append(" ".join(current))
+    return out
+
+
+def write_pdf(pages, output=None):
+    """
+    Write page texts as a minimal text-only PDF (no PDF library needed)
+
+    Args:
+        pages (list): Page texts
+        output: File path or binary file object (a BytesIO is created if None)
+
+    Returns:
+        io.BytesIO | None: The PDF buffer (rewound) when output is None
+    """
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(None)
+    pages_id = add(None)
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for page in pages:
+        lines = [wrapped for line in page.split("\n") for wrapped in _wrap(line)]
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        for line in lines:
+            ops.append(f"({_pdf_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", errors="replace")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, content_id)
+        ))
+
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    buffer = io.BytesIO()
+    buffer.write(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, 1):
+        offsets.append(buffer.tell())
+        buffer.write(b"%d 0 obj\n" % num + body + b"\nendobj\n")
+
+    xref = buffer.tell()
+    buffer.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        buffer.write(b"%010d 00000 n \n" % offset)
+    buffer.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref))
+
+    if output is None:
+        buffer.seek(0)
+        return buffer
+    if isinstance(output, str):
+        with open(output, "wb") as f:
+            f.write(buffer.getvalue())
+    else:
+        output.write(buffer.getvalue())
+    return None
@@ -0,0 +1,400 @@
+"""
+Offline tuning harness for chunk size, chunk overlap and top-k
+
+Sweeps chunking and retrieval settings over local reports with known
+question / answer-span pairs and reports recall@k next to index size,
+ingest time and query latency, marking the Pareto-optimal settings.
+
+Usage:
+    python -m benchmarks.tune_retrieval --dataset eval/dataset.json
+    python -m benchmarks.tune_retrieval --synthetic 30 --fake-embeddings
+    python -m benchmarks.tune_retrieval --dataset eval/dataset.json \\
+        --chunk-sizes 500 1000 1500 --overlaps 0 100 200 --top-k 1 3 5 --cache benchmarks/embedding_cache
+
+Dataset format (paths relative to the dataset file):
+    {
+      "reports": {"acme-2024": "reports/acme_2024.pdf", "globex": "reports/globex.txt"},
+      "questions": [
+        {"report": "acme-2024", "question": "What is the Scope 1 target?",
+         "answer": "reduce Scope 1 emissions by 42% by 2030"}
+      ]
+    }
+
+An answer must appear verbatim in the report text (whitespace and case are
+ignored). A question counts as a hit at k when one of the top-k chunks covers
+at least --min-overlap of the answer span.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import platform
+import statistics
+import numpy as np
+from benchmarks.synthetic import generate_esg_pages
+from benchmarks.mocks import install_fake_embeddings
+from config.config import CHUNK_SIZE, CHUNK_OVERLAP, TOP_K_RESULTS, EMBEDDING_MODEL
+
+DEFAULT_OUTPUT = os.path.join("benchmarks", "tuning_results.json")
+DEFAULT_CHUNK_SIZES = [500, CHUNK_SIZE, 1500]
+DEFAULT_OVERLAPS = [0, 100, CHUNK_OVERLAP]
+DEFAULT_TOP_K = [1, TOP_K_RESULTS, 5, 8]
+
+class EmbeddingCache:
+    """
+    Chunk embeddings keyed by model and chunk text, shared by all sweep settings
+
+    Settings that produce the same chunk (and repeated runs, with a cache
+    path) embed it once. Each entry keeps its measured encode time so ingest
+    time is reported as if nothing were cached.
+    """
+
+    def __init__(self, embedding_model, model_name, path=None):
+        """
+        Initialize the cache
+
+        Args:
+            embedding_model (EmbeddingModel): Model used for cache misses
+            model_name (str): Part of every key, so models never share entries
+            path (str): Directory to persist the cache in (optional)
+        """
+        self.embedding_model = embedding_model
+        self.model_name = model_name
+        self.path = path
+        self.vectors = {}
+        self.seconds = {}
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _key(self, text):
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _load(self):
+        if not self.path or not os.path.exists(os.path.join(self.path, "keys.json")):
+            return
+        with open(os.path.join(self.path, "keys.json")) as f:
+            meta = json.load(f)
+        vectors = np.load(os.path.join(self.path, "vectors.npy"))
+        for row, (key, seconds) in enumerate(zip(meta["keys"], meta["seconds"])):
+            self.vectors[key] = vectors[row]
+            self.seconds[key] = seconds
+        print(f"✅ Loaded {len(self.vectors)} cached embeddings")
+
+    def save(self):
+        if not self.path or not self.vectors:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        keys = list(self.vectors)
+        np.save(os.path.join(self.path, "vectors.npy"), np.stack([self.vectors[key] for key in keys]))
+        with open(os.path.join(self.path, "keys.json"), "w") as f:
+            json.dump({"keys": keys, "seconds": [self.seconds[key] for key in keys]}, f)
+
+    def encode(self, texts, batch_size=64):
+        """
+        Embed texts, encoding only the ones not cached yet
+
+        Args:
+            texts (list): Chunk texts
+            batch_size (int): Texts per encode_texts call on a miss
+
+        Returns:
+            tuple: (float32 embeddings, encode seconds the texts cost when first computed)
+        """
+        keys = [self._key(text) for text in texts]
+        missing = list({key: text for key, text in zip(keys, texts) if key not in self.vectors}.items())
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            began = time.perf_counter()
+            vectors = self.embedding_model.encode_texts([text for _, text in batch])
+            if vectors is None:
+                raise RuntimeError("Embedding failed")
+            per_text = (time.perf_counter() - began) / len(batch)
+            for (key, _), vector in zip(batch, np.asarray(vectors, dtype=np.float32)):
+                self.vectors[key] = vector
+                self.seconds[key] = per_text
+
+        embeddings = np.stack([self.vectors[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+        return embeddings, sum(self.seconds[key] for key in keys)
+
+
+def locate_answer(text, answer):
+    """
+    Character span of an answer in a report, ignoring whitespace and case
+
+    Args:
+        text (str): Report text
+        answer (str): Answer text
+
+    Returns:
+        tuple: (start, end) offsets in text, or None if the answer is not in it
+    """
+    words = answer.split()
+    if not words:
+        return None
+    pattern = r"\s+".join(re.escape(word) for word in words)
+    match = re.search(pattern, text, flags=re.IGNORECASE)
+    return match.span() if match else None
+
+
+def load_report(path):
+    """
+    Report text and page start offsets, from a PDF or a text file
+
+    Returns:
+        tuple: (text, page_starts); page_starts is None for text files
+    """
+    if path.lower().endswith(".pdf"):
+        from utils.pdf_processor import extract_pages_from_pdf, join_pages
+        with open(path, "rb") as f:
+            pages = extract_pages_from_pdf(f)
+        return join_pages(pages or [])
+    with open(path, encoding="utf-8") as f:
+        return f.read(), None
+
+
+def load_dataset(path):
+    """
+    Load reports and questions, resolving each answer to its span
+
+    Args:
+        path (str): Dataset JSON
+
+    Returns:
+        tuple: (reports: id -> (text, page_starts), questions: list of dicts with "span")
+    """
+    with open(path) as f:
+        dataset = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+
+    reports = {}
+    for report_id, report_path in dataset["reports"].items():
+        text, page_starts = load_report(os.path.join(base, report_path))
+        if not text:
+            print(f"❌ No text in report {report_id}")
+            continue
+        reports[report_id] = (text, page_starts)
+
+    questions = []
+    for question in dataset["questions"]:
+        report = reports.get(question["report"])
+        span = locate_answer(report[0], question["answer"]) if report else None
+        if span is None:
+            print(f"❌ Answer not found in {question['report']}: {question['answer'][:60]!r}")
+            continue
+        questions.append({**question, "span": span})
+
+    return reports, questions
+
+
+def synthetic_dataset(num_questions, num_pages=30, seed=0):
+    """
+    Synthetic report with questions asking about random sentences of it
+
+    Only meant to exercise the harness; tune on real reports.
+    """
+    rng = random.Random(seed)
+    pages = generate_esg_pages(num_pages=num_pages, seed=seed)
+    text = "".join(page + "\n" for page in pages)
+    sentences = [s.strip() for s in re.split(r"(?<=\.)\s", text) if len(s.split()) >= 10]
+
+    questions = []
+    for sentence in rng.sample(sentences, min(num_questions, len(sentences))):
+        words = sentence.rstrip(".").split()
+        # Paraphrase-ish question: a shuffled subset of the sentence's words
+        keep = rng.sample(words, max(4, len(words) // 2))
+        questions.append({
+            "report": "synthetic",
+            "question": "What does the report say about " + " ".join(keep) + "?",
+            "answer": sentence,
+            "span": locate_answer(text, sentence),
+        })
+    return {"synthetic": (text, None)}, questions
+
+
+def is_hit(chunks, span, min_overlap):
+    """Whether retrieved chunks cover at least min_overlap of the answer span"""
+    start, end = span
+    length = max(end - start, 1)
+    return any(
+        min(end, chunk_end) - max(start, chunk_start) >= min_overlap * length
+        for chunk_start, chunk_end in chunks
+    )
+
+
+def evaluate_setting(reports, questions, cache, chunk_size, chunk_overlap, top_ks, min_overlap, repeat):
+    """
+    Ingest every report with one chunking setting and evaluate every top-k
+
+    Returns:
+        list: One result dict per top-k
+    """
+    from utils.pdf_processor import split_text_into_spans
+    from utils.chunk_store import ChunkStore
+    from utils.rag_engine import RAGEngine
+
+    engines, spans_by_report = {}, {}
+    ingest_s, index_bytes, num_chunks = 0.0, 0, 0
+
+    for report_id, (text, page_starts) in reports.items():
+        began = time.perf_counter()
+        spans = split_text_into_spans(text, page_starts, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        store = ChunkStore.from_spans(text, spans)
+        chunk_s = time.perf_counter() - began
+
+        embeddings, embed_s = cache.encode([text[s.start:s.end] for s in spans])
+
+        began = time.perf_counter()
+        engine = RAGEngine()
+        if not engine.build_index_from_embeddings(store, embeddings):
+            raise RuntimeError(f"Index build failed for {report_id}")
+        index_s = time.perf_counter() - began
+
+        engines[report_id] = engine
+        spans_by_report[report_id] = [(s.start, s.end) for s in spans]
+        ingest_s += chunk_s + embed_s + index_s
+        index_bytes += engine.nbytes
+        num_chunks += len(spans)
+
+    results = []
+    for top_k in top_ks:
+        hits = 0
+        latencies = []
+        for question in questions:
+            engine = engines[question["report"]]
+            for _ in range(repeat):
+                began = time.perf_counter()
+                retrieved = engine.retrieve_with_metadata(question["question"], top_k=top_k)
+                latencies.append(time.perf_counter() - began)
+            chunks = [spans_by_report[question["report"]][chunk["index"]] for chunk in retrieved]
+            hits += is_hit(chunks, question["span"], min_overlap)
+
+        results.append({
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "top_k": top_k,
+            "recall": round(hits / len(questions), 4) if questions else 0.0,
+            "chunks": num_chunks,
+            "index_bytes": index_bytes,
+            "ingest_s": round(ingest_s, 4),
+            "query_latency_ms": round(1000 * statistics.median(latencies), 3) if latencies else 0.0,
+            # Prompt cost grows with the retrieved text
+            "context_chars": top_k * chunk_size,
+        })
+    return results
+
+
+def pareto_front(results, objectives=("recall", "index_bytes", "ingest_s", "query_latency_ms")):
+    """
+    Mark results no other result beats on every objective
+
+    Recall is maximized; every other objective is minimized.
+
+    Args:
+        results (list): Result dicts from evaluate_setting
+        objectives (tuple): Keys compared
+
+    Returns:
+        list: The same dicts, with "pareto" set
+    """
+    def vector(result):
+        return [result[key] if key == "recall" else -result[key] for key in objectives]
+
+    vectors = [vector(result) for result in results]
+    for result, v in zip(results, vectors):
+        result["pareto"] = not any(
+            all(a >= b for a, b in zip(other, v)) and any(a > b for a, b in zip(other, v))
+            for other in vectors
+        )
+    return results
+
+
+def run_sweep(reports, questions, chunk_sizes, overlaps, top_ks, cache, min_overlap=0.5, repeat=3):
+    """
+    Evaluate every chunk size / overlap / top-k combination
+
+    Returns:
+        list: Result dicts, Pareto-marked
+    """
+    results = []
+    for chunk_size in chunk_sizes:
+        for chunk_overlap in overlaps:
+            if chunk_overlap >= chunk_size:
+                continue
+            print(f"🔄 chunk_size={chunk_size} overlap={chunk_overlap}")
+            results.extend(evaluate_setting(
+                reports, questions, cache, chunk_size, chunk_overlap, top_ks, min_overlap, repeat
+            ))
+    return pareto_front(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune chunking and retrieval settings on labeled reports")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dataset", help="Dataset JSON with reports and question/answer pairs")
+    source.add_argument("--synthetic", type=int, metavar="N", help="Use N questions on a synthetic report")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=DEFAULT_CHUNK_SIZES)
+    parser.add_argument("--overlaps", type=int, nargs="+", default=DEFAULT_OVERLAPS)
+    parser.add_argument("--top-k", type=int, nargs="+", default=DEFAULT_TOP_K)
+    parser.add_argument("--min-overlap", type=float, default=0.5, help="Share of the answer a chunk must cover")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed retrievals per question")
+    parser.add_argument("--cache", help="Directory to keep chunk embeddings in between runs")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Use a hashing embedder (no model)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to save results JSON")
+    args = parser.parse_args(argv)
+
+    if args.fake_embeddings:
+        install_fake_embeddings()
+    from models.embeddings import get_embedding_model
+
+    if args.dataset:
+        reports, questions = load_dataset(args.dataset)
+    else:
+        reports, questions = synthetic_dataset(args.synthetic)
+    if not questions:
+        print("❌ No usable questions")
+        return 1
+
+    model_name = "hash" if args.fake_embeddings else EMBEDDING_MODEL
+    cache = EmbeddingCache(get_embedding_model(), model_name, args.cache)
+    results = run_sweep(
+        reports, questions, args.chunk_sizes, args.overlaps, args.top_k, cache, args.min_overlap, args.repeat
+    )
+    cache.save()
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "embedding_model": model_name,
+            "reports": len(reports),
+            "questions": len(questions),
+            "min_overlap": args.min_overlap,
+            "embedding_cache": {"hits": cache.hits, "misses": cache.misses},
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Saved results to {args.output}")
+
+    print(f"{'size':>6} {'overlap':>7} {'k':>3} {'recall':>7} {'chunks':>7} {'index MB':>9} {'ingest s':>9} {'query ms':>9}")
+    for r in sorted(results, key=lambda r: (-r["recall"], r["query_latency_ms"])):
+        print(
+            f"{r['chunk_size']:>6} {r['chunk_overlap']:>7} {r['top_k']:>3} {r['recall']:>7.3f} {r['chunks']:>7} "
+            f"{r['index_bytes'] / 1e6:>9.2f} {r['ingest_s']:>9.3f} {r['query_latency_ms']:>9.3f}"
+            + ("  * pareto" if r["pareto"] else "")
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
+GROQ_API_BASE = os.getenv("GROQ_API_BASE", "")  # Override the Groq endpoint (e.g. a local fake for load tests)
 
 
 
@@ -12,18 +13,110 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 DEFAULT_LLM_PROVIDER = "groq"  
 DEFAULT_MODEL = "llama-3.1-8b-instant"  
 
+# LLM Scheduler (shared by all sessions of a process)
+LLM_MAX_CONCURRENCY = int(os.getenv("ESG_LLM_MAX_CONCURRENCY", "8"))  # In-flight LLM calls
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("ESG_LLM_RPM", "30"))  # Groq free-tier limit; 0 = no rate limit
+LLM_BATCH_MAX_WAIT = 30  # Seconds before queued batch work goes ahead of interactive work
+
 # Embedding Model Configuration
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIMENSION = 384
+EMBEDDING_BATCH_SIZE = 64
+
+# Shared embedding server (optional)
+# When set, app workers act as thin clients to one process that owns the model
+# Start it with: python -m models.embedding_server
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", "")
+EMBEDDING_SERVER_THREADS = int(os.getenv("EMBEDDING_SERVER_THREADS", "0"))  # 0 = torch default
+EMBEDDING_SERVER_BATCH_SIZE = EMBEDDING_BATCH_SIZE
 
 # RAG Configuration
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
+CHUNK_LENGTH_UNIT = "chars"  # "chars" or "tokens" (counted with the embedding tokenizer)
 TOP_K_RESULTS = 3
+INDEX_REGISTRY_SIZE = int(os.getenv("ESG_INDEX_REGISTRY_SIZE", "32"))  # Document indexes kept in memory
+CORPUS_COMPACT_RATIO = 0.2  # Compact the multi-report index once this share of its vectors is removed
+CORPUS_COMPACT_MIN_TOMBSTONES = 256
+
+# Web Page Fetching (full text of search hits, merged into retrieval)
+WEB_FETCH_MAX_CONCURRENCY = 4
+WEB_FETCH_TIMEOUT = 8  # Seconds per page
+WEB_FETCH_MAX_BYTES = 2_000_000
+WEB_CACHE_TTL = int(os.getenv("ESG_WEB_CACHE_TTL", "3600"))  # Seconds before a cached page is revalidated
+WEB_EMBEDDING_CACHE_SIZE = 256  # Pages whose chunk embeddings are kept in memory
+
+# Ingest Deduplication
+DEDUP_ENABLED = True
+DEDUP_SIMILARITY_THRESHOLD = 0.85  # Estimated Jaccard similarity for near-duplicate chunks
+DEDUP_NUM_PERM = 64
+DEDUP_BANDS = 16
+DEDUP_SHINGLE_SIZE = 5  # Words per shingle
+BOILERPLATE_MIN_PAGE_FRACTION = 0.5  # Header/footer must repeat on this share of pages
+BOILERPLATE_EDGE_LINES = 3
+
+# Instrumentation (near-zero overhead when disabled)
+METRICS_ENABLED = os.getenv("ESG_METRICS", "0") == "1"
+METRICS_PORT = int(os.getenv("ESG_METRICS_PORT", "0"))  # 0 = no HTTP endpoint
+METRICS_LOG_FILE = os.getenv("ESG_METRICS_LOG", "")  # JSON log lines; stderr if empty
+
+# Conversation Memory (chat history sent with each prompt)
+MEMORY_RECENT_TURNS = 3  # Turns kept verbatim; older ones are folded into a rolling summary
+MEMORY_TOKEN_BUDGET = 800  # Max (estimated) tokens of history per prompt
+MEMORY_SUMMARY_MAX_TOKENS = 300
+MEMORY_FOLLOWUP_WORDS = 6  # Max words of a pronoun follow-up retrieved together with the previous question
+
+# Local data (job table, job outputs, caches)
+DATA_DIR = os.getenv("ESG_DATA_DIR", ".esg_data")
+
+# Session Memory (Streamlit chat history, score and chunk store per browser session)
+SESSION_MEMORY_BUDGET_MB = float(os.getenv("ESG_SESSION_MEMORY_MB", "32"))  # Older chat messages are archived to disk beyond this
+SESSION_GLOBAL_MEMORY_BUDGET_MB = float(os.getenv("ESG_SESSIONS_MEMORY_MB", "1024"))  # All sessions plus loaded document indexes
+SESSION_IDLE_SECONDS = int(os.getenv("ESG_SESSION_IDLE_SECONDS", "900"))  # Idle sessions are spilled to disk after this
+SESSION_RETENTION_SECONDS = 7 * 24 * 3600  # Spilled sessions older than this are deleted
+SESSION_MIN_MESSAGES = 10  # Most recent messages always kept in memory
+
+# Streamlit App Caching
+APP_CACHE_MAX_DOCUMENTS = 64  # Documents whose job results and score reports are cached across reruns
+CHAT_RECENT_MESSAGES = 20  # Messages rendered on every rerun; older ones are collapsed
+
+# Background Jobs
+JOB_MAX_WORKERS = int(os.getenv("ESG_JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = 0.5  # Seconds between UI polls while a job runs
+
+# HTTP API Configuration (api.py)
+API_WORKERS = int(os.getenv("ESG_API_WORKERS", "8"))  # Threads for blocking retrieval and LLM calls
+API_JOB_TIMEOUT = float(os.getenv("ESG_API_JOB_TIMEOUT", "600"))  # Max seconds a request waits for a job
+
+# Standard Questions (answered once per document after ingest, served instantly)
+PRECOMPUTE_ENABLED = os.getenv("ESG_PRECOMPUTE", "1") == "1"
+PRECOMPUTE_MAX_CONCURRENCY = 2  # Concurrent LLM calls per document
+PRECOMPUTE_RESPONSE_MODES = ["Concise", "Detailed"]
+PRECOMPUTE_MIN_SUCCESS_RATIO = 0.5  # Below this share of answered questions the job fails and can be rerun
+STANDARD_QUESTIONS = [
+    "Analyze the ESG risks in this report",
+    "What is the company's carbon emission reduction target?",
+    "Evaluate the diversity and inclusion metrics",
+    "What are the governance strengths and weaknesses?",
+    "Identify compliance gaps",
+]
+
+# Whole-Report Analysis (map-reduce over section summaries)
+ANALYSIS_SECTION_SIZE = 12000  # Characters per map-stage section
+ANALYSIS_MAX_CONCURRENCY = 4  # Parallel LLM calls
+ANALYSIS_REDUCE_FANIN = 6  # Summaries merged per reduce call
 
 # Response Mode Configuration
 CONCISE_MAX_TOKENS = 150
 DETAILED_MAX_TOKENS = 1000
 
+# ESG Scoring Configuration
+ESG_SECTION_SIZE = 20000  # Characters per scoring section (built from the RAG chunks)
+ESG_SEMANTIC_WEIGHT = 0.3  # Share of the embedding-based score when chunk embeddings are available (0 = keywords only)
+ESG_SEMANTIC_SCALE = 20.0  # Score points per unit of positive-minus-negative prototype similarity
+ESG_SEMANTIC_MIN_SIMILARITY = 0.25  # Chunks less similar than this to a category's prototypes don't count for it
+PEER_TOP_N = 5  # Top peers listed in the score summary
+
 # ESG Scoring Weights
 ESG_WEIGHTS = {
     "environmental": 0.35,
@@ -0,0 +1,164 @@
+import os
+import json
+import threading
+import numpy as np
+from multiprocessing.connection import Listener, Client
+from config.config import (
+    EMBEDDING_SERVER_SOCKET,
+    EMBEDDING_SERVER_THREADS,
+    EMBEDDING_SERVER_BATCH_SIZE,
+)
+
+# Wire protocol (one request per round trip over a Unix socket):
+#   client -> server: JSON header {"op": "encode", "texts": [...]}
+#   server -> client: JSON header {"ok": true, "shape": [n, dim], "dtype": "float32"}
+#                     followed by the raw vector buffer (or {"ok": false, "error": ...})
+
+
+class EmbeddingServer:
+    """Single process owning the embedding model, shared by all app workers"""
+
+    def __init__(self, socket_path=EMBEDDING_SERVER_SOCKET, num_threads=EMBEDDING_SERVER_THREADS):
+        """
+        Initialize the embedding server
+
+        Args:
+            socket_path (str): Unix socket path to listen on
+            num_threads (int): Torch intra-op threads (0 keeps the torch default)
+        """
+        if not socket_path:
+            raise ValueError("EMBEDDING_SERVER_SOCKET is not configured")
+
+        # Import lazily so the client side never pulls in torch through this module
+        import torch
+        from models.embeddings import EmbeddingModel
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        self.socket_path = socket_path
+        self.model = EmbeddingModel()
+        self._model_lock = threading.Lock()
+
+    def _encode(self, texts):
+        """Encode texts in bounded batches, one model call at a time"""
+        parts = []
+        with self._model_lock:
+            for i in range(0, len(texts), EMBEDDING_SERVER_BATCH_SIZE):
+                batch = self.model.encode_texts(texts[i:i + EMBEDDING_SERVER_BATCH_SIZE])
+                if batch is None:
+                    raise RuntimeError("Embedding model failed to encode batch")
+                parts.append(batch)
+
+        if not parts:
+            return np.zeros((0, self.model.get_embedding_dimension()), dtype=np.float32)
+        return np.ascontiguousarray(np.concatenate(parts).astype(np.float32, copy=False))
+
+    def _handle_connection(self, conn):
+        """Serve requests from one client connection until it closes"""
+        try:
+            while True:
+                try:
+                    request = json.loads(conn.recv_bytes())
+                except EOFError:
+                    break
+
+                try:
+                    if request.get("op") == "dimension":
+                        conn.send_bytes(json.dumps({
+                            "ok": True,
+                            "dimension": self.model.get_embedding_dimension()
+                        }).encode())
+                        continue
+
+                    embeddings = self._encode(request.get("texts", []))
+                    # Build the buffer before the ok header so a failure here is reported as an error.
+                    # A flat byte view avoids an extra copy and also works for a (0, dim) result.
+                    buffer = memoryview(embeddings.reshape(-1).view(np.uint8))
+                    conn.send_bytes(json.dumps({
+                        "ok": True,
+                        "shape": list(embeddings.shape),
+                        "dtype": "float32"
+                    }).encode())
+                    conn.send_bytes(buffer)
+                except Exception as e:
+                    conn.send_bytes(json.dumps({"ok": False, "error": str(e)}).encode())
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        """Accept client connections and serve each on its own thread"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        with Listener(self.socket_path, family="AF_UNIX") as listener:
+            print(f"✅ Embedding server listening on {self.socket_path}")
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+
+
+class EmbeddingClient:
+    """Thin client for a running EmbeddingServer"""
+
+    def __init__(self, socket_path=EMBEDDING_SERVER_SOCKET):
+        """
+        Initialize the client (connects lazily)
+
+        Args:
+            socket_path (str): Unix socket path of the server
+        """
+        self.socket_path = socket_path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = Client(self.socket_path, family="AF_UNIX")
+        return self._conn
+
+    def _request(self, payload):
+        """Send one request and return the decoded header and optional buffer"""
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.send_bytes(json.dumps(payload).encode())
+                header = json.loads(conn.recv_bytes())
+                if not header.get("ok"):
+                    raise RuntimeError(header.get("error", "unknown server error"))
+                buffer = conn.recv_bytes() if "shape" in header else None
+                return header, buffer
+            except (EOFError, OSError):
+                # Drop the broken connection so the next call reconnects
+                self.close()
+                raise
+
+    def encode(self, texts):
+        """
+        Encode texts on the server
+
+        Args:
+            texts (list): Texts to encode
+
+        Returns:
+            np.ndarray: float32 array of shape (len(texts), dim), a view on the received buffer
+        """
+        header, buffer = self._request({"op": "encode", "texts": list(texts)})
+        return np.frombuffer(buffer, dtype=header["dtype"]).reshape(header["shape"])
+
+    def dimension(self):
+        """Get the embedding dimension reported by the server"""
+        header, _ = self._request({"op": "dimension"})
+        return header["dimension"]
+
+    def close(self):
+        """Close the connection to the server"""
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            finally:
+                self._conn = None
+
+
+if __name__ == "__main__":
+    EmbeddingServer().serve_forever()
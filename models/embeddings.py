@@ -2,18 +2,38 @@
 
 
 
-import torch
-from transformers import AutoTokenizer, AutoModel
+from transformers import AutoTokenizer
 import numpy as np
+from config.config import EMBEDDING_MODEL, EMBEDDING_DIMENSION, EMBEDDING_SERVER_SOCKET
+from utils.metrics import timed, incr
 
 class EmbeddingModel:
     """Handles text embeddings using transformers"""
     
-    def __init__(self):
-        """Initialize the embedding model"""
+    def __init__(self, server_address=None):
+        """
+        Initialize the embedding model
+        
+        Args:
+            server_address (str): Unix socket of a shared embedding server (optional).
+                When given, no model is loaded in this process and encoding is delegated.
+        """
+        self.server = None
+        if server_address:
+            from models.embedding_server import EmbeddingClient
+            self.server = EmbeddingClient(server_address)
+            # The tokenizer is small and still needed locally for token-based chunking
+            self.tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+            self.model = None
+            print(f"✅ Embedding client using server at {server_address}")
+            return
+        
         try:
+            # AutoModel pulls in torch; thin clients never import it
+            from transformers import AutoModel
+            
             # Use a small, fast model
-            model_name = "sentence-transformers/all-MiniLM-L6-v2"
+            model_name = EMBEDDING_MODEL
             self.tokenizer = AutoTokenizer.from_pretrained(model_name)
             self.model = AutoModel.from_pretrained(model_name)
             self.model.eval()
@@ -24,13 +44,22 @@ class EmbeddingModel:
     
     def _mean_pooling(self, model_output, attention_mask):
         """Mean pooling to get sentence embeddings"""
+        import torch
+        
         token_embeddings = model_output[0]
         input_mask_expanded = attention_mask.unsqueeze(-1).expand(token_embeddings.size()).float()
         return torch.sum(token_embeddings * input_mask_expanded, 1) / torch.clamp(input_mask_expanded.sum(1), min=1e-9)
     
+    @timed("embed_query")
     def encode_text(self, text):
         """Encode a single text"""
+        if self.server is not None:
+            embeddings = self.encode_texts([text])
+            return embeddings[0] if embeddings is not None else None
+        
         try:
+            import torch
+            
             encoded_input = self.tokenizer(text, padding=True, truncation=True, return_tensors='pt', max_length=512)
             
             with torch.no_grad():
@@ -44,9 +73,20 @@ class EmbeddingModel:
             print(f"❌ Error encoding text: {e}")
             return None
     
+    @timed("embed")
     def encode_texts(self, texts):
         """Encode multiple texts"""
+        incr("texts_embedded", len(texts))
+        if self.server is not None:
+            try:
+                return self.server.encode(texts)
+            except Exception as e:
+                print(f"❌ Error encoding texts via embedding server: {e}")
+                return None
+        
         try:
+            import torch
+            
             encoded_input = self.tokenizer(texts, padding=True, truncation=True, return_tensors='pt', max_length=512)
             
             with torch.no_grad():
@@ -62,7 +102,7 @@ class EmbeddingModel:
     
     def get_embedding_dimension(self):
         """Get embedding dimension"""
-        return 384
+        return EMBEDDING_DIMENSION
 
 # Global instance
 _embedding_model = None
@@ -71,5 +111,8 @@ def get_embedding_model():
     """Get or create the global embedding model instance"""
     global _embedding_model
     if _embedding_model is None:
-        _embedding_model = EmbeddingModel()
+        incr("embedding_model_cache_misses")
+        _embedding_model = EmbeddingModel(server_address=EMBEDDING_SERVER_SOCKET or None)
+    else:
+        incr("embedding_model_cache_hits")
     return _embedding_model
\ No newline at end of file
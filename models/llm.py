@@ -1,54 +1,123 @@
+import copy
+import time
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from langchain_groq import ChatGroq
-from config.config import GROQ_API_KEY
+from config.config import (
+    GROQ_API_KEY, GROQ_API_BASE, LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_BATCH_MAX_WAIT
+)
+from utils.metrics import span, incr, observe, set_gauge
+
+# Scheduler priorities
+INTERACTIVE, BATCH = "interactive", "batch"
 
 class LLMManager:
     """Manages LLM provider"""
     
-    def __init__(self, provider="groq", model_name=None):
+    def __init__(self, provider="groq", model_name=None, api_key=None, base_url=None):
         """
         Initialize LLM
         
         Args:
             provider (str): "groq" (others available but we're using Groq)
             model_name (str): Specific model name (optional)
+            api_key (str): API key (defaults to GROQ_API_KEY)
+            base_url (str): API endpoint override (defaults to GROQ_API_BASE)
         """
         self.provider = provider
-        self.llm = self._initialize_llm(provider, model_name)
+        self.session_id = None
+        self.priority = INTERACTIVE
+        self.llm = self._initialize_llm(provider, model_name, api_key or GROQ_API_KEY, base_url or GROQ_API_BASE)
     
-    def _initialize_llm(self, provider, model_name):
+    def bind(self, session_id=None, priority=INTERACTIVE):
+        """
+        Copy of this manager whose calls are scheduled for a session and priority
+        
+        Args:
+            session_id (str): Session the calls are queued under for fair scheduling
+            priority (str): INTERACTIVE or BATCH
+            
+        Returns:
+            LLMManager: Manager sharing the same client
+        """
+        bound = copy.copy(self)
+        bound.session_id = session_id
+        bound.priority = priority
+        return bound
+    
+    def _initialize_llm(self, provider, model_name, api_key, base_url):
         """Initialize the LLM"""
         try:
-            if not GROQ_API_KEY:
+            if not api_key:
                 raise ValueError("Groq API key not found in .env file")
             
+            extra = {"groq_api_base": base_url} if base_url else {}
             return ChatGroq(
-                api_key=GROQ_API_KEY,
+                api_key=api_key,
                 model=model_name or "llama-3.1-8b-instant",
-                temperature=0.3
+                temperature=0.3,
+                **extra
             )
                 
         except Exception as e:
             print(f"❌ Error initializing LLM: {e}")
             raise
     
-    def generate_response(self, prompt, max_tokens=500):
+    def generate_response(self, prompt, max_tokens=500, priority=None):
         """
         Generate response from LLM
         
+        Calls go through the shared scheduler; identical prompts in flight at the
+        same time are answered by one upstream call.
+        
         Args:
             prompt (str): Input prompt
             max_tokens (int): Maximum tokens in response
+            priority (str): INTERACTIVE or BATCH (defaults to the bound priority)
             
         Returns:
             str: Generated response
         """
+        def call():
+            with span("llm", provider=self.provider, prompt_chars=len(prompt)):
+                return self.llm.invoke(prompt).content
+        
         try:
-            response = self.llm.invoke(prompt)
-            return response.content
+            key = (self.provider, self.get_provider_info()["model"], prompt, max_tokens)
+            return get_llm_scheduler().run(
+                call, key=key, session_id=self.session_id, priority=priority or self.priority
+            )
         except Exception as e:
+            incr("llm_errors")
             print(f"❌ Error generating response: {e}")
             return f"Error: {str(e)}"
     
+    def stream_response(self, prompt, max_tokens=500):
+        """
+        Stream a response from the LLM
+        
+        The scheduler slot is held until the generator finishes or is closed,
+        so consumers that may stop early must close() it.
+        
+        Args:
+            prompt (str): Input prompt
+            max_tokens (int): Maximum tokens in response
+            
+        Yields:
+            str: Response text pieces as they arrive
+        """
+        try:
+            with get_llm_scheduler().slot(self.session_id, self.priority), \
+                    span("llm_stream", provider=self.provider, prompt_chars=len(prompt)):
+                for chunk in self.llm.stream(prompt):
+                    if chunk.content:
+                        yield chunk.content
+        except Exception as e:
+            incr("llm_errors")
+            print(f"❌ Error streaming response: {e}")
+            yield f"Error: {str(e)}"
+    
     def get_provider_info(self):
         """Get current provider information"""
         return {
@@ -56,6 +125,194 @@ class LLMManager:
             "model": getattr(self.llm, "model_name", "unknown")
         }
 
+class RateLimiter:
+    """Thread-safe token bucket for LLM requests per minute"""
+    
+    def __init__(self, requests_per_minute, burst=1):
+        """
+        Initialize the rate limiter
+        
+        Args:
+            requests_per_minute (float): Sustained request rate
+            burst (int): Requests allowed back to back before the rate applies
+        """
+        self.interval = 60.0 / requests_per_minute
+        self.capacity = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) / self.interval)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * self.interval
+            time.sleep(wait)
+
+class _Ticket:
+    """A queued request for an LLM slot"""
+    
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.enqueued = time.monotonic()
+        self.granted = False
+
+class _Flight:
+    """An in-flight call that identical requests wait on"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class LLMScheduler:
+    """
+    Process-wide gate for LLM calls
+    
+    - At most max_concurrency calls in flight (and an optional requests-per-minute limit)
+    - Interactive work before batch work; batch work waiting longer than batch_max_wait goes next
+    - Round-robin across sessions within a priority, so one busy session can't crowd out the rest
+    - Identical calls in flight are coalesced into one upstream call
+    """
+    
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                 batch_max_wait=LLM_BATCH_MAX_WAIT):
+        """
+        Initialize the scheduler
+        
+        Args:
+            max_concurrency (int): Calls in flight at once
+            requests_per_minute (float): Upstream request rate limit (0 = none)
+            batch_max_wait (float): Seconds before queued batch work is served ahead of interactive work
+        """
+        self.max_concurrency = max_concurrency
+        self.batch_max_wait = batch_max_wait
+        self.rate_limiter = RateLimiter(requests_per_minute, burst=max_concurrency) if requests_per_minute else None
+        self._cond = threading.Condition()
+        # priority -> session -> queued tickets; dict order is the round-robin order
+        self._queues = {INTERACTIVE: OrderedDict(), BATCH: OrderedDict()}
+        self._active = 0
+        self._flights = {}
+    
+    def _pop_next(self):
+        """Next ticket to grant, or None if nothing is queued"""
+        interactive, batch = self._queues[INTERACTIVE], self._queues[BATCH]
+        queue = interactive
+        if batch:
+            next_batch = next(iter(batch.values()))[0]
+            if not interactive or time.monotonic() - next_batch.enqueued > self.batch_max_wait:
+                queue = batch
+        if not queue:
+            return None
+        
+        session_id, tickets = next(iter(queue.items()))
+        ticket = tickets.popleft()
+        del queue[session_id]
+        if tickets:
+            # The session goes to the back of the round
+            queue[session_id] = tickets
+        return ticket
+    
+    def _dispatch(self):
+        """Grant free slots to queued tickets (caller holds the lock)"""
+        while self._active < self.max_concurrency:
+            ticket = self._pop_next()
+            if ticket is None:
+                break
+            ticket.granted = True
+            self._active += 1
+        set_gauge("llm_inflight", self._active)
+        set_gauge("llm_queued", sum(len(t) for q in self._queues.values() for t in q.values()))
+        self._cond.notify_all()
+    
+    @contextmanager
+    def slot(self, session_id=None, priority=INTERACTIVE):
+        """
+        Hold one LLM slot for the duration of the block
+        
+        Args:
+            session_id (str): Session to queue under
+            priority (str): INTERACTIVE or BATCH
+        """
+        ticket = _Ticket(session_id or "default")
+        with self._cond:
+            self._queues[priority].setdefault(ticket.session_id, deque()).append(ticket)
+            self._dispatch()
+            while not ticket.granted:
+                self._cond.wait()
+        observe(f"llm_queue_wait_{priority}", time.monotonic() - ticket.enqueued)
+        
+        start = time.monotonic()
+        try:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            yield
+        finally:
+            observe("llm_service", time.monotonic() - start)
+            with self._cond:
+                self._active -= 1
+                self._dispatch()
+    
+    def run(self, func, key=None, session_id=None, priority=INTERACTIVE):
+        """
+        Run an LLM call under the scheduler
+        
+        Args:
+            func (callable): Zero-argument function making the call
+            key (hashable): Identity of the call; callers with the same key in flight share one result
+            session_id (str): Session to queue under
+            priority (str): INTERACTIVE or BATCH
+            
+        Returns:
+            The result of func()
+        """
+        if key is None:
+            with self.slot(session_id, priority):
+                return func()
+        
+        with self._cond:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        
+        if not leader:
+            incr("llm_coalesced")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        
+        try:
+            with self.slot(session_id, priority):
+                flight.result = func()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._cond:
+                del self._flights[key]
+            flight.done.set()
+
+# Global scheduler instance
+_llm_scheduler = None
+_llm_scheduler_lock = threading.Lock()
+
+def get_llm_scheduler():
+    """Get or create the global LLM scheduler"""
+    global _llm_scheduler
+    with _llm_scheduler_lock:
+        if _llm_scheduler is None:
+            _llm_scheduler = LLMScheduler()
+    return _llm_scheduler
+
 def get_llm(provider="groq", model_name=None):
     """
     Get LLM instance
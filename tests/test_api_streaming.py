@@ -0,0 +1,95 @@
+import time
+import asyncio
+import pytest
+import models.llm
+from models.llm import LLMManager, LLMScheduler, INTERACTIVE
+from api import iterate_blocking
+
+
+class _Piece:
+    def __init__(self, content):
+        self.content = content
+
+
+class SlowStreamingChat:
+    """Streams a fixed answer piece by piece, like ChatGroq.stream"""
+
+    def __init__(self, pieces=10, delay=0.05):
+        self.pieces = pieces
+        self.delay = delay
+
+    def stream(self, prompt):
+        for i in range(self.pieces):
+            time.sleep(self.delay)
+            yield _Piece(f"piece {i} ")
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    scheduler = LLMScheduler(max_concurrency=1, requests_per_minute=0)
+    monkeypatch.setattr(models.llm, "_llm_scheduler", scheduler)
+    return scheduler
+
+
+def make_llm(delay=0.05):
+    llm = LLMManager.__new__(LLMManager)
+    llm.provider = "groq"
+    llm.session_id = None
+    llm.priority = INTERACTIVE
+    llm.llm = SlowStreamingChat(delay=delay)
+    return llm
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_closed_stream_releases_its_slot(scheduler):
+    stream = make_llm().stream_response("prompt")
+    assert next(stream) == "piece 0 "
+    assert scheduler._active == 1
+
+    stream.close()
+
+    assert scheduler._active == 0
+
+
+def test_abandoned_api_stream_releases_its_slot(scheduler):
+    # Kept referenced, so only an explicit close can release the slot (not garbage collection)
+    stream = make_llm().stream_response("prompt")
+
+    async def abandon():
+        body = iterate_blocking(stream)
+        first = await body.__anext__()
+        await body.aclose()
+        return first
+
+    assert asyncio.run(abandon()) == "piece 0 "
+    assert wait_until(lambda: scheduler._active == 0)
+
+    # The only slot is free again for the next session
+    assert "".join(make_llm(delay=0).stream_response("other")).startswith("piece 0 piece 1")
+
+
+def test_cancelled_api_stream_releases_its_slot(scheduler):
+    stream = make_llm(delay=0.2).stream_response("prompt")
+
+    async def disconnect():
+        async def consume():
+            async for _ in iterate_blocking(stream):
+                pass
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.3)  # Cancelled while a chunk read is in progress
+        assert scheduler._active == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(disconnect())
+    assert wait_until(lambda: scheduler._active == 0)
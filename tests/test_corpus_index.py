@@ -0,0 +1,38 @@
+from benchmarks.mocks import HashEmbeddingModel
+from utils.corpus_index import CorpusIndex
+
+PARAGRAPH = " ".join(["Scope 1 emissions fell by twelve percent across all sites."] * 15)
+# The chunker yields the same chunk text more than once for this page
+REPEATED_PAGE = "\n\n".join([PARAGRAPH] * 3)
+
+
+def live_ids(corpus, doc_id):
+    return [chunk_id for chunk_id, chunk in corpus.chunks.items() if chunk[0] == doc_id]
+
+
+def test_replace_page_with_duplicate_chunks_then_remove():
+    corpus = CorpusIndex(HashEmbeddingModel())
+    corpus.add_document("d", [REPEATED_PAGE, "Board independence improved."])
+    chunks_on_page = len(corpus.pages["d"][1])
+    assert len({corpus.chunks[i][2] for i in corpus.pages["d"][1]}) < chunks_on_page
+
+    counts = corpus.replace_pages("d", {1: REPEATED_PAGE + "\n\nWater use dropped."})
+    assert counts["reused"] >= chunks_on_page - 1
+    assert sorted(live_ids(corpus, "d")) == sorted(i for ids in corpus.pages["d"].values() for i in ids)
+
+    corpus.remove_document("d")
+
+    assert live_ids(corpus, "d") == []
+    assert corpus.retrieve_with_metadata("Scope 1 emissions") == []
+
+
+def test_unchanged_page_reuses_every_chunk():
+    corpus = CorpusIndex(HashEmbeddingModel())
+    corpus.add_document("d", [REPEATED_PAGE])
+    ids = list(corpus.pages["d"][1])
+
+    counts = corpus.replace_pages("d", {1: REPEATED_PAGE})
+
+    assert counts == {"embedded": 0, "reused": len(ids), "removed": 0}
+    assert corpus.pages["d"][1] == ids
+    assert len(corpus) == len(ids)
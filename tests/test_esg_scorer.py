@@ -0,0 +1,39 @@
+import numpy as np
+from benchmarks.mocks import HashEmbeddingModel
+from utils.esg_scorer import build_esg_prototypes, calculate_semantic_scores, calculate_overall_esg_score
+
+REPORT = (
+    "We cut Scope 1 emissions by 12% and reached net zero for our offices using renewable energy. "
+    "Employee safety training covered all sites. The board is majority independent."
+)
+
+
+class ReadOnlyEmbeddingModel(HashEmbeddingModel):
+    """Returns read-only vectors, like EmbeddingClient.encode's view on the server's buffer"""
+
+    def encode_texts(self, texts):
+        vectors = super().encode_texts(texts).astype(np.float32)
+        return np.frombuffer(vectors.tobytes(), dtype=np.float32).reshape(vectors.shape)
+
+
+def test_prototypes_from_read_only_vectors():
+    model = ReadOnlyEmbeddingModel()
+    assert not model.encode_texts(["net zero"]).flags.writeable
+
+    prototypes = build_esg_prototypes(model)
+
+    assert prototypes.shape == (6, model.dimension)
+    assert np.allclose(np.linalg.norm(prototypes, axis=1), 1.0)
+
+
+def test_overall_score_with_read_only_chunk_embeddings(monkeypatch):
+    import models.embeddings
+    model = ReadOnlyEmbeddingModel()
+    monkeypatch.setattr(models.embeddings, "_embedding_model", model)
+    embeddings = model.encode_texts([REPORT])
+
+    assert calculate_semantic_scores(embeddings, model) is not None
+    result = calculate_overall_esg_score(REPORT, embeddings=embeddings)
+
+    assert result is not None
+    assert result["scoring_mode"] == "keyword+semantic"
@@ -0,0 +1,152 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from benchmarks.mocks import HashEmbeddingModel
+from utils.chat_pipeline import build_context
+from utils.web_fetch import PageCache, fetch_page, fetch_pages
+
+SLOW_SECONDS = 0.3
+
+ETAG = '"v1"'
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+PAGE = b"""<html><head><style>p {color: red}</style><script>track()</script></head>
+<body><nav>Home | About</nav><h1>Climate report</h1><p>Scope 1 emissions fell 12%.</p></body></html>"""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        if self.path.startswith("/slow/"):
+            with self.server.lock:
+                self.server.in_flight += 1
+                self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+            time.sleep(SLOW_SECONDS)
+            with self.server.lock:
+                self.server.in_flight -= 1
+            self._send(f"Slow page {self.path} on water stewardship.".encode(), "text/plain")
+        elif self.path == "/odd-charset":
+            self._send("<p>Émissions réduites</p>".encode(), "text/html; charset=unknown-8bit")
+        elif self.path == "/page":
+            if self.headers.get("If-None-Match") == ETAG or self.headers.get("If-Modified-Since") == LAST_MODIFIED:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self._send(PAGE, "text/html; charset=utf-8", ETag=ETAG, **{"Last-Modified": LAST_MODIFIED})
+        elif self.path == "/notes.txt":
+            self._send(b"  Net zero by 2040.  ", "text/plain")
+        elif self.path == "/logo.png":
+            self._send(b"\x89PNG\r\n\x1a\n", "image/png")
+        else:
+            self.send_error(404)
+
+    def _send(self, body, content_type, **headers):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.requests = []
+    httpd.lock = threading.Lock()
+    httpd.in_flight = httpd.max_in_flight = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_port}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fetch_extracts_visible_text(server):
+    page = fetch_page(f"{server.url}/page")
+
+    assert page["text"] == "Climate report\nScope 1 emissions fell 12%."
+    assert page["etag"] == ETAG
+    assert page["last_modified"] == LAST_MODIFIED
+
+
+def test_fetch_plain_text(server):
+    assert fetch_page(f"{server.url}/notes.txt")["text"] == "Net zero by 2040."
+
+
+def test_fresh_cache_entry_is_served_without_request(server, tmp_path):
+    cache = PageCache(str(tmp_path), ttl=60)
+    first = fetch_page(f"{server.url}/page", cache)
+    second = fetch_page(f"{server.url}/page", cache)
+
+    assert second == first
+    assert len(server.requests) == 1
+
+
+def test_stale_entry_is_revalidated_with_304(server, tmp_path):
+    cache = PageCache(str(tmp_path), ttl=0)
+    first = fetch_page(f"{server.url}/page", cache)
+    second = fetch_page(f"{server.url}/page", cache)
+
+    assert len(server.requests) == 2
+    _, headers = server.requests[1]
+    assert headers["If-None-Match"] == ETAG
+    assert headers["If-Modified-Since"] == LAST_MODIFIED
+    assert second["text"] == first["text"]
+    assert second["fetched_at"] >= first["fetched_at"]
+
+
+def test_non_text_content_is_skipped(server, tmp_path):
+    cache = PageCache(str(tmp_path))
+
+    assert fetch_page(f"{server.url}/logo.png", cache) is None
+    assert cache.get(f"{server.url}/logo.png") is None
+
+
+def test_errors_and_other_schemes_return_none(server):
+    assert fetch_page(f"{server.url}/missing") is None
+    assert fetch_page("ftp://example.com/report.html") is None
+
+
+def test_unknown_charset_falls_back_to_utf8(server):
+    assert fetch_page(f"{server.url}/odd-charset")["text"] == "Émissions réduites"
+
+
+def test_fetch_pages_runs_concurrently_and_drops_failures(server, tmp_path):
+    urls = [f"{server.url}/slow/{i}" for i in range(4)]
+    urls += [f"{server.url}/missing", f"{server.url}/logo.png", urls[0]]
+
+    start = time.perf_counter()
+    pages = fetch_pages(urls, cache=PageCache(str(tmp_path)), max_concurrency=4)
+    elapsed = time.perf_counter() - start
+
+    assert [page["url"] for page in pages] == urls[:4]
+    assert server.max_in_flight > 1
+    assert elapsed < 4 * SLOW_SECONDS
+
+
+def test_fetched_page_chunks_are_merged_into_context(server, tmp_path, monkeypatch):
+    import models.embeddings
+    monkeypatch.setattr(models.embeddings, "_embedding_model", HashEmbeddingModel())
+
+    class FarEngine:
+        def retrieve_with_metadata(self, query, top_k):
+            return [{"text": "Board meeting minutes.", "page": 7, "distance": 1.9}]
+
+    def search(query, max_results=3):
+        return [{"title": "Climate report", "link": f"{server.url}/page", "snippet": "Emissions fell."}]
+
+    context = "\n".join(build_context(
+        "latest Scope 1 emissions news", FarEngine(), top_k=2, search_fn=search,
+        fetch_fn=lambda urls: fetch_pages(urls, cache=PageCache(str(tmp_path)))
+    ))
+
+    assert "=== Document and Web Page Context ===" in context
+    assert f"[Source: {server.url}/page] " in context
+    assert "Scope 1 emissions fell 12%." in context
+    assert "[Page 7] Board meeting minutes." in context
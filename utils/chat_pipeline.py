@@ -0,0 +1,199 @@
+from utils.web_search import search_web, format_search_results
+from utils.web_fetch import fetch_pages, retrieve_from_pages
+from utils.metrics import span
+from config.config import CONCISE_MAX_TOKENS, DETAILED_MAX_TOKENS, TOP_K_RESULTS
+
+# Queries containing any of these trigger a web search when it is enabled
+WEB_SEARCH_TRIGGERS = ["latest", "recent", "current", "news", "regulation", "2025", "2024"]
+
+
+def needs_web_search(prompt):
+    """Check whether a query asks for recent information"""
+    prompt = prompt.lower()
+    return any(keyword in prompt for keyword in WEB_SEARCH_TRIGGERS)
+
+
+def format_chunk(chunk):
+    """Format one retrieved chunk with its page number or source URL"""
+    if chunk.get("source"):
+        return f"[Source: {chunk['source']}] {chunk['text']}"
+    if chunk["page"]:
+        return f"[Page {chunk['page']}] {chunk['text']}"
+    return chunk["text"]
+
+
+def format_document_context(relevant_chunks):
+    """Format retrieved chunks with their page numbers or source URLs"""
+    return "\n\n".join(format_chunk(chunk) for chunk in relevant_chunks)
+
+
+def merge_results(*result_lists, top_k=TOP_K_RESULTS):
+    """Merge retrieval results from several indexes, closest first"""
+    merged = sorted((result for results in result_lists for result in results), key=lambda r: r["distance"])
+    return merged[:top_k]
+
+
+def context_parts_for(relevant_chunks, search_results=None):
+    """
+    Context parts for retrieved chunks and web search results
+
+    Args:
+        relevant_chunks (list): Retrieved chunks (document and web page)
+        search_results (list): Web search results (optional)
+
+    Returns:
+        list: Context parts to join into the prompt
+    """
+    context_parts = []
+
+    if relevant_chunks:
+        if any(chunk.get("source") for chunk in relevant_chunks):
+            context_parts.append("=== Document and Web Page Context ===")
+        else:
+            context_parts.append("=== Document Context ===")
+        context_parts.append(format_document_context(relevant_chunks))
+
+    if search_results:
+        context_parts.append(format_search_results(search_results))
+
+    return context_parts
+
+
+def build_context(prompt, rag_engine=None, use_web_search=True, top_k=TOP_K_RESULTS, search_fn=search_web,
+                  fetch_fn=fetch_pages):
+    """
+    Gather document and web context for a query
+
+    Args:
+        prompt (str): User query
+        rag_engine (RAGEngine): Engine with a built index (optional)
+        use_web_search (bool): Allow a web search for recent-information queries
+        top_k (int): Chunks to retrieve
+        search_fn (callable): Search function with the search_web signature
+        fetch_fn (callable): Page fetcher with the fetch_pages signature (None = snippets only)
+
+    Returns:
+        list: Context parts to join into the prompt
+    """
+    # RAG context
+    relevant_chunks = []
+    if rag_engine is not None:
+        relevant_chunks = rag_engine.retrieve_with_metadata(prompt, top_k=top_k)
+
+    # Web search context
+    search_results = []
+    if use_web_search and needs_web_search(prompt):
+        search_results = search_fn(f"ESG {prompt}", max_results=3)
+
+        # Full text of the hits competes with the document chunks on the same distance
+        if search_results and fetch_fn is not None:
+            pages = fetch_fn([result["link"] for result in search_results if result.get("link")])
+            if pages:
+                web_chunks = retrieve_from_pages(prompt, pages, top_k)
+                relevant_chunks = merge_results(relevant_chunks, web_chunks, top_k=top_k)
+
+    return context_parts_for(relevant_chunks, search_results)
+
+
+def build_prompt(prompt, context_parts, response_mode="Concise", history=""):
+    """
+    Build the analyst prompt sent to the LLM
+
+    Args:
+        prompt (str): User query
+        context_parts (list): Context from build_context
+        response_mode (str): "Concise" or "Detailed"
+        history (str): Conversation so far, from ConversationMemory.history_text (optional)
+
+    Returns:
+        str: Full prompt
+    """
+    system_context = (
+        "\n\n".join(context_parts)
+        if context_parts
+        else "No additional context available."
+    )
+
+    if response_mode == "Concise":
+        mode_instruction = (
+            "Provide a concise, brief response (2-4 sentences). "
+            "Focus on key insights only."
+        )
+    else:
+        mode_instruction = (
+            "Provide a detailed, comprehensive analysis with specific metrics, "
+            "data points, and actionable insights."
+        )
+
+    history_block = f"Conversation so far:\n{history}\n\n" if history else ""
+
+    return f"""You are an ESG (Environmental, Social, Governance) risk analyst. Analyze the following query and provide insights.
+Context:
+{system_context}
+
+{history_block}Query: {prompt}
+
+Instructions:
+- {mode_instruction}
+- If analyzing a report, focus on ESG risks, strengths, and gaps
+- Provide specific metrics and data when available
+- Be objective and evidence-based
+- Cite document pages as [Page N] and web pages by their source URL when the context provides them
+- If asked for a score, use a 1-5 scale (1=High Risk, 5=Low Risk)
+- Read the query in light of the conversation so far, if any
+
+Response:"""
+
+
+def max_tokens_for_mode(response_mode):
+    """Response token limit for a response mode"""
+    return CONCISE_MAX_TOKENS if response_mode == "Concise" else DETAILED_MAX_TOKENS
+
+
+def _prepare_prompt(prompt, rag_engine, use_web_search, response_mode, top_k, search_fn, fetch_fn, memory):
+    """Context and full prompt for a chat turn, with the conversation history from memory"""
+    retrieval_query = memory.retrieval_query(prompt) if memory is not None else prompt
+    history = memory.history_text() if memory is not None else ""
+    context_parts = build_context(retrieval_query, rag_engine, use_web_search, top_k, search_fn, fetch_fn)
+    return build_prompt(prompt, context_parts, response_mode, history)
+
+
+def answer_query(prompt, llm, rag_engine=None, use_web_search=True, response_mode="Concise",
+                 top_k=TOP_K_RESULTS, search_fn=search_web, fetch_fn=fetch_pages, memory=None):
+    """
+    Run one chat turn: retrieve, optionally search, build the prompt and call the LLM
+
+    Args:
+        prompt (str): User query
+        llm (LLMManager): LLM to answer with
+        rag_engine (RAGEngine): Engine with a built index (optional)
+        use_web_search (bool): Allow a web search for recent-information queries
+        response_mode (str): "Concise" or "Detailed"
+        top_k (int): Chunks to retrieve
+        search_fn (callable): Search function with the search_web signature
+        fetch_fn (callable): Page fetcher with the fetch_pages signature (None = snippets only)
+        memory (ConversationMemory): Conversation history for follow-ups (optional; the caller records the turn)
+
+    Returns:
+        str: LLM response
+    """
+    with span("chat_turn", mode=response_mode):
+        full_prompt = _prepare_prompt(
+            prompt, rag_engine, use_web_search, response_mode, top_k, search_fn, fetch_fn, memory
+        )
+        return llm.generate_response(full_prompt, max_tokens=max_tokens_for_mode(response_mode))
+
+
+def stream_answer(prompt, llm, rag_engine=None, use_web_search=True, response_mode="Concise",
+                  top_k=TOP_K_RESULTS, search_fn=search_web, fetch_fn=fetch_pages, memory=None):
+    """
+    Streaming variant of answer_query
+
+    Args:
+        Same as answer_query
+
+    Yields:
+        str: Response text pieces as the LLM produces them
+    """
+    full_prompt = _prepare_prompt(prompt, rag_engine, use_web_search, response_mode, top_k, search_fn, fetch_fn, memory)
+    yield from llm.stream_response(full_prompt, max_tokens=max_tokens_for_mode(response_mode))
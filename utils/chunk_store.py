@@ -0,0 +1,186 @@
+import os
+import json
+import numpy as np
+from utils.chunker import Chunk
+
+# On-disk layout of a saved store (a directory):
+#   text.bin                   UTF-8 document buffer
+#   starts.npy / ends.npy      chunk byte offsets into text.bin
+#   pages.npy                  1-based page of each chunk (0 if unknown)
+STORE_TEXT_FILE = "text.bin"
+STORE_ARRAYS = ("starts", "ends", "pages")
+STORE_META_FILE = "meta.json"
+
+
+def _char_to_byte_offsets(text):
+    """Prefix array mapping each character offset to its UTF-8 byte offset"""
+    if text.isascii():
+        return None
+    codepoints = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    widths = 1 + (codepoints >= 0x80) + (codepoints >= 0x800) + (codepoints >= 0x10000)
+    prefix = np.zeros(len(codepoints) + 1, dtype=np.int64)
+    np.cumsum(widths, out=prefix[1:])
+    return prefix
+
+
+class ChunkStore:
+    """Document text held once as a UTF-8 buffer, with chunk offsets and pages as NumPy arrays"""
+
+    def __init__(self, buffer, starts, ends, pages):
+        """
+        Initialize the store (use from_spans / from_texts / load to build one)
+
+        Args:
+            buffer (bytes | np.memmap): UTF-8 document buffer
+            starts (np.ndarray): Chunk start byte offsets
+            ends (np.ndarray): Chunk end byte offsets
+            pages (np.ndarray): 1-based page of each chunk (0 if unknown)
+        """
+        self.buffer = buffer
+        self.starts = starts
+        self.ends = ends
+        self.pages = pages
+
+    @classmethod
+    def from_spans(cls, text, spans):
+        """
+        Build a store from a text and its chunk spans
+
+        Args:
+            text (str): Document text
+            spans (list): Chunk(start, end, page) spans in character offsets
+
+        Returns:
+            ChunkStore: The store
+        """
+        starts = np.fromiter((s.start for s in spans), dtype=np.int64, count=len(spans))
+        ends = np.fromiter((s.end for s in spans), dtype=np.int64, count=len(spans))
+        pages = np.fromiter((s.page or 0 for s in spans), dtype=np.int32, count=len(spans))
+
+        prefix = _char_to_byte_offsets(text)
+        if prefix is not None:
+            starts, ends = prefix[starts], prefix[ends]
+
+        return cls(text.encode("utf-8"), starts, ends, pages)
+
+    @classmethod
+    def from_texts(cls, texts):
+        """
+        Build a store from standalone chunk strings (no shared document)
+
+        Args:
+            texts (list): Chunk texts
+
+        Returns:
+            ChunkStore: The store
+        """
+        encoded = [t.encode("utf-8") for t in texts]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        return cls(b"".join(encoded), starts, ends, np.zeros(len(encoded), dtype=np.int32))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        """Materialize the text of one chunk"""
+        return bytes(self.buffer[self.starts[index]:self.ends[index]]).decode("utf-8", errors="ignore")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def get_chunks(self, indices):
+        """
+        Materialize the text of several chunks
+
+        Args:
+            indices (iterable): Chunk indices
+
+        Returns:
+            list: Chunk texts
+        """
+        return [self[i] for i in indices]
+
+    def slice(self, start, end):
+        """Decode an arbitrary byte range of the document"""
+        return bytes(self.buffer[start:end]).decode("utf-8", errors="ignore")
+
+    def iter_spans(self):
+        """
+        Iterate over chunk spans
+
+        Yields:
+            Chunk: (start, end, page) in byte offsets of the buffer
+        """
+        for start, end, page in zip(self.starts.tolist(), self.ends.tolist(), self.pages.tolist()):
+            yield Chunk(start, end, page or None)
+
+    def get_page(self, index):
+        """Get the 1-based page of a chunk (None if unknown)"""
+        page = int(self.pages[index])
+        return page or None
+
+    @property
+    def text(self):
+        """Full document text (decoded on demand)"""
+        return bytes(self.buffer).decode("utf-8", errors="ignore")
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the store"""
+        return len(self.buffer) + self.starts.nbytes + self.ends.nbytes + self.pages.nbytes
+
+    def select(self, indices):
+        """
+        Create a store with a subset of the chunks, sharing the same buffer
+
+        Args:
+            indices (array-like): Chunk indices to keep
+
+        Returns:
+            ChunkStore: The subset store
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        return ChunkStore(self.buffer, self.starts[indices], self.ends[indices], self.pages[indices])
+
+    def save(self, path):
+        """
+        Save the store to a directory
+
+        Args:
+            path (str): Target directory (created if missing)
+        """
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, STORE_TEXT_FILE), "wb") as f:
+            f.write(self.buffer)
+        for name in STORE_ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, STORE_META_FILE), "w") as f:
+            json.dump({"num_chunks": len(self), "num_bytes": len(self.buffer)}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a store saved with save()
+
+        Args:
+            path (str): Store directory
+            mmap (bool): Memory-map the buffer and offset arrays instead of reading them
+
+        Returns:
+            ChunkStore: The loaded store
+        """
+        text_path = os.path.join(path, STORE_TEXT_FILE)
+        if mmap and os.path.getsize(text_path) > 0:
+            buffer = np.memmap(text_path, dtype=np.uint8, mode="r")
+        else:
+            with open(text_path, "rb") as f:
+                buffer = f.read()
+
+        arrays = [
+            np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in STORE_ARRAYS
+        ]
+        return cls(buffer, *arrays)
@@ -0,0 +1,156 @@
+import re
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from config.config import CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_LENGTH_UNIT
+
+# A chunk is a span of the source text: text[start:end], starting on `page` (1-based, None if unknown)
+Chunk = namedtuple("Chunk", ["start", "end", "page"])
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", ".", "!", "?", ",", " "]
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _page_of(page_starts, offset):
+    """Return the 1-based page containing a character offset"""
+    if page_starts is None:
+        return None
+    return max(1, bisect_right(page_starts, offset))
+
+
+def _token_starts(text, tokenizer):
+    """Character offset where each token of the text starts"""
+    if tokenizer is None:
+        from models.embeddings import get_embedding_model
+        tokenizer = get_embedding_model().tokenizer
+
+    encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    return [start for start, end in encoded["offset_mapping"] if end > start]
+
+
+def _find_break(text, start, limit, min_end, separators):
+    """Position just after the highest-priority separator in text[min_end:limit], or limit"""
+    for sep in separators:
+        pos = text.rfind(sep, min_end, limit)
+        if pos != -1:
+            return pos + len(sep)
+    return limit
+
+
+def iter_chunks(text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                separators=None, page_starts=None, length_unit=CHUNK_LENGTH_UNIT, tokenizer=None):
+    """
+    Stream offset-preserving chunks over a text
+
+    Chunks end on the highest-priority separator that keeps them within
+    chunk_size, and consecutive chunks overlap by about chunk_overlap.
+    Each step is a bounded rfind, so the whole pass is linear in the text.
+
+    Args:
+        text (str): Full text to split
+        chunk_size (int): Maximum chunk length
+        chunk_overlap (int): Overlap between consecutive chunks
+        separators (list): Break points in priority order
+        page_starts (list): Sorted character offsets where each page begins (optional)
+        length_unit (str): "chars", or "tokens" to measure with the embedding tokenizer
+        tokenizer: Tokenizer used when length_unit is "tokens" (defaults to the embedding tokenizer)
+
+    Yields:
+        Chunk: (start, end, page) span of the text
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+    separators = separators or DEFAULT_SEPARATORS
+    n = len(text)
+
+    if length_unit == "tokens":
+        token_starts = _token_starts(text, tokenizer)
+
+        def window_limit(start):
+            i = bisect_left(token_starts, start)
+            return token_starts[i + chunk_size] if i + chunk_size < len(token_starts) else n
+
+        def overlap_start(start, end):
+            i = bisect_left(token_starts, start)
+            j = bisect_left(token_starts, end)
+            k = max(j - chunk_overlap, i + 1)
+            return token_starts[k] if k < len(token_starts) else end
+    elif length_unit == "chars":
+        def window_limit(start):
+            return min(start + chunk_size, n)
+
+        def overlap_start(start, end):
+            return max(end - chunk_overlap, start + 1)
+    else:
+        raise ValueError(f"Unknown length unit: {length_unit}")
+
+    match = _WHITESPACE.match(text, 0)
+    start = match.end() if match else 0
+
+    while start < n:
+        limit = window_limit(start)
+        if limit >= n:
+            end = n
+        else:
+            # Don't break in the first quarter of the window, so chunks stay reasonably full
+            min_end = start + max(1, (limit - start) // 4)
+            end = _find_break(text, start, limit, min_end, separators)
+
+        trimmed = end
+        while trimmed > start and text[trimmed - 1].isspace():
+            trimmed -= 1
+        if trimmed > start:
+            yield Chunk(start, trimmed, _page_of(page_starts, start))
+
+        if end >= n:
+            break
+
+        # Start the next chunk inside the overlap, snapped forward to a word boundary
+        next_start = overlap_start(start, end)
+        if next_start < end and not text[next_start - 1].isspace():
+            ws = _WHITESPACE.search(text, next_start, end)
+            if ws:
+                next_start = ws.end()
+        match = _WHITESPACE.match(text, next_start)
+        start = match.end() if match else next_start
+
+
+def group_chunks(chunks, section_size):
+    """
+    Merge consecutive chunk spans into larger, non-overlapping sections
+
+    Args:
+        chunks (iterable): Chunk spans in document order
+        section_size (int): Maximum section length in characters
+
+    Yields:
+        Chunk: (start, end, page) span covering one section
+    """
+    section = None
+    for chunk in chunks:
+        if section is None:
+            section = chunk
+        elif chunk.end - section.start <= section_size:
+            section = Chunk(section.start, chunk.end, section.page)
+        else:
+            yield section
+            # Continue where the previous section ended so overlaps are not counted twice
+            start = max(chunk.start, section.end)
+            section = Chunk(start, chunk.end, chunk.page)
+    if section is not None:
+        yield section
+
+
+def chunk_texts(text, chunks):
+    """
+    Materialize chunk spans as strings
+
+    Args:
+        text (str): Source text
+        chunks (iterable): Chunk spans
+
+    Returns:
+        list: Chunk texts
+    """
+    return [text[c.start:c.end] for c in chunks]
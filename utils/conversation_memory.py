@@ -0,0 +1,215 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import span, incr
+from config.config import (
+    MEMORY_RECENT_TURNS, MEMORY_TOKEN_BUDGET, MEMORY_SUMMARY_MAX_TOKENS, MEMORY_FOLLOWUP_WORDS
+)
+
+# Rough characters per LLM token, used to keep history within its token budget
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PROMPT = """You are maintaining the memory of a conversation between a user and an ESG (Environmental, Social, Governance) risk analyst.
+Update the summary with the new turns. Keep the topics, companies, metrics, figures, [Page N] citations and open questions the user may refer back to. Drop greetings and repetition.
+Write at most {max_words} words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+# Openers of questions that continue the previous one ("and for Scope 3?")
+FOLLOWUP_OPENERS = re.compile(r"^\s*(and|also|what about|how about|same for|what of)\b", re.IGNORECASE)
+# Pronouns that point back to the previous question's subject
+FOLLOWUP_PRONOUNS = {"it", "its", "they", "them", "their", "theirs", "those", "he", "she", "him", "his", "her"}
+_WORDS = re.compile(r"[a-z']+")
+
+# Summaries are computed off the request path, after the answer is shown
+_summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="esg-memory")
+
+
+def estimate_tokens(text):
+    """Approximate LLM token count of a text"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut a text to roughly max_tokens, keeping its beginning"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + " ..."
+
+
+def is_followup(prompt):
+    """Whether a question only makes sense together with the previous one"""
+    if FOLLOWUP_OPENERS.match(prompt):
+        return True
+    words = _WORDS.findall(prompt.lower())
+    return len(words) <= MEMORY_FOLLOWUP_WORDS and any(word in FOLLOWUP_PRONOUNS for word in words)
+
+
+def format_turn(user, assistant):
+    return f"User: {user}\nAssistant: {assistant}"
+
+
+class ConversationMemory:
+    """
+    Bounded chat history for prompts
+
+    The last recent_turns turns are kept verbatim. Older turns are folded into
+    a rolling summary by a background LLM call after each answer, and the
+    history rendered into a prompt never exceeds token_budget (estimated).
+    """
+
+    def __init__(self, recent_turns=MEMORY_RECENT_TURNS, token_budget=MEMORY_TOKEN_BUDGET,
+                 summary_max_tokens=MEMORY_SUMMARY_MAX_TOKENS):
+        """
+        Initialize the memory
+
+        Args:
+            recent_turns (int): Turns kept verbatim
+            token_budget (int): Max tokens of history per prompt
+            summary_max_tokens (int): Max tokens of the rolling summary
+        """
+        self.recent_turns = recent_turns
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.summary = ""
+        self.turns = []  # (user, assistant) not folded into the summary yet
+        self.summarized_turns = 0
+        self._future = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.summarized_turns + len(self.turns)
+
+    def add_turn(self, user, assistant, llm=None):
+        """
+        Record a finished turn and fold older turns into the summary in the background
+
+        Args:
+            user (str): User message
+            assistant (str): Assistant response
+            llm (LLMManager): LLM for the summary (no summarization without one)
+        """
+        with self._lock:
+            self.turns.append((user, assistant))
+            overflow = len(self.turns) > self.recent_turns
+            busy = self._future is not None and not self._future.done()
+            if overflow and llm is not None and not busy:
+                self._future = _summary_pool.submit(self._fold, llm)
+
+    def _fold(self, llm):
+        """Fold all but the recent turns into the summary (runs on the summary pool)"""
+        from models.llm import BATCH
+
+        with self._lock:
+            folded = self.turns[:-self.recent_turns]
+            summary = self.summary
+        if not folded:
+            return
+
+        prompt = SUMMARY_PROMPT.format(
+            max_words=int(self.summary_max_tokens * 0.75),
+            summary=summary or "(empty)",
+            turns="\n\n".join(format_turn(user, assistant) for user, assistant in folded),
+        )
+        with span("memory_summarize", turns=len(folded)):
+            response = llm.generate_response(prompt, max_tokens=self.summary_max_tokens, priority=BATCH)
+        if not response or response.startswith("Error:"):
+            # Keep the turns; history_text() still trims them to the budget
+            incr("memory_summary_errors")
+            return
+
+        with self._lock:
+            # Turns added meanwhile stay in place; cleared memory is left alone
+            if self.turns[:len(folded)] != folded:
+                return
+            self.summary = truncate_to_tokens(response.strip(), self.summary_max_tokens)
+            del self.turns[:len(folded)]
+            self.summarized_turns += len(folded)
+        incr("memory_summaries")
+
+    def pending(self):
+        """Whether a summary is being computed"""
+        future = self._future
+        return future is not None and not future.done()
+
+    def history_text(self):
+        """
+        Conversation history for the prompt, within the token budget
+
+        Newest turns are kept first; the summary fills what is left.
+
+        Returns:
+            str: Summary and recent turns, or "" for a new conversation
+        """
+        with self._lock:
+            summary = self.summary
+            turns = list(self.turns)
+
+        parts = []
+        remaining = self.token_budget
+        # Turns waiting to be summarized count as history too, newest first
+        for user, assistant in reversed(turns):
+            text = format_turn(user, truncate_to_tokens(assistant, max(remaining // 2, 1)))
+            tokens = estimate_tokens(text)
+            if tokens > remaining:
+                break
+            parts.append(text)
+            remaining -= tokens
+        parts.reverse()
+
+        if summary and remaining > 0:
+            summary = truncate_to_tokens(summary, remaining)
+            parts.insert(0, f"Summary of earlier conversation: {summary}")
+
+        return "\n\n".join(parts)
+
+    def retrieval_query(self, prompt):
+        """
+        Query for document retrieval
+
+        Follow-ups are searched together with the previous question so
+        retrieval keeps the topic. A follow-up opens with a continuation
+        ("and for Scope 3?", "what about water?") or is a short question with
+        a pronoun that refers back ("when do they expire?"). Standalone
+        questions are searched as they are.
+
+        Args:
+            prompt (str): User query
+
+        Returns:
+            str: Retrieval query
+        """
+        with self._lock:
+            previous = self.turns[-1][0] if self.turns else None
+        if previous and is_followup(prompt):
+            return f"{previous} {prompt}"
+        return prompt
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+            self.summarized_turns = 0
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "summary": self.summary,
+                "turns": [list(turn) for turn in self.turns],
+                "summarized_turns": self.summarized_turns,
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        memory = cls()
+        memory.summary = data.get("summary", "")
+        memory.turns = [tuple(turn) for turn in data.get("turns", [])]
+        memory.summarized_turns = data.get("summarized_turns", 0)
+        return memory
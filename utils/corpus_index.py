@@ -0,0 +1,378 @@
+import os
+import json
+import hashlib
+import threading
+import faiss
+import numpy as np
+from collections import defaultdict, deque
+from models.embeddings import get_embedding_model
+from utils.chunker import iter_chunks
+from utils.metrics import span, timed, incr, set_gauge
+from config.config import TOP_K_RESULTS, CORPUS_COMPACT_RATIO, CORPUS_COMPACT_MIN_TOMBSTONES
+
+INDEX_FILE = "index.faiss"
+META_FILE = "meta.json"
+
+
+def _text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class CorpusIndex:
+    """
+    Vector index over many reports that is updated in place
+
+    Every chunk gets a stable int64 id and records its document and page.
+    Vectors live in a FAISS IndexIDMap2, so adding a report or replacing
+    pages embeds and inserts only the changed chunks. Removed chunks are
+    tombstoned and skipped at search time; once tombstones pass
+    CORPUS_COMPACT_RATIO of the index a background thread deletes them from
+    the index in one pass.
+
+    Chunks never cross page boundaries here, so pages can be replaced
+    independently.
+    """
+
+    def __init__(self, embedding_model=None):
+        """
+        Initialize an empty corpus
+
+        Args:
+            embedding_model (EmbeddingModel): Model to use (defaults to the global one)
+        """
+        self.embedding_model = embedding_model or get_embedding_model()
+        self.dimension = self.embedding_model.get_embedding_dimension()
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+        self.next_id = 0
+        self.chunks = {}  # id -> (doc_id, page, text)
+        self.pages = {}  # doc_id -> {page: [ids in page order]}
+        self.tombstones = set()  # Removed ids still in the FAISS index
+        self._lock = threading.RLock()  # Index and metadata
+        self._update_lock = threading.Lock()  # One update at a time; searches continue while it embeds
+        self._compacting = False
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def documents(self):
+        """Ids of the documents in the corpus"""
+        with self._lock:
+            return list(self.pages)
+
+    def _insert(self, doc_id, page, texts, vectors):
+        """Add chunks under fresh ids (caller holds the lock)"""
+        ids = np.arange(self.next_id, self.next_id + len(texts), dtype=np.int64)
+        self.next_id += len(texts)
+        if len(texts):
+            self.index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), ids)
+        for chunk_id, text in zip(ids.tolist(), texts):
+            self.chunks[chunk_id] = (doc_id, page, text)
+        return ids.tolist()
+
+    def _remove(self, ids):
+        """Tombstone chunks (caller holds the lock)"""
+        for chunk_id in ids:
+            self.chunks.pop(chunk_id, None)
+        self.tombstones.update(ids)
+
+    def _remove_pages_locked(self, doc_id, pages):
+        """Tombstone the chunks of some pages (caller holds both locks)"""
+        doc_pages = self.pages.get(doc_id, {})
+        removed = [chunk_id for page in pages for chunk_id in doc_pages.pop(page, [])]
+        self._remove(removed)
+        if doc_id in self.pages and not doc_pages:
+            del self.pages[doc_id]
+        self._update_gauges()
+        return len(removed)
+
+    def _update_gauges(self):
+        set_gauge("corpus_vectors", len(self.chunks))
+        set_gauge("corpus_tombstones", len(self.tombstones))
+
+    def replace_pages(self, doc_id, pages):
+        """
+        Add or replace pages of a document, embedding only chunks that changed
+
+        Chunks whose text is unchanged keep their id and vector. Adding a new
+        report is replacing all of its pages.
+
+        Args:
+            doc_id (str): Document id (e.g. content hash or report name)
+            pages (dict): 1-based page number -> page text ("" removes the page)
+
+        Returns:
+            dict: Counts of "embedded", "reused" and "removed" chunks
+        """
+        with self._update_lock:
+            with self._lock:
+                current = self.pages.get(doc_id, {})
+                # Text hash -> ids in page order; a page can repeat a chunk
+                old_chunks = {}
+                for page in pages:
+                    by_hash = old_chunks[page] = defaultdict(deque)
+                    for i in current.get(page, []):
+                        by_hash[_text_hash(self.chunks[i][2])].append(i)
+
+            # Per page: ("old", id) for unchanged chunks, ("new", row) for chunks to embed
+            layouts = {}
+            new_texts = []
+            for page, text in pages.items():
+                unmatched = old_chunks[page]
+                layout = []
+                for chunk in iter_chunks(text or ""):
+                    chunk_text = text[chunk.start:chunk.end]
+                    ids = unmatched.get(_text_hash(chunk_text))
+                    if ids:
+                        layout.append(("old", ids.popleft()))
+                    else:
+                        layout.append(("new", len(new_texts)))
+                        new_texts.append(chunk_text)
+                # Every old id not reused is tombstoned
+                layouts[page] = (layout, [i for ids in unmatched.values() for i in ids])
+
+            vectors = np.zeros((0, self.dimension), dtype=np.float32)
+            if new_texts:
+                with span("corpus_embed", chunks=len(new_texts)):
+                    vectors = self.embedding_model.encode_texts(new_texts)
+                if vectors is None:
+                    raise RuntimeError("Embedding failed")
+
+            counts = {"embedded": len(new_texts), "reused": 0, "removed": 0}
+            with self._lock:
+                doc_pages = self.pages.setdefault(doc_id, {})
+                for page, (layout, removed) in layouts.items():
+                    rows = [row for kind, row in layout if kind == "new"]
+                    new_ids = iter(self._insert(doc_id, page, [new_texts[row] for row in rows], vectors[rows]))
+                    ids = [next(new_ids) if kind == "new" else value for kind, value in layout]
+                    self._remove(removed)
+                    counts["reused"] += len(ids) - len(rows)
+                    counts["removed"] += len(removed)
+                    if ids:
+                        doc_pages[page] = ids
+                    else:
+                        doc_pages.pop(page, None)
+                if not doc_pages:
+                    del self.pages[doc_id]
+                self._update_gauges()
+
+        incr("corpus_chunks_embedded", counts["embedded"])
+        incr("corpus_chunks_reused", counts["reused"])
+        self._maybe_compact()
+        return counts
+
+    def add_document(self, doc_id, pages):
+        """
+        Add (or update) a report from its page texts
+
+        Args:
+            doc_id (str): Document id
+            pages (list): Page texts, first page first
+
+        Returns:
+            dict: Counts as from replace_pages
+        """
+        with self._lock:
+            stale = set(self.pages.get(doc_id, {})) - set(range(1, len(pages) + 1))
+        update = {page: text for page, text in enumerate(pages, 1)}
+        update.update({page: "" for page in stale})
+        return self.replace_pages(doc_id, update)
+
+    def add_store(self, doc_id, store, embeddings):
+        """
+        Add a report from ingest outputs without embedding anything
+
+        Replaces the document if it is already in the corpus.
+
+        Args:
+            doc_id (str): Document id
+            store (ChunkStore): Ingested chunks
+            embeddings (np.ndarray): One vector per chunk
+        """
+        by_page = defaultdict(list)
+        for i in range(len(store)):
+            by_page[store.get_page(i) or 0].append(i)
+
+        with self._update_lock, self._lock:
+            self._remove_pages_locked(doc_id, list(self.pages.get(doc_id, {})))
+            doc_pages = self.pages[doc_id] = {}
+            for page, rows in by_page.items():
+                doc_pages[page] = self._insert(doc_id, page, store.get_chunks(rows), np.asarray(embeddings)[rows])
+            self._update_gauges()
+        self._maybe_compact()
+
+    def remove_pages(self, doc_id, pages):
+        """
+        Remove pages of a document
+
+        Args:
+            doc_id (str): Document id
+            pages (iterable): 1-based page numbers
+
+        Returns:
+            int: Chunks removed
+        """
+        with self._update_lock, self._lock:
+            removed = self._remove_pages_locked(doc_id, pages)
+        self._maybe_compact()
+        return removed
+
+    def remove_document(self, doc_id):
+        """
+        Remove a document
+
+        Args:
+            doc_id (str): Document id
+
+        Returns:
+            int: Chunks removed
+        """
+        with self._update_lock, self._lock:
+            removed = self._remove_pages_locked(doc_id, list(self.pages.get(doc_id, {})))
+        self._maybe_compact()
+        return removed
+
+    @timed("corpus_retrieve")
+    def retrieve_with_metadata(self, query, top_k=TOP_K_RESULTS, doc_ids=None):
+        """
+        Retrieve the chunks closest to a query across the corpus
+
+        Args:
+            query (str): Search query
+            top_k (int): Number of results to return
+            doc_ids (list): Only search these documents (optional)
+
+        Returns:
+            list: Dicts with "text", "page", "doc_id", "id", "distance" and "score"
+        """
+        query_embedding = self.embedding_model.encode_text(query)
+        if query_embedding is None:
+            return []
+        query_vector = np.ascontiguousarray([query_embedding], dtype=np.float32)
+
+        with self._lock:
+            if not self.chunks:
+                return []
+            if doc_ids is not None:
+                # Search only the live chunks of the selected documents
+                allowed = np.array([
+                    chunk_id
+                    for doc_id in doc_ids
+                    for ids in self.pages.get(doc_id, {}).values()
+                    for chunk_id in ids
+                ], dtype=np.int64)
+                if not len(allowed):
+                    return []
+                selector = faiss.IDSelectorBatch(allowed)
+                params = faiss.SearchParameters(sel=selector)
+                distances, ids = self.index.search(query_vector, min(top_k, len(allowed)), params=params)
+            else:
+                # Over-fetch so tombstoned chunks can be skipped
+                k = min(top_k + len(self.tombstones), self.index.ntotal)
+                distances, ids = self.index.search(query_vector, k)
+
+            results = []
+            for chunk_id, distance in zip(ids[0].tolist(), distances[0].tolist()):
+                chunk = self.chunks.get(chunk_id)
+                if chunk is None:
+                    continue
+                doc_id, page, text = chunk
+                results.append({
+                    "text": text,
+                    "page": page or None,
+                    "doc_id": doc_id,
+                    "id": chunk_id,
+                    "distance": distance,
+                    "score": 1.0 - distance / 2,  # Cosine similarity of unit vectors
+                })
+                if len(results) == top_k:
+                    break
+            return results
+
+    def retrieve(self, query, top_k=TOP_K_RESULTS, doc_ids=None):
+        """Retrieve the texts of the chunks closest to a query"""
+        return [result["text"] for result in self.retrieve_with_metadata(query, top_k, doc_ids)]
+
+    def compact(self):
+        """
+        Delete tombstoned vectors from the FAISS index
+
+        Returns:
+            int: Vectors deleted
+        """
+        with self._lock:
+            if not self.tombstones:
+                return 0
+            with span("corpus_compact", tombstones=len(self.tombstones)):
+                removed = self.index.remove_ids(np.fromiter(self.tombstones, dtype=np.int64))
+            self.tombstones.clear()
+            self._update_gauges()
+        incr("corpus_compactions")
+        return removed
+
+    def _maybe_compact(self):
+        """Compact in a background thread once enough chunks are tombstoned"""
+        with self._lock:
+            due = (
+                len(self.tombstones) >= CORPUS_COMPACT_MIN_TOMBSTONES
+                and len(self.tombstones) >= CORPUS_COMPACT_RATIO * self.index.ntotal
+            )
+            if not due or self._compacting:
+                return
+            self._compacting = True
+
+        def run():
+            try:
+                self.compact()
+            finally:
+                self._compacting = False
+
+        threading.Thread(target=run, name="esg-corpus-compact", daemon=True).start()
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the vectors and chunk texts"""
+        with self._lock:
+            return self.index.ntotal * (self.dimension * 4 + 16) + sum(len(c[2]) for c in self.chunks.values())
+
+    def save(self, path):
+        """
+        Save the corpus to a directory (compacting first)
+
+        Args:
+            path (str): Target directory (created if missing)
+        """
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            self.compact()
+            faiss.write_index(self.index, os.path.join(path, INDEX_FILE))
+            meta = {
+                "next_id": self.next_id,
+                "chunks": [[chunk_id, *chunk] for chunk_id, chunk in self.chunks.items()],
+                "pages": {doc_id: list(pages.items()) for doc_id, pages in self.pages.items()},
+            }
+        tmp_path = os.path.join(path, f"{META_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(path, META_FILE))
+
+    @classmethod
+    def load(cls, path, embedding_model=None):
+        """
+        Load a corpus saved with save()
+
+        Args:
+            path (str): Corpus directory
+            embedding_model (EmbeddingModel): Model to use (defaults to the global one)
+
+        Returns:
+            CorpusIndex: The loaded corpus
+        """
+        corpus = cls(embedding_model)
+        corpus.index = faiss.read_index(os.path.join(path, INDEX_FILE))
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        corpus.next_id = meta["next_id"]
+        corpus.chunks = {chunk_id: (doc_id, page, text) for chunk_id, doc_id, page, text in meta["chunks"]}
+        corpus.pages = {doc_id: {page: ids for page, ids in pages} for doc_id, pages in meta["pages"].items()}
+        corpus._update_gauges()
+        return corpus
@@ -0,0 +1,156 @@
+import re
+import zlib
+import numpy as np
+from collections import Counter, defaultdict
+from config.config import (
+    DEDUP_SIMILARITY_THRESHOLD,
+    DEDUP_NUM_PERM,
+    DEDUP_BANDS,
+    DEDUP_SHINGLE_SIZE,
+    BOILERPLATE_MIN_PAGE_FRACTION,
+    BOILERPLATE_EDGE_LINES,
+)
+
+# Universal hashing modulo a prime just below 2**32: with 32-bit shingle hashes and
+# coefficients below the prime, a * x + b never overflows uint64
+_MERSENNE_PRIME = np.uint64(4294967291)
+_WORD = re.compile(r"\w+")
+_DIGITS = re.compile(r"\d+")
+
+
+def _normalize_line(line):
+    """Normalize a line so page numbers and dates don't hide repetition"""
+    return _DIGITS.sub("#", " ".join(line.lower().split()))
+
+
+def find_repeated_lines(pages, min_page_fraction=BOILERPLATE_MIN_PAGE_FRACTION,
+                        edge_lines=BOILERPLATE_EDGE_LINES):
+    """
+    Detect page headers/footers repeated across the document
+
+    Args:
+        pages (list): Page texts
+        min_page_fraction (float): Fraction of pages a line must appear on
+        edge_lines (int): Lines at the top and bottom of each page to inspect
+
+    Returns:
+        set: Normalized repeated lines
+    """
+    non_empty = [p for p in pages if p and p.strip()]
+    if len(non_empty) < 3:
+        return set()
+
+    counts = Counter()
+    for page in non_empty:
+        lines = [l for l in page.splitlines() if l.strip()]
+        edges = lines[:edge_lines] + lines[-edge_lines:]
+        counts.update({_normalize_line(l) for l in edges})
+
+    min_pages = max(3, int(len(non_empty) * min_page_fraction))
+    return {line for line, count in counts.items() if count >= min_pages and line}
+
+
+def strip_repeated_lines(pages, repeated=None, edge_lines=BOILERPLATE_EDGE_LINES):
+    """
+    Remove repeated headers/footers from the edges of each page
+
+    Args:
+        pages (list): Page texts
+        repeated (set): Normalized lines to remove (detected if None)
+        edge_lines (int): Lines at the top and bottom of each page to inspect
+
+    Returns:
+        list: Cleaned page texts
+    """
+    if repeated is None:
+        repeated = find_repeated_lines(pages, edge_lines=edge_lines)
+    if not repeated:
+        return pages
+
+    cleaned = []
+    for page in pages:
+        lines = page.splitlines() if page else []
+        head = 0
+        while head < min(edge_lines, len(lines)) and (not lines[head].strip() or _normalize_line(lines[head]) in repeated):
+            head += 1
+        tail = len(lines)
+        while tail > max(head, len(lines) - edge_lines) and (not lines[tail - 1].strip() or _normalize_line(lines[tail - 1]) in repeated):
+            tail -= 1
+        cleaned.append("\n".join(lines[head:tail]))
+
+    print(f"✅ Removed {len(repeated)} repeated header/footer lines")
+    return cleaned
+
+
+def _shingle_hashes(text, shingle_size):
+    """32-bit hashes of the word shingles of a text"""
+    words = _WORD.findall(text.lower())
+    if len(words) <= shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    return np.fromiter({zlib.crc32(s.encode()) for s in shingles}, dtype=np.uint64)
+
+
+def minhash_signatures(texts, num_perm=DEDUP_NUM_PERM, shingle_size=DEDUP_SHINGLE_SIZE, seed=1):
+    """
+    Compute MinHash signatures for a list of texts
+
+    Args:
+        texts (list): Texts to sign
+        num_perm (int): Number of hash permutations
+        shingle_size (int): Words per shingle
+        seed (int): Seed for the permutation coefficients
+
+    Returns:
+        np.ndarray: uint64 array of shape (len(texts), num_perm)
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        hashes = _shingle_hashes(text, shingle_size)
+        signatures[i] = ((np.outer(hashes, a) + b) % _MERSENNE_PRIME).min(axis=0)
+    return signatures
+
+
+def deduplicate_chunks(texts, threshold=DEDUP_SIMILARITY_THRESHOLD, num_perm=DEDUP_NUM_PERM, bands=DEDUP_BANDS):
+    """
+    Find near-duplicate chunks with MinHash/LSH, keeping the first occurrence
+
+    Args:
+        texts (list): Chunk texts in document order
+        threshold (float): Estimated Jaccard similarity above which chunks are duplicates
+        num_perm (int): Number of hash permutations (must be divisible by bands)
+        bands (int): LSH bands
+
+    Returns:
+        list: Indices of the chunks to keep, in order
+    """
+    if len(texts) < 2:
+        return list(range(len(texts)))
+
+    signatures = minhash_signatures(texts, num_perm=num_perm)
+    rows = num_perm // bands
+
+    buckets = defaultdict(list)
+    keep = []
+    for i in range(len(texts)):
+        sig = signatures[i]
+        band_keys = [(band, sig[band * rows:(band + 1) * rows].tobytes()) for band in range(bands)]
+
+        # Only compare against kept chunks that share at least one band
+        candidates = {j for key in band_keys for j in buckets.get(key, ())}
+        duplicate = any(np.mean(signatures[j] == sig) >= threshold for j in candidates)
+
+        if not duplicate:
+            keep.append(i)
+            for key in band_keys:
+                buckets[key].append(i)
+
+    dropped = len(texts) - len(keep)
+    if dropped:
+        print(f"✅ Dropped {dropped} near-duplicate chunks")
+    return keep
@@ -4,7 +4,14 @@
 #neww
 
 import re
-from config.config import ESG_WEIGHTS
+import threading
+import numpy as np
+from config.config import (
+    ESG_WEIGHTS, ESG_SECTION_SIZE, ESG_SEMANTIC_WEIGHT, ESG_SEMANTIC_SCALE, ESG_SEMANTIC_MIN_SIMILARITY
+)
+from utils.chunker import iter_chunks, group_chunks, chunk_texts
+from utils.chunk_store import ChunkStore
+from utils.metrics import timed, incr
 from collections import defaultdict
 import sys
 import platform
@@ -106,39 +113,132 @@ def calculate_keyword_score_fast(text, category):
     }
 
 
-def smart_chunk_text(text, chunk_size=20000):
+# Rows of the prototype matrix: a positive and a negative vector per category
+PROTOTYPE_ROWS = [
+    (category, sentiment)
+    for category in ["environmental", "social", "governance"]
+    for sentiment in ["positive", "negative"]
+]
+
+# Prototype matrices per embedding model, built once from the keyword lists
+_prototypes = {}
+_prototypes_lock = threading.Lock()
+
+
+def build_esg_prototypes(embedding_model):
+    """
+    Embed the scoring keywords into one prototype vector per category and sentiment
+
+    Each prototype is the keyword vectors' mean, weighted by the keyword scores.
+
+    Args:
+        embedding_model (EmbeddingModel): Model that produced the chunk embeddings
+
+    Returns:
+        np.ndarray: (6, dimension) unit vectors ordered as PROTOTYPE_ROWS, or None if encoding failed
+    """
+    key = id(embedding_model)
+    with _prototypes_lock:
+        if key in _prototypes:
+            return _prototypes[key]
+
+        phrases, weights, rows = [], [], []
+        for row, (category, sentiment) in enumerate(PROTOTYPE_ROWS):
+            for kw, weight in ESG_SCORING_KEYWORDS[category][sentiment].items():
+                phrases.append(kw)
+                weights.append(abs(weight))
+                rows.append(row)
+
+        vectors = embedding_model.encode_texts(phrases)
+        if vectors is None:
+            return None
+        # Not in place: embedding server results are read-only views on the received buffer
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        prototypes = np.zeros((len(PROTOTYPE_ROWS), vectors.shape[1]), dtype=np.float32)
+        np.add.at(prototypes, np.array(rows), vectors * np.array(weights, dtype=np.float32)[:, None])
+        prototypes /= np.maximum(np.linalg.norm(prototypes, axis=1, keepdims=True), 1e-12)
+
+        _prototypes[key] = prototypes
+        return prototypes
+
+
+def calculate_semantic_scores(embeddings, embedding_model=None):
+    """
+    Score each category from chunk embeddings already computed for the RAG index
+
+    Every chunk is compared with all prototypes in one matrix multiply. Chunks
+    close enough to a category's prototypes count towards it with their
+    positive-minus-negative similarity margin.
+
+    Args:
+        embeddings (np.ndarray): (chunks, dimension) chunk vectors
+        embedding_model (EmbeddingModel): Model that produced them (defaults to the global one)
+
+    Returns:
+        dict: category -> {"score", "chunks"}, or None if no prototypes could be built.
+              "score" is None for a category no chunk is relevant to.
+    """
+    if embeddings is None or len(embeddings) == 0:
+        return None
+
+    if embedding_model is None:
+        from models.embeddings import get_embedding_model
+        embedding_model = get_embedding_model()
+
+    prototypes = build_esg_prototypes(embedding_model)
+    if prototypes is None:
+        return None
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarities = vectors @ prototypes.T
+
+    results = {}
+    for row in range(0, len(PROTOTYPE_ROWS), 2):
+        category = PROTOTYPE_ROWS[row][0]
+        positive, negative = similarities[:, row], similarities[:, row + 1]
+        relevant = np.maximum(positive, negative) >= ESG_SEMANTIC_MIN_SIMILARITY
+
+        score = None  # No evidence; the keyword score is used alone
+        if relevant.any():
+            margin = float((positive - negative)[relevant].mean())
+            # Neutral base 3.0, as for keywords
+            score = round(max(1.0, min(5.0, 3.0 + ESG_SEMANTIC_SCALE * margin)), 2)
+
+        results[category] = {"score": score, "chunks": int(relevant.sum())}
+
+    incr("semantic_scored_chunks", len(vectors))
+    return results
+
+
+def smart_chunk_text(text, chunk_size=ESG_SECTION_SIZE):
     """
     Smart chunking that splits on paragraph boundaries
     Larger chunks for faster processing
     """
-    chunks = []
-    current_chunk = ""
-    
-    # Split by paragraphs (double newline)
-    paragraphs = text.split('\n\n')
-    
-    for para in paragraphs:
-        if len(current_chunk) + len(para) < chunk_size:
-            current_chunk += para + "\n\n"
-        else:
-            if current_chunk:
-                chunks.append(current_chunk)
-            current_chunk = para + "\n\n"
-    
-    if current_chunk:
-        chunks.append(current_chunk)
-    
+    spans = iter_chunks(text, chunk_size=chunk_size, chunk_overlap=0, length_unit="chars")
+    chunks = chunk_texts(text, spans)
     return chunks if chunks else [text]
 
 
-def calculate_overall_esg_score(full_text, progress_callback=None, use_parallel=False):
+@timed("score")
+def calculate_overall_esg_score(full_text, progress_callback=None, use_parallel=False, chunks=None,
+                                embeddings=None, semantic_weight=ESG_SEMANTIC_WEIGHT):
     """
     Optimized ESG score calculation - SEQUENTIAL processing for Windows compatibility
     
     Args:
-        full_text (str): Complete document text
+        full_text (str): Complete document text (may be None when chunks is a ChunkStore)
         progress_callback (callable): Optional callback(progress, message)
         use_parallel (bool): Ignored on Windows, always uses sequential
+        chunks (list | ChunkStore): RAG chunk spans of full_text, or the document's
+            ChunkStore (optional). When given they are grouped into scoring sections
+            instead of chunking the text again.
+        embeddings (np.ndarray): RAG chunk embeddings (optional). When given, an
+            embedding-based score is blended into each category score.
+        semantic_weight (float): Share of the embedding-based score in the blend
     
     Returns:
         dict: ESG scoring results
@@ -147,9 +247,16 @@ def calculate_overall_esg_score(full_text, progress_callback=None, use_parallel=
         if progress_callback:
             progress_callback(5, "🔍 Preparing text analysis...")
         
-        # Smart chunking - larger chunks, fewer iterations
-        chunks = smart_chunk_text(full_text, chunk_size=20000)
+        # Larger sections, fewer iterations - reuse the RAG chunk spans when available
+        if isinstance(chunks, ChunkStore):
+            sections = group_chunks(chunks.iter_spans(), ESG_SECTION_SIZE)
+            chunks = [chunks.slice(s.start, s.end) for s in sections] or [""]
+        elif chunks:
+            chunks = chunk_texts(full_text, group_chunks(chunks, ESG_SECTION_SIZE)) or [full_text]
+        else:
+            chunks = smart_chunk_text(full_text, chunk_size=ESG_SECTION_SIZE)
         num_chunks = len(chunks)
+        incr("score_sections", num_chunks)
         
         print(f"🔹 Processing {num_chunks} smart chunks (sequential mode)...")
         
@@ -204,6 +311,22 @@ def calculate_overall_esg_score(full_text, progress_callback=None, use_parallel=
         env_avg = sum(env_scores) / len(env_scores)
         soc_avg = sum(soc_scores) / len(soc_scores)
         gov_avg = sum(gov_scores) / len(gov_scores)
+        keyword_avgs = {"environmental": env_avg, "social": soc_avg, "governance": gov_avg}
+        
+        # Blend in the embedding-based score - no extra model pass over the chunks
+        semantic = None
+        if embeddings is not None and semantic_weight > 0:
+            if progress_callback:
+                progress_callback(85, "🧠 Comparing chunk embeddings...")
+            semantic = calculate_semantic_scores(embeddings)
+        if semantic:
+            # Categories without relevant chunks keep their keyword score
+            if semantic["environmental"]["chunks"]:
+                env_avg = (1 - semantic_weight) * env_avg + semantic_weight * semantic["environmental"]["score"]
+            if semantic["social"]["chunks"]:
+                soc_avg = (1 - semantic_weight) * soc_avg + semantic_weight * semantic["social"]["score"]
+            if semantic["governance"]["chunks"]:
+                gov_avg = (1 - semantic_weight) * gov_avg + semantic_weight * semantic["governance"]["score"]
         
         # Deduplicate signals and take top ones
         env_pos_unique = list(dict.fromkeys(env_pos))[:10]
@@ -238,18 +361,25 @@ def calculate_overall_esg_score(full_text, progress_callback=None, use_parallel=
             "overall_score": round(overall, 2),
             "risk_level": risk_level,
             "risk_emoji": emoji,
+            "scoring_mode": "keyword+semantic" if semantic else "keyword",
             "environmental": {
                 "score": round(env_avg, 2),
+                "keyword_score": round(keyword_avgs["environmental"], 2),
+                "semantic_score": semantic["environmental"]["score"] if semantic else None,
                 "positive_signals": env_pos_unique,
                 "negative_signals": env_neg_unique
             },
             "social": {
                 "score": round(soc_avg, 2),
+                "keyword_score": round(keyword_avgs["social"], 2),
+                "semantic_score": semantic["social"]["score"] if semantic else None,
                 "positive_signals": soc_pos_unique,
                 "negative_signals": soc_neg_unique
             },
             "governance": {
                 "score": round(gov_avg, 2),
+                "keyword_score": round(keyword_avgs["governance"], 2),
+                "semantic_score": semantic["governance"]["score"] if semantic else None,
                 "positive_signals": gov_pos_unique,
                 "negative_signals": gov_neg_unique
             },
@@ -264,8 +394,33 @@ def calculate_overall_esg_score(full_text, progress_callback=None, use_parallel=
         return None
 
 
-def generate_score_summary(scores):
-    """Create a readable summary of ESG scores"""
+def format_peer_comparison(peer_stats):
+    """Markdown section comparing a score with its peers (see ScoreStore.peer_stats)"""
+    group = " ".join(str(part) for part in (peer_stats["sector"], peer_stats["year"]) if part) or "all sectors"
+    pct = peer_stats["percentiles"]
+    top = []
+    for peer in peer_stats["top_peers"]:
+        name = peer["company"] or "Unnamed"
+        if peer["year"]:
+            name += f" ({peer['year']})"
+        top.append(f"{name}: {peer['score']}")
+    top = ", ".join(top)
+    return f"""
+### 📈 Peer Comparison ({peer_stats['peers']} peers, {group})
+**Overall:** better than {pct['overall']}% of peers
+**Percentile rank:** 🌍 {pct['environmental']} | 👥 {pct['social']} | 🏛️ {pct['governance']}
+**Top peers:** {top or 'None'}
+"""
+
+
+def generate_score_summary(scores, peer_stats=None):
+    """
+    Create a readable summary of ESG scores
+    
+    Args:
+        scores (dict): Result of calculate_overall_esg_score
+        peer_stats (dict): Peer comparison from ScoreStore.peer_stats (optional)
+    """
     if not scores:
         return "Unable to generate score summary."
     
@@ -289,6 +444,8 @@ def generate_score_summary(scores):
 **Strengths:** {', '.join(gov['positive_signals'][:5]) or 'None identified'}
 **Risks:** {', '.join(gov['negative_signals'][:5]) or 'None identified'}
 """
+    if peer_stats:
+        summary += format_peer_comparison(peer_stats)
     return summary
 
 
@@ -0,0 +1,313 @@
+import os
+import io
+import json
+import time
+import sqlite3
+import socket
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config.config import DATA_DIR, JOB_MAX_WORKERS
+from utils.metrics import incr, span
+from utils.precompute import run_precompute_job
+
+# Job states
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+def content_hash(data):
+    """SHA-256 of bytes or text, used to deduplicate identical jobs"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def current_owner():
+    """Job owner id of this process, as "host:pid" """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def owner_alive(owner):
+    """
+    Whether the process that owns a job is still running
+
+    Owners on other hosts can't be checked and are assumed alive.
+
+    Args:
+        owner (str): "host:pid" recorded with the job (None for old rows)
+
+    Returns:
+        bool: False if the owner has exited
+    """
+    if not owner:
+        return False
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname():
+        return True
+    pid = int(pid)
+    if pid == os.getpid() or os.name == "nt":
+        # Our pid reused after a restart; on Windows os.kill(pid, 0) would kill it
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    Local background job runner with a persistent SQLite job table
+
+    Several processes (e.g. API workers) can share one job table. Each job
+    records the process running it, and a process starting up only fails
+    unfinished jobs whose owner has exited.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, max_workers=JOB_MAX_WORKERS):
+        """
+        Initialize the job queue
+
+        Args:
+            data_dir (str): Directory for the job table and job outputs
+            max_workers (int): Worker threads
+        """
+        self.data_dir = data_dir
+        os.makedirs(os.path.join(data_dir, "jobs"), exist_ok=True)
+
+        self._db = sqlite3.connect(os.path.join(data_dir, "jobs.db"), check_same_thread=False)
+        self._db_lock = threading.Lock()
+        self._submit_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="esg-job")
+        self._handlers = {}
+
+        with self._db_lock, self._db:
+            self._db.execute(_SCHEMA)
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(jobs)")]
+            if "owner" not in columns:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+            # Jobs cut off by a restart can't resume; resubmitting runs them again.
+            # Jobs of other live workers are left alone.
+            unfinished = self._db.execute(
+                "SELECT id, owner FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+            now = time.time()
+            self._db.executemany(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                [
+                    (FAILED, "Interrupted by restart", now, job_id)
+                    for job_id, owner in unfinished if not owner_alive(owner)
+                ]
+            )
+
+    def register(self, kind, handler):
+        """
+        Register a job handler
+
+        Args:
+            kind (str): Job kind, e.g. "ingest" or "score"
+            handler (callable): handler(payload, progress_callback, job_dir) -> JSON-serializable result
+        """
+        self._handlers[kind] = handler
+
+    def job_dir(self, job_id):
+        """Directory where a job keeps its outputs"""
+        return os.path.join(self.data_dir, "jobs", job_id.replace(":", "_"))
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._db_lock, self._db:
+            self._db.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def submit(self, kind, payload, key=None):
+        """
+        Submit a job, reusing an identical queued, running or finished one
+
+        Args:
+            kind (str): Registered job kind
+            payload: Handler input
+            key (str): Content hash identifying the job (defaults to a hash of payload)
+
+        Returns:
+            str: Job id
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind: {kind}")
+
+        key = key or content_hash(payload)
+        job_id = f"{kind}:{key}"
+
+        with self._submit_lock:
+            existing = self.get(job_id)
+            if existing and existing["status"] != FAILED:
+                incr("job_dedup_hits")
+                return job_id
+
+            now = time.time()
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO jobs (id, kind, content_hash, status, progress, message, "
+                    "result, error, owner, created_at, updated_at) VALUES (?, ?, ?, ?, 0, ?, NULL, NULL, ?, ?, ?)",
+                    (job_id, kind, key, QUEUED, "⏳ Queued...", current_owner(), now, now)
+                )
+
+        incr("jobs_submitted")
+        self._executor.submit(self._run, job_id, kind, payload)
+        return job_id
+
+    def _run(self, job_id, kind, payload):
+        """Execute a job on a worker thread and record its outcome"""
+        def progress_callback(progress, message):
+            self._update(job_id, progress=int(progress), message=message)
+
+        self._update(job_id, status=RUNNING)
+        try:
+            job_dir = self.job_dir(job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            with span(f"job_{kind}"):
+                result = self._handlers[kind](payload, progress_callback, job_dir)
+            self._update(job_id, status=DONE, progress=100, result=json.dumps(result))
+        except Exception as e:
+            print(f"❌ Job {job_id} failed: {e}")
+            incr("jobs_failed")
+            self._update(job_id, status=FAILED, error=str(e), message="❌ Error occurred")
+
+    def get(self, job_id):
+        """
+        Get a job's status
+
+        Args:
+            job_id (str): Job id from submit()
+
+        Returns:
+            dict: status, progress, message, result and error, or None if unknown
+        """
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT status, progress, message, result, error FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, progress, message, result, error = row
+        return {
+            "id": job_id,
+            "status": status,
+            "progress": progress,
+            "message": message,
+            "result": json.loads(result) if result else None,
+            "error": error,
+        }
+
+    def wait(self, job_id, timeout=None, poll_interval=0.2):
+        """Block until a job finishes (for scripts and tests; the UI polls get())"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in (DONE, FAILED):
+                return job
+            if deadline is not None and time.time() > deadline:
+                return job
+            time.sleep(poll_interval)
+
+
+def run_ingest_job(pdf_bytes, progress_callback, job_dir):
+    """
+    Ingest job: extract, chunk, deduplicate and embed a PDF
+
+    Args:
+        pdf_bytes (bytes): Uploaded PDF content
+        progress_callback (callable): callback(progress, message)
+        job_dir (str): Directory for the saved store and embeddings
+
+    Returns:
+        dict: Paths of the saved chunk store and embeddings, and the chunk count
+    """
+    import numpy as np
+    from utils.pdf_processor import process_pdf_to_store
+    from utils.rag_engine import embed_store
+
+    progress_callback(5, "📄 Extracting text...")
+    store = process_pdf_to_store(io.BytesIO(pdf_bytes))
+    if not store:
+        raise ValueError("No text could be extracted from the PDF")
+
+    progress_callback(20, f"🔄 Embedding {len(store)} chunks...")
+    embeddings = embed_store(
+        store,
+        progress_callback=lambda done, total: progress_callback(20 + int(75 * done / total), f"🔄 Embedded {done}/{total} chunks...")
+    )
+    if embeddings is None:
+        raise RuntimeError("Embedding failed")
+
+    store_path = os.path.join(job_dir, "store")
+    embeddings_path = os.path.join(job_dir, "embeddings.npy")
+    store.save(store_path)
+    np.save(embeddings_path, embeddings)
+
+    return {"store_path": store_path, "embeddings_path": embeddings_path, "num_chunks": len(store)}
+
+
+def run_score_job(store_path, progress_callback, job_dir):
+    """
+    Score job: ESG scoring over an ingested document's chunk store
+
+    The ingest job's embeddings, saved next to the store, are reused for the
+    semantic part of the score.
+
+    Args:
+        store_path (str): Saved ChunkStore directory from an ingest job
+        progress_callback (callable): callback(progress, message)
+        job_dir (str): Job output directory (unused)
+
+    Returns:
+        dict: ESG scoring results
+    """
+    import numpy as np
+    from utils.chunk_store import ChunkStore
+    from utils.esg_scorer import calculate_overall_esg_score
+
+    store = ChunkStore.load(store_path)
+    embeddings_path = os.path.join(os.path.dirname(store_path), "embeddings.npy")
+    embeddings = np.load(embeddings_path, mmap_mode="r") if os.path.exists(embeddings_path) else None
+
+    result = calculate_overall_esg_score(
+        None, progress_callback=progress_callback, chunks=store, embeddings=embeddings
+    )
+    if result is None:
+        raise RuntimeError("ESG scoring failed")
+    return result
+
+
+# Global job queue instance
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Get or create the global job queue with the ingest, score and precompute handlers registered"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+            _job_queue.register("ingest", run_ingest_job)
+            _job_queue.register("score", run_score_job)
+            _job_queue.register("precompute", run_precompute_job)
+    return _job_queue
@@ -0,0 +1,275 @@
+import json
+import time
+import logging
+import threading
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config.config import METRICS_ENABLED, METRICS_LOG_FILE
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled = METRICS_ENABLED
+_logger = logging.getLogger("esg.metrics")
+_logger.propagate = False
+
+
+class _NullSpan:
+    """No-op span returned when instrumentation is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Times a pipeline stage and records it on exit"""
+
+    def __init__(self, stage, fields):
+        self.stage = stage
+        self.fields = fields
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _registry.observe(self.stage, duration)
+        log_event("span", stage=self.stage, duration_ms=round(duration * 1000, 3),
+                  error=exc_type.__name__ if exc_type else None, **self.fields)
+        return False
+
+    def set(self, **fields):
+        """Attach extra fields to the span's log record"""
+        self.fields.update(fields)
+
+
+class MetricsRegistry:
+    """Process-wide counters and stage latency histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = self.histograms[stage] = {
+                    "count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * len(LATENCY_BUCKETS)
+                }
+            hist["count"] += 1
+            hist["sum"] += seconds
+            hist["max"] = max(hist["max"], seconds)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    hist["buckets"][i] += 1
+                    break
+
+    def snapshot(self):
+        """Copy of all metrics as plain dicts"""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "stages": {
+                    stage: {
+                        "count": h["count"],
+                        "sum_seconds": round(h["sum"], 6),
+                        "max_seconds": round(h["max"], 6),
+                        "avg_seconds": round(h["sum"] / h["count"], 6) if h["count"] else 0.0,
+                    }
+                    for stage, h in self.histograms.items()
+                },
+            }
+
+    def render_prometheus(self):
+        """Render metrics in the Prometheus text exposition format"""
+        with self._lock:
+            lines = ["# TYPE esg_stage_duration_seconds histogram"]
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, h["buckets"]):
+                    cumulative += count
+                    lines.append(f'esg_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'esg_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {h["count"]}')
+                lines.append(f'esg_stage_duration_seconds_sum{{stage="{stage}"}} {h["sum"]:.6f}')
+                lines.append(f'esg_stage_duration_seconds_count{{stage="{stage}"}} {h["count"]}')
+
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE esg_{name}_total counter")
+                lines.append(f"esg_{name}_total {value}")
+
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f"# TYPE esg_{name} gauge")
+                lines.append(f"esg_{name} {value}")
+
+            return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    """Get the process-wide metrics registry"""
+    return _registry
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable_metrics(enabled=True, log_file=METRICS_LOG_FILE):
+    """
+    Turn instrumentation on or off at runtime
+
+    Args:
+        enabled (bool): Whether to record metrics
+        log_file (str): File for JSON log lines (stderr if empty)
+    """
+    global _enabled
+    _enabled = enabled
+    if enabled and not _logger.handlers:
+        handler = logging.FileHandler(log_file) if log_file else logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+
+
+def span(stage, **fields):
+    """
+    Time a pipeline stage
+
+    Usage:
+        with span("retrieve", top_k=3):
+            ...
+
+    Args:
+        stage (str): Stage name (extract, chunk, embed, index_build, retrieve, search, llm, score, ...)
+        **fields: Extra fields for the JSON log record
+
+    Returns:
+        Context manager (a shared no-op when instrumentation is disabled)
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(stage, fields)
+
+
+def timed(stage):
+    """Decorator form of span()"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(stage, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def incr(name, value=1):
+    """Increment a counter (no-op when instrumentation is disabled)"""
+    if _enabled:
+        _registry.incr(name, value)
+
+
+def set_gauge(name, value):
+    """Set a gauge (no-op when instrumentation is disabled)"""
+    if _enabled:
+        _registry.set_gauge(name, value)
+
+
+def observe(stage, seconds):
+    """Record a duration measured elsewhere, e.g. a queue wait (no-op when instrumentation is disabled)"""
+    if _enabled:
+        _registry.observe(stage, seconds)
+
+
+def log_event(event, **fields):
+    """Write one structured JSON log line (no-op when instrumentation is disabled)"""
+    if _enabled:
+        record = {"ts": round(time.time(), 3), "event": event}
+        record.update({k: v for k, v in fields.items() if v is not None})
+        _logger.info(json.dumps(record, default=str))
+
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text format"""
+    return _registry.render_prometheus()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves /metrics (Prometheus text) and /metrics.json"""
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = render_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(_registry.snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """
+    Start the metrics endpoint on a background thread (once per process)
+
+    Args:
+        port (int): Port to listen on
+        host (str): Interface to bind
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+    global _metrics_server
+    with _server_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+            print(f"✅ Metrics endpoint on http://{host}:{_metrics_server.server_address[1]}/metrics")
+        return _metrics_server
+
+
+if _enabled:
+    enable_metrics(True)
@@ -1,63 +1,135 @@
 from PyPDF2 import PdfReader
-# from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from config.config import CHUNK_SIZE, CHUNK_OVERLAP
+from config.config import CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_LENGTH_UNIT, DEDUP_ENABLED
+from utils.chunker import iter_chunks, chunk_texts
+from utils.chunk_store import ChunkStore
+from utils.dedup import strip_repeated_lines, deduplicate_chunks
+from utils.metrics import span, incr
 
-def extract_text_from_pdf(pdf_file):
+def extract_pages_from_pdf(pdf_file):
     """
-    Extract text from uploaded PDF file
+    Extract the text of each page of an uploaded PDF file
     
     Args:
         pdf_file: Streamlit uploaded file object
         
     Returns:
-        str: Extracted text from PDF
+        list: Page texts ("" for pages without text), or None if error
     """
     try:
-        pdf_reader = PdfReader(pdf_file)
-        text = ""
-        
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-        
-        if not text.strip():
-            return None
-            
-        print(f"✅ Extracted {len(text)} characters from PDF")
-        return text
+        with span("extract") as s:
+            pdf_reader = PdfReader(pdf_file)
+            pages = [page.extract_text() or "" for page in pdf_reader.pages]
+            s.set(pages=len(pages))
+        return pages
         
     except Exception as e:
         print(f"❌ Error extracting PDF text: {e}")
         return None
 
-def split_text_into_chunks(text):
+def join_pages(pages):
     """
-    Split text into chunks for RAG
+    Join page texts into one document, recording where each page starts
+    
+    Args:
+        pages (list): Page texts
+        
+    Returns:
+        tuple: (text, page_starts) where page_starts[i] is the offset of page i+1,
+               or (None, None) if no text was found
+    """
+    parts = []
+    page_starts = []
+    offset = 0
+    
+    for page_text in pages:
+        page_starts.append(offset)
+        if page_text:
+            parts.append(page_text)
+            parts.append("\n")
+            offset += len(page_text) + 1
+    
+    text = "".join(parts)
+    if not text.strip():
+        return None, None
+    
+    print(f"✅ Extracted {len(text)} characters from {len(page_starts)} pages")
+    return text, page_starts
+
+def extract_text_with_pages(pdf_file):
+    """
+    Extract text from uploaded PDF file, keeping page boundaries
+    
+    Args:
+        pdf_file: Streamlit uploaded file object
+        
+    Returns:
+        tuple: (text, page_starts) where page_starts[i] is the offset of page i+1,
+               or (None, None) if no text was found
+    """
+    pages = extract_pages_from_pdf(pdf_file)
+    if pages is None:
+        return None, None
+    return join_pages(pages)
+
+def extract_text_from_pdf(pdf_file):
+    """
+    Extract text from uploaded PDF file
+    
+    Args:
+        pdf_file: Streamlit uploaded file object
+        
+    Returns:
+        str: Extracted text from PDF
+    """
+    text, _ = extract_text_with_pages(pdf_file)
+    return text
+
+def split_text_into_spans(text, page_starts=None, chunk_size=CHUNK_SIZE,
+                          chunk_overlap=CHUNK_OVERLAP, length_unit=CHUNK_LENGTH_UNIT):
+    """
+    Split text into offset-preserving chunk spans for RAG
     
     Args:
         text (str): Full text to split
+        page_starts (list): Page start offsets from extract_text_with_pages (optional)
+        chunk_size (int): Maximum chunk length
+        chunk_overlap (int): Overlap between consecutive chunks
+        length_unit (str): "chars" or "tokens"
         
     Returns:
-        list: List of text chunks
+        list: List of Chunk(start, end, page) spans
     """
     try:
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-            length_function=len,
-            separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
-        )
-        
-        chunks = text_splitter.split_text(text)
-        print(f"✅ Split text into {len(chunks)} chunks")
-        return chunks
+        with span("chunk", chars=len(text)):
+            spans = list(iter_chunks(
+                text,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                page_starts=page_starts,
+                length_unit=length_unit
+            ))
+        incr("chunks_created", len(spans))
+        print(f"✅ Split text into {len(spans)} chunks")
+        return spans
         
     except Exception as e:
         print(f"❌ Error splitting text: {e}")
         return []
 
+def split_text_into_chunks(text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Split text into chunks for RAG
+    
+    Args:
+        text (str): Full text to split
+        chunk_size (int): Maximum chunk length
+        chunk_overlap (int): Overlap between consecutive chunks
+        
+    Returns:
+        list: List of text chunks
+    """
+    return chunk_texts(text, split_text_into_spans(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap))
+
 def process_pdf(pdf_file):
     """
     Process PDF file: extract text and split into chunks
@@ -83,4 +155,64 @@ def process_pdf(pdf_file):
         
     except Exception as e:
         print(f"❌ Error processing PDF: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def process_pdf_with_offsets(pdf_file, remove_boilerplate=False):
+    """
+    Process PDF file once: extract text and split it into chunk spans
+    
+    Args:
+        pdf_file: Streamlit uploaded file object
+        remove_boilerplate (bool): Strip headers/footers repeated across pages
+        
+    Returns:
+        tuple: (text, spans) or None if error
+    """
+    try:
+        pages = extract_pages_from_pdf(pdf_file)
+        if not pages:
+            return None
+        
+        if remove_boilerplate:
+            pages = strip_repeated_lines(pages)
+        
+        text, page_starts = join_pages(pages)
+        if not text:
+            return None
+        
+        spans = split_text_into_spans(text, page_starts)
+        if not spans:
+            return None
+        
+        return text, spans
+        
+    except Exception as e:
+        print(f"❌ Error processing PDF: {e}")
+        return None
+
+def process_pdf_to_store(pdf_file, deduplicate=DEDUP_ENABLED):
+    """
+    Process PDF file into a ChunkStore holding the document text once
+    
+    Args:
+        pdf_file: Streamlit uploaded file object
+        deduplicate (bool): Drop repeated headers/footers and near-duplicate chunks
+        
+    Returns:
+        ChunkStore: Chunk store with offsets and pages, or None if error
+    """
+    processed = process_pdf_with_offsets(pdf_file, remove_boilerplate=deduplicate)
+    if not processed:
+        return None
+    
+    text, spans = processed
+    store = ChunkStore.from_spans(text, spans)
+    
+    if deduplicate:
+        with span("dedup", chunks=len(store)):
+            keep = deduplicate_chunks(chunk_texts(text, spans))
+        incr("chunks_deduplicated", len(store) - len(keep))
+        if len(keep) < len(store):
+            store = store.select(keep)
+    
+    return store
\ No newline at end of file
@@ -0,0 +1,120 @@
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.metrics import incr
+from config.config import (
+    TOP_K_RESULTS, PRECOMPUTE_ENABLED, PRECOMPUTE_MAX_CONCURRENCY, PRECOMPUTE_RESPONSE_MODES,
+    PRECOMPUTE_MIN_SUCCESS_RATIO, STANDARD_QUESTIONS
+)
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+
+def normalize_question(question):
+    """Lookup key for a question: lowercase, no punctuation or extra whitespace"""
+    return " ".join(_NON_WORD.sub(" ", question.lower()).split())
+
+
+def answer_key(question, response_mode):
+    return f"{response_mode}:{normalize_question(question)}"
+
+
+def run_precompute_job(payload, progress_callback, job_dir):
+    """
+    Precompute job: answer the standard questions for an ingested document
+
+    Args:
+        payload (dict): "doc_id", "store_path" and "embeddings_path" from the ingest job
+        progress_callback (callable): callback(progress, message)
+        job_dir (str): Job output directory (unused)
+
+    Returns:
+        dict: answer_key(question, mode) -> answer
+
+    Raises:
+        RuntimeError: If too few questions were answered, so the job is marked
+            failed and the next submit runs it again
+    """
+    from models.llm import get_llm, BATCH
+    from utils.rag_engine import get_index_registry
+    from utils.chat_pipeline import context_parts_for, build_prompt, max_tokens_for_mode
+
+    engine = get_index_registry().get_or_load(payload["doc_id"], payload["store_path"], payload["embeddings_path"])
+    if engine is None:
+        raise RuntimeError("Failed to load document index")
+    # Queued behind interactive chat turns in the LLM scheduler
+    llm = get_llm().bind(session_id=f"precompute:{payload['doc_id']}", priority=BATCH)
+
+    # One batched retrieval for all questions, shared by every response mode.
+    # Document-only context; standard questions don't ask for recent news.
+    retrieved = engine.retrieve_many(STANDARD_QUESTIONS, top_k=TOP_K_RESULTS)
+    contexts = {question: context_parts_for(chunks) for question, chunks in zip(STANDARD_QUESTIONS, retrieved)}
+
+    tasks = [(question, mode) for mode in PRECOMPUTE_RESPONSE_MODES for question in STANDARD_QUESTIONS]
+    answers = {}
+
+    def answer(question, mode):
+        prompt = build_prompt(question, contexts[question], mode)
+        return llm.generate_response(prompt, max_tokens=max_tokens_for_mode(mode))
+
+    with ThreadPoolExecutor(max_workers=PRECOMPUTE_MAX_CONCURRENCY, thread_name_prefix="esg-precompute") as pool:
+        futures = {pool.submit(answer, question, mode): (question, mode) for question, mode in tasks}
+        for done, future in enumerate(as_completed(futures), 1):
+            question, mode = futures[future]
+            response = future.result()
+            # Failed calls are left out and answered live instead
+            if response and not response.startswith("Error:"):
+                answers[answer_key(question, mode)] = response
+            progress_callback(int(100 * done / len(tasks)), f"💬 Answered {done}/{len(tasks)} standard questions...")
+
+    if len(answers) < max(1, PRECOMPUTE_MIN_SUCCESS_RATIO * len(tasks)):
+        incr("precompute_failures")
+        raise RuntimeError(f"Only {len(answers)} of {len(tasks)} standard questions were answered")
+
+    incr("precomputed_answers", len(answers))
+    return answers
+
+
+def submit_precompute_job(job_queue, doc_id, ingest_result):
+    """
+    Queue the standard questions for a freshly ingested document
+
+    Args:
+        job_queue (JobQueue): Queue with the "precompute" handler registered
+        doc_id (str): Document content hash
+        ingest_result (dict): Result of the document's ingest job
+
+    Returns:
+        str: Job id, or None when precomputation is disabled
+    """
+    if not PRECOMPUTE_ENABLED:
+        return None
+    payload = {
+        "doc_id": doc_id,
+        "store_path": ingest_result["store_path"],
+        "embeddings_path": ingest_result["embeddings_path"],
+    }
+    return job_queue.submit("precompute", payload, key=doc_id)
+
+
+def lookup_answer(job_queue, doc_id, question, response_mode):
+    """
+    Precomputed answer for a question, if the document's precompute job has one
+
+    Args:
+        job_queue (JobQueue): Job queue
+        doc_id (str): Document content hash
+        question (str): User query
+        response_mode (str): "Concise" or "Detailed"
+
+    Returns:
+        str: Answer, or None
+    """
+    if not PRECOMPUTE_ENABLED or not doc_id:
+        return None
+    job = job_queue.get(f"precompute:{doc_id}")
+    if job is None or job["status"] != "done":
+        return None
+    answer = job["result"].get(answer_key(question, response_mode))
+    if answer:
+        incr("precomputed_answer_hits")
+    return answer
@@ -1,8 +1,40 @@
-# import faiss
-from langchain_community.vectorstores import faiss
+import faiss
+import threading
 import numpy as np
+from collections import OrderedDict
 from models.embeddings import get_embedding_model
-from config.config import TOP_K_RESULTS
+from utils.chunk_store import ChunkStore
+from utils.metrics import span, timed, incr, set_gauge
+from config.config import TOP_K_RESULTS, EMBEDDING_BATCH_SIZE, INDEX_REGISTRY_SIZE
+
+def embed_store(store, progress_callback=None, batch_size=EMBEDDING_BATCH_SIZE, embedding_model=None):
+    """
+    Embed all chunks of a store in batches
+    
+    Args:
+        store (ChunkStore): Chunks to embed
+        progress_callback (callable): Optional callback(done, total) after each batch
+        batch_size (int): Chunks per encode_texts call
+        embedding_model (EmbeddingModel): Model to use (defaults to the global one)
+        
+    Returns:
+        np.ndarray: float32 embeddings, or None if encoding failed
+    """
+    embedding_model = embedding_model or get_embedding_model()
+    total = len(store)
+    parts = []
+    
+    for start in range(0, total, batch_size):
+        batch = embedding_model.encode_texts(store.get_chunks(range(start, min(start + batch_size, total))))
+        if batch is None:
+            return None
+        parts.append(np.asarray(batch, dtype=np.float32))
+        if progress_callback:
+            progress_callback(min(start + batch_size, total), total)
+    
+    if not parts:
+        return np.zeros((0, embedding_model.get_embedding_dimension()), dtype=np.float32)
+    return np.concatenate(parts)
 
 class RAGEngine:
     """Retrieval-Augmented Generation Engine"""
@@ -11,7 +43,8 @@ class RAGEngine:
         """Initialize RAG engine"""
         self.embedding_model = get_embedding_model()
         self.index = None
-        self.chunks = []
+        self.store = None
+        self.embeddings = None  # Chunk vectors, kept for reuse (e.g. semantic ESG scoring)
         self.dimension = self.embedding_model.get_embedding_dimension()
     
     def build_index(self, text_chunks):
@@ -19,30 +52,58 @@ class RAGEngine:
         Build FAISS index from text chunks
         
         Args:
-            text_chunks (list): List of text chunks
+            text_chunks (list | ChunkStore): List of text chunks, or a ChunkStore
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            if not text_chunks:
+            if text_chunks is None or len(text_chunks) == 0:
                 print("❌ No text chunks provided")
                 return False
             
-            self.chunks = text_chunks
+            if not isinstance(text_chunks, ChunkStore):
+                text_chunks = ChunkStore.from_texts(text_chunks)
             
             # Create embeddings for all chunks
             print(f"🔄 Creating embeddings for {len(text_chunks)} chunks...")
-            embeddings = self.embedding_model.encode_texts(text_chunks)
+            embeddings = self.embedding_model.encode_texts(list(text_chunks))
             
             if embeddings is None:
                 return False
             
-            # Create FAISS index
-            self.index = faiss.IndexFlatL2(self.dimension)
-            self.index.add(embeddings.astype('float32'))
+            return self.build_index_from_embeddings(text_chunks, embeddings)
+            
+        except Exception as e:
+            print(f"❌ Error building index: {e}")
+            return False
+    
+    def build_index_from_embeddings(self, store, embeddings):
+        """
+        Build FAISS index from precomputed chunk embeddings (e.g. from an ingest job)
+        
+        Args:
+            store (ChunkStore): Chunks the embeddings belong to
+            embeddings (np.ndarray): One vector per chunk
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            if len(store) != len(embeddings):
+                print("❌ Embeddings don't match the chunk store")
+                return False
+            
+            with span("index_build", vectors=len(store)):
+                index = faiss.IndexFlatL2(self.dimension)
+                index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
             
-            print(f"✅ FAISS index built with {len(text_chunks)} vectors")
+            self.store = store
+            self.index = index
+            self.embeddings = embeddings
+            set_gauge("index_vectors", len(store))
+            
+            print(f"✅ FAISS index built with {len(store)} vectors")
             return True
             
         except Exception as e:
@@ -60,8 +121,22 @@ class RAGEngine:
         Returns:
             list: List of relevant text chunks
         """
+        return [result["text"] for result in self.retrieve_with_metadata(query, top_k)]
+    
+    @timed("retrieve")
+    def retrieve_with_metadata(self, query, top_k=TOP_K_RESULTS):
+        """
+        Retrieve relevant chunks for a query, with page numbers for citations
+        
+        Args:
+            query (str): Search query
+            top_k (int): Number of results to return
+            
+        Returns:
+            list: List of dicts with "text", "page", "index", "distance" and "score"
+        """
         try:
-            if self.index is None or not self.chunks:
+            if self.index is None or not self.store:
                 print("❌ Index not built yet")
                 return []
             
@@ -74,8 +149,18 @@ class RAGEngine:
             query_vector = np.array([query_embedding]).astype('float32')
             distances, indices = self.index.search(query_vector, top_k)
             
-            # Get relevant chunks
-            relevant_chunks = [self.chunks[idx] for idx in indices[0] if idx < len(self.chunks)]
+            # Materialize only the retrieved chunks
+            relevant_chunks = [
+                {
+                    "text": self.store[idx],
+                    "page": self.store.get_page(idx),
+                    "index": int(idx),
+                    "distance": float(distance),
+                    "score": 1.0 - float(distance) / 2  # Cosine similarity of unit vectors
+                }
+                for idx, distance in zip(indices[0], distances[0])
+                if 0 <= idx < len(self.store)
+            ]
             
             print(f"✅ Retrieved {len(relevant_chunks)} relevant chunks")
             return relevant_chunks
@@ -84,10 +169,79 @@ class RAGEngine:
             print(f"❌ Error retrieving chunks: {e}")
             return []
     
+    @timed("retrieve_many")
+    def retrieve_many(self, queries, top_k=TOP_K_RESULTS):
+        """
+        Retrieve relevant chunks for many queries with one encode and one index search
+        
+        Args:
+            queries (list): Search queries
+            top_k (int): Number of results per query
+            
+        Returns:
+            list: One ranked list per query, of dicts as from retrieve_with_metadata
+        """
+        try:
+            if self.index is None or not self.store:
+                print("❌ Index not built yet")
+                return [[] for _ in queries]
+            if not queries:
+                return []
+            
+            # Embed all queries in one batch and search with the full query matrix
+            query_vectors = self.embedding_model.encode_texts(list(queries))
+            if query_vectors is None:
+                return [[] for _ in queries]
+            distances, indices = self.index.search(np.ascontiguousarray(query_vectors, dtype=np.float32), top_k)
+            incr("queries_retrieved", len(queries))
+            
+            # FAISS pads missing results with -1
+            valid = (indices >= 0) & (indices < len(self.store))
+            scores = 1.0 - distances / 2
+            
+            # Materialize each distinct retrieved chunk once
+            unique = np.unique(indices[valid])
+            texts = dict(zip(unique.tolist(), self.store.get_chunks(unique)))
+            pages = dict(zip(unique.tolist(), (self.store.pages[unique].tolist())))
+            
+            results = []
+            for row in range(len(queries)):
+                row_valid = valid[row]
+                results.append([
+                    {
+                        "text": texts[idx],
+                        "page": pages[idx] or None,
+                        "index": idx,
+                        "distance": distance,
+                        "score": score
+                    }
+                    for idx, distance, score in zip(
+                        indices[row][row_valid].tolist(),
+                        distances[row][row_valid].tolist(),
+                        scores[row][row_valid].tolist()
+                    )
+                ])
+            
+            print(f"✅ Retrieved chunks for {len(queries)} queries")
+            return results
+            
+        except Exception as e:
+            print(f"❌ Error retrieving chunks: {e}")
+            return [[] for _ in queries]
+    
+    @property
+    def nbytes(self):
+        """Approximate memory held by the index and chunk store"""
+        total = self.store.nbytes if self.store is not None else 0
+        if self.index is not None:
+            total += self.index.ntotal * self.dimension * 4
+        return total
+    
     def clear_index(self):
         """Clear the current index"""
         self.index = None
-        self.chunks = []
+        self.store = None
+        self.embeddings = None
         print("✅ Index cleared")
 
 # Global RAG engine instance
@@ -97,5 +251,109 @@ def get_rag_engine():
     """Get or create global RAG engine instance"""
     global _rag_engine
     if _rag_engine is None:
+        incr("rag_engine_cache_misses")
         _rag_engine = RAGEngine()
-    return _rag_engine
\ No newline at end of file
+    else:
+        incr("rag_engine_cache_hits")
+    return _rag_engine
+
+class IndexRegistry:
+    """Per-document RAG engines, loaded from saved ingest outputs and kept in LRU order"""
+    
+    def __init__(self, max_documents=INDEX_REGISTRY_SIZE):
+        """
+        Initialize the registry
+        
+        Args:
+            max_documents (int): Engines kept in memory before the least recently used is dropped
+        """
+        self.max_documents = max_documents
+        self._engines = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, doc_id):
+        """Get the engine for a document if it is loaded"""
+        with self._lock:
+            engine = self._engines.get(doc_id)
+            if engine is not None:
+                self._engines.move_to_end(doc_id)
+                incr("index_registry_hits")
+            return engine
+    
+    def put(self, doc_id, engine):
+        """Register an engine for a document"""
+        with self._lock:
+            self._engines[doc_id] = engine
+            self._engines.move_to_end(doc_id)
+            while len(self._engines) > self.max_documents:
+                self._engines.popitem(last=False)
+            self._update_gauges()
+    
+    def _update_gauges(self):
+        set_gauge("index_registry_documents", len(self._engines))
+        set_gauge("index_registry_bytes", sum(engine.nbytes for engine in self._engines.values()))
+    
+    def get_or_load(self, doc_id, store_path, embeddings_path):
+        """
+        Get the engine for a document, loading it from disk if needed
+        
+        Args:
+            doc_id (str): Document id (content hash)
+            store_path (str): Saved ChunkStore directory
+            embeddings_path (str): Saved embeddings (.npy)
+            
+        Returns:
+            RAGEngine: The engine, or None if loading failed
+        """
+        engine = self.get(doc_id)
+        if engine is not None:
+            return engine
+        
+        incr("index_registry_misses")
+        engine = RAGEngine()
+        store = ChunkStore.load(store_path)
+        embeddings = np.load(embeddings_path, mmap_mode="r")
+        if not engine.build_index_from_embeddings(store, embeddings):
+            return None
+        
+        self.put(doc_id, engine)
+        return engine
+    
+    def remove(self, doc_id):
+        """Drop a document's engine"""
+        with self._lock:
+            self._engines.pop(doc_id, None)
+            self._update_gauges()
+    
+    def evict_oldest(self):
+        """
+        Drop the least recently used engine (it is reloaded from disk on next use)
+        
+        Returns:
+            int: Bytes released (0 if the registry is empty)
+        """
+        with self._lock:
+            if not self._engines:
+                return 0
+            _, engine = self._engines.popitem(last=False)
+            incr("index_registry_evictions")
+            self._update_gauges()
+            return engine.nbytes
+    
+    def nbytes(self):
+        """Approximate memory held by all loaded engines"""
+        with self._lock:
+            return sum(engine.nbytes for engine in self._engines.values())
+    
+    def __len__(self):
+        return len(self._engines)
+
+# Global index registry instance
+_index_registry = None
+
+def get_index_registry():
+    """Get or create the global index registry"""
+    global _index_registry
+    if _index_registry is None:
+        _index_registry = IndexRegistry()
+    return _index_registry
\ No newline at end of file
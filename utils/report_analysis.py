@@ -0,0 +1,261 @@
+import os
+import json
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from models.llm import BATCH
+from utils.chunker import group_chunks
+from utils.chat_pipeline import build_prompt, max_tokens_for_mode
+from utils.metrics import span, incr
+from config.config import (
+    DATA_DIR, ANALYSIS_SECTION_SIZE, ANALYSIS_MAX_CONCURRENCY, ANALYSIS_REDUCE_FANIN
+)
+
+# Bump when the map/reduce prompts change so cached summaries are rebuilt
+PROMPT_VERSION = 2
+MAP_MAX_TOKENS = 400
+
+MAP_PROMPT = """You are an ESG (Environmental, Social, Governance) risk analyst reading one section of a company report.
+Summarize the ESG-relevant content of this section as concise bullet points:
+- Environmental, social and governance risks, controversies and incidents
+- Targets, commitments and metrics (with numbers and years)
+- Policies, controls and disclosures
+Cite each point as [Page N], using the [Page N] markers in the section text. Write "No ESG-relevant content." if there is none.
+
+Section (pages {first_page}-{last_page}):
+{text}
+
+Summary:"""
+
+REDUCE_PROMPT = """You are an ESG (Environmental, Social, Governance) risk analyst.
+Merge these summaries of consecutive report sections into one summary.
+Keep every distinct risk, target, metric and [Page N] citation; drop duplicates and sections without ESG content.
+
+{summaries}
+
+Merged summary:"""
+
+# One analysis per document at a time, so a second question waits for and reuses the first one's summaries
+_doc_locks = {}
+_doc_locks_guard = threading.Lock()
+
+
+def _doc_lock(doc_id):
+    with _doc_locks_guard:
+        return _doc_locks.setdefault(doc_id, threading.Lock())
+
+
+def section_text(store, start, end):
+    """
+    Text of a byte range with a [Page N] marker where each page's chunks begin
+
+    Args:
+        store (ChunkStore): Document chunks
+        start (int): Section start byte offset
+        end (int): Section end byte offset
+
+    Returns:
+        str: Section text with page markers
+    """
+    first = int(np.searchsorted(store.starts, start, side="left"))
+    last = int(np.searchsorted(store.starts, end, side="left"))
+    parts = []
+    offset, page = start, None
+    for i in range(first, last):
+        chunk_page = store.get_page(i)
+        if chunk_page is None or chunk_page == page:
+            continue
+        chunk_start = max(int(store.starts[i]), offset)
+        before = store.slice(offset, chunk_start)
+        parts.append(before)
+        # Chunks break at whitespace; keep the marker on its own line
+        parts.append(f"\n[Page {chunk_page}]\n" if before and not before.endswith("\n") else f"[Page {chunk_page}]\n")
+        offset, page = chunk_start, chunk_page
+    parts.append(store.slice(offset, end))
+    return "".join(parts)
+
+
+def split_sections(store, section_size=ANALYSIS_SECTION_SIZE):
+    """
+    Group a document's chunks into map-stage sections
+
+    Args:
+        store (ChunkStore): Document chunks
+        section_size (int): Maximum section length
+
+    Returns:
+        list: (first_page, last_page, text) per section, with [Page N] markers in the text
+    """
+    sections = []
+    for section in group_chunks(store.iter_spans(), section_size):
+        # Page of the last chunk starting inside the section
+        last = max(0, int(np.searchsorted(store.starts, section.end, side="left")) - 1)
+        first_page = section.page or "?"
+        last_page = store.get_page(last) or first_page
+        sections.append((first_page, last_page, section_text(store, section.start, section.end)))
+    return sections
+
+
+def _call_llm(llm, prompt, max_tokens):
+    """One map/reduce LLM call, scheduled as batch work; None if it failed"""
+    response = llm.generate_response(prompt, max_tokens=max_tokens, priority=BATCH)
+    if not response or response.startswith("Error:"):
+        incr("analysis_llm_errors")
+        return None
+    return response
+
+
+class SummaryCache:
+    """Map and reduce summaries of one document, stored as JSON under DATA_DIR"""
+
+    def __init__(self, doc_id, signature, path=None):
+        """
+        Initialize the cache
+
+        Args:
+            doc_id (str): Document content hash
+            signature (dict): Settings the summaries depend on; a mismatch discards the cache
+            path (str): Cache directory (defaults to DATA_DIR/analysis)
+        """
+        directory = path or os.path.join(DATA_DIR, "analysis")
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{doc_id}.json")
+        self.signature = signature
+        self.data = {"signature": signature, "map": {}, "reduced": None}
+
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("signature") == signature:
+                self.data = data
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+
+
+def map_sections(llm, sections, cache, pool, progress_callback=None):
+    """
+    Summarize every section not summarized yet, in parallel
+
+    Args:
+        llm (LLMManager): LLM to call
+        sections (list): (first_page, last_page, text) from split_sections
+        cache (SummaryCache): Summary cache, updated as sections finish
+        pool (ThreadPoolExecutor): Pool bounding concurrent calls
+        progress_callback (callable): Optional callback(progress, message)
+
+    Returns:
+        list: Section summaries in document order (failed sections left out)
+    """
+    summaries = cache.data["map"]
+    missing = [i for i in range(len(sections)) if str(i) not in summaries]
+    incr("analysis_map_cache_hits", len(sections) - len(missing))
+
+    def summarize(i):
+        first_page, last_page, text = sections[i]
+        prompt = MAP_PROMPT.format(first_page=first_page, last_page=last_page, text=text)
+        return i, _call_llm(llm, prompt, MAP_MAX_TOKENS)
+
+    with span("analysis_map", sections=len(missing)):
+        for done, (i, summary) in enumerate(pool.map(summarize, missing), 1):
+            if summary is not None:
+                summaries[str(i)] = summary
+                cache.save()
+            if progress_callback:
+                progress_callback(5 + int(75 * done / len(missing)), f"📄 Summarized {done}/{len(missing)} sections...")
+
+    return [summaries[str(i)] for i in range(len(sections)) if str(i) in summaries]
+
+
+def reduce_summaries(llm, summaries, pool, fanin=ANALYSIS_REDUCE_FANIN):
+    """
+    Merge summaries level by level until at most fanin remain
+
+    Args:
+        llm (LLMManager): LLM to call
+        summaries (list): Section summaries in document order
+        pool (ThreadPoolExecutor): Pool bounding concurrent calls
+        fanin (int): Summaries merged per call
+
+    Returns:
+        list: Remaining summaries
+    """
+    def merge(group):
+        if len(group) == 1:
+            return group[0]
+        merged = _call_llm(llm, REDUCE_PROMPT.format(summaries="\n\n---\n\n".join(group)), MAP_MAX_TOKENS)
+        # On failure keep the inputs' content rather than losing it
+        return merged if merged is not None else "\n\n".join(group)
+
+    with span("analysis_reduce", summaries=len(summaries)):
+        while len(summaries) > fanin:
+            groups = [summaries[i:i + fanin] for i in range(0, len(summaries), fanin)]
+            summaries = list(pool.map(merge, groups))
+    return summaries
+
+
+def analyze_report(question, llm, store, doc_id, response_mode="Concise", progress_callback=None):
+    """
+    Answer a question from the whole report: map sections to summaries, reduce, then answer
+
+    Map and reduce summaries are cached per document, so later questions only
+    pay for the final answer.
+
+    Args:
+        question (str): User query
+        llm (LLMManager): LLM to call
+        store (ChunkStore): Document chunks
+        doc_id (str): Document content hash
+        response_mode (str): "Concise" or "Detailed"
+        progress_callback (callable): Optional callback(progress, message)
+
+    Returns:
+        str: Answer
+    """
+    signature = {
+        "prompt_version": PROMPT_VERSION,
+        "section_size": ANALYSIS_SECTION_SIZE,
+        "fanin": ANALYSIS_REDUCE_FANIN,
+        "model": llm.get_provider_info().get("model"),
+    }
+
+    with span("analysis", mode=response_mode), _doc_lock(doc_id):
+        cache = SummaryCache(doc_id, signature)
+
+        if cache.data["reduced"] is None:
+            sections = split_sections(store)
+            if progress_callback:
+                progress_callback(5, f"📚 Reading {len(sections)} report sections...")
+
+            with ThreadPoolExecutor(max_workers=ANALYSIS_MAX_CONCURRENCY, thread_name_prefix="esg-analysis") as pool:
+                summaries = map_sections(llm, sections, cache, pool, progress_callback)
+                if not summaries:
+                    return "Error: Could not summarize the report. Please try again."
+
+                if progress_callback:
+                    progress_callback(80, "🧩 Combining section summaries...")
+                reduced = reduce_summaries(llm, summaries, pool)
+
+            # Only cache a complete reduction; failed sections are retried next time
+            if len(summaries) == len(sections):
+                cache.data["reduced"] = reduced
+                cache.save()
+        else:
+            incr("analysis_reduce_cache_hits")
+            reduced = cache.data["reduced"]
+
+        if progress_callback:
+            progress_callback(95, "✍️ Writing the answer...")
+
+        context_parts = ["=== Report Section Summaries ===", "\n\n".join(reduced)]
+        prompt = build_prompt(question, context_parts, response_mode)
+        answer = llm.generate_response(prompt, max_tokens=max_tokens_for_mode(response_mode))
+
+        if progress_callback:
+            progress_callback(100, "✅ Analysis complete!")
+        return answer
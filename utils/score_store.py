@@ -0,0 +1,348 @@
+import os
+import re
+import json
+import glob
+import threading
+from contextlib import contextmanager
+import numpy as np
+from config.config import DATA_DIR, PEER_TOP_N
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes are only serialized within the process
+    fcntl = None
+
+CATEGORIES = ["environmental", "social", "governance"]
+SCORE_COLUMNS = ["overall"] + CATEGORIES
+
+# One memory-mapped .npy file per column; company and sector are dictionary-encoded
+COLUMNS = {
+    "doc_id": "S64",
+    "company": np.int32,
+    "sector": np.int32,
+    "year": np.int16,
+    "overall": np.float32,
+    **{category: np.float32 for category in CATEGORIES},
+    **{f"{category}_{sentiment}": np.int32 for category in CATEGORIES for sentiment in ("positive", "negative")},
+}
+
+_SIGNAL_COUNT = re.compile(r"\((\d+)x\)$")
+
+
+def count_signals(signals):
+    """Total keyword matches in signals like "net zero (3x)" """
+    total = 0
+    for signal in signals:
+        match = _SIGNAL_COUNT.search(signal)
+        total += int(match.group(1)) if match else 1
+    return total
+
+
+def normalize_sector(sector):
+    """Sector key used for peer grouping"""
+    return (sector or "").strip().lower()
+
+
+class ScoreStore:
+    """
+    Persistent columnar store of per-document ESG scores for peer comparisons
+
+    Each write produces a new version of the column files and then swaps
+    meta.json, so readers (also in other processes) never see a half-written
+    table and pick up the new version on their next query. Writers in
+    different processes take turns through an flock on a lock file.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initialize the score store
+
+        Args:
+            path (str): Directory for the column files (defaults to DATA_DIR/scores)
+        """
+        self.path = path or os.path.join(DATA_DIR, "scores")
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._version = None
+        self._columns = {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._companies = []
+        self._sectors = []
+
+    def _meta_path(self):
+        return os.path.join(self.path, "meta.json")
+
+    def _column_path(self, name, version):
+        return os.path.join(self.path, f"{name}-{version}.npy")
+
+    @contextmanager
+    def _write_lock(self):
+        """Hold the cross-process write lock for a read-modify-write"""
+        with open(os.path.join(self.path, ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self, retries=5):
+        """Map the latest column files if another writer has produced a new version"""
+        for _ in range(retries):
+            try:
+                with open(self._meta_path()) as f:
+                    meta = json.load(f)
+            except FileNotFoundError:
+                return
+            if meta["version"] == self._version:
+                return
+
+            try:
+                columns = {
+                    name: np.load(self._column_path(name, meta["version"]), mmap_mode="r")
+                    for name in COLUMNS
+                } if meta["rows"] else None
+            except FileNotFoundError:
+                # A writer replaced this version after we read meta.json; read it again
+                continue
+            break
+        else:
+            raise RuntimeError(f"Score store at {self.path} kept changing while loading")
+
+        if columns is not None:
+            self._columns = columns
+        self._companies = meta["companies"]
+        self._sectors = meta["sectors"]
+        self._version = meta["version"]
+
+    def _save(self, columns):
+        """
+        Write a new version of every column, then publish it through meta.json
+
+        The caller holds the write lock and has refreshed under it, so
+        self._version is the latest published version.
+        """
+        version = (self._version or 0) + 1
+        for name, values in columns.items():
+            np.save(self._column_path(name, version), values)
+
+        meta = {
+            "version": version,
+            "rows": len(columns["doc_id"]),
+            "companies": self._companies,
+            "sectors": self._sectors,
+        }
+        tmp_path = self._meta_path() + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path())
+
+        # Old versions may still be mapped by readers; removal can fail on Windows
+        for old in glob.glob(os.path.join(self.path, f"*-{self._version}.npy")):
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+        self._version = None
+        self._refresh()
+
+    def version(self):
+        """Current table version; changes whenever a score is added"""
+        with self._lock:
+            self._refresh()
+            return self._version
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._columns["doc_id"])
+
+    def add(self, doc_id, scores, company="", sector="", year=0):
+        """
+        Record (or replace) a document's scores
+
+        Re-scoring a document replaces its scores. Company, sector and year
+        are only replaced when given, so a blank keeps the recorded value.
+
+        Args:
+            doc_id (str): Document content hash
+            scores (dict): Result of calculate_overall_esg_score
+            company (str): Company name
+            sector (str): Sector, used to group peers
+            year (int): Report year (0 if unknown)
+        """
+        with self._lock, self._write_lock():
+            # Re-read under the lock so rows written by other processes are kept
+            self._refresh()
+
+            company = (company or "").strip()
+            sector = normalize_sector(sector)
+            year = int(year or 0)
+            for values, value in ((self._companies, company), (self._sectors, sector)):
+                if value not in values:
+                    values.append(value)
+
+            row = {
+                "doc_id": doc_id.encode(),
+                "company": self._companies.index(company),
+                "sector": self._sectors.index(sector),
+                "year": year,
+                "overall": scores["overall_score"],
+            }
+            for category in CATEGORIES:
+                row[category] = scores[category]["score"]
+                row[f"{category}_positive"] = count_signals(scores[category]["positive_signals"])
+                row[f"{category}_negative"] = count_signals(scores[category]["negative_signals"])
+
+            columns = {name: np.array(values) for name, values in self._columns.items()}
+            existing = np.flatnonzero(columns["doc_id"] == row["doc_id"])
+            if existing.size:
+                blank = {name for name, value in (("company", company), ("sector", sector), ("year", year)) if not value}
+                for name in COLUMNS:
+                    if name not in blank:
+                        columns[name][existing[0]] = row[name]
+            else:
+                columns = {
+                    name: np.append(columns[name], np.array([row[name]], dtype=dtype))
+                    for name, dtype in COLUMNS.items()
+                }
+
+            self._save(columns)
+
+    def _mask(self, sector=None, year=None, exclude_doc_id=None):
+        """Boolean row mask for a peer group"""
+        columns = self._columns
+        mask = np.ones(len(columns["doc_id"]), dtype=bool)
+        if sector:
+            sector = normalize_sector(sector)
+            code = self._sectors.index(sector) if sector in self._sectors else -1
+            mask &= columns["sector"] == code
+        if year:
+            mask &= columns["year"] == int(year)
+        if exclude_doc_id:
+            mask &= columns["doc_id"] != exclude_doc_id.encode()
+        return mask
+
+    def percentile_rank(self, value, column="overall", sector=None, year=None, exclude_doc_id=None):
+        """
+        Percentile rank of a score within a peer group
+
+        Args:
+            value (float): Score to rank
+            column (str): "overall", "environmental", "social" or "governance"
+            sector (str): Only peers in this sector (optional)
+            year (int): Only peers from this report year (optional)
+            exclude_doc_id (str): Leave this document out, e.g. the one being ranked
+
+        Returns:
+            tuple: (percentile 0-100 or None without peers, peer count)
+        """
+        with self._lock:
+            self._refresh()
+            peers = self._columns[column][self._mask(sector, year, exclude_doc_id)]
+        if not len(peers):
+            return None, 0
+        value = np.float32(value)
+        below = np.count_nonzero(peers < value)
+        equal = np.count_nonzero(peers == value)
+        return round(100.0 * (below + 0.5 * equal) / len(peers), 1), len(peers)
+
+    def top_peers(self, column="overall", n=PEER_TOP_N, sector=None, year=None, exclude_doc_id=None):
+        """
+        Highest-scoring documents in a peer group
+
+        Args:
+            column (str): Score column to rank by
+            n (int): Number of peers to return
+            sector, year, exclude_doc_id: Peer group filters as for percentile_rank
+
+        Returns:
+            list: Dicts with "company", "sector", "year" and "score", best first
+        """
+        with self._lock:
+            self._refresh()
+            rows = np.flatnonzero(self._mask(sector, year, exclude_doc_id))
+            values = np.asarray(self._columns[column][rows])
+            if len(rows) > n:
+                best = np.argpartition(-values, n)[:n]
+                rows, values = rows[best], values[best]
+            order = np.argsort(-values, kind="stable")
+
+            return [
+                {
+                    "company": self._companies[self._columns["company"][rows[i]]],
+                    "sector": self._sectors[self._columns["sector"][rows[i]]],
+                    "year": int(self._columns["year"][rows[i]]),
+                    "score": round(float(values[i]), 2),
+                }
+                for i in order
+            ]
+
+    def company_history(self, company):
+        """
+        All recorded scores of a company, oldest report first
+
+        Args:
+            company (str): Company name as recorded
+
+        Returns:
+            list: Dicts with "year" and one entry per score column
+        """
+        with self._lock:
+            self._refresh()
+            company = (company or "").strip()
+            if company not in self._companies:
+                return []
+            rows = np.flatnonzero(self._columns["company"] == self._companies.index(company))
+            rows = rows[np.argsort(self._columns["year"][rows], kind="stable")]
+            return [
+                {
+                    "year": int(self._columns["year"][row]),
+                    **{column: round(float(self._columns[column][row]), 2) for column in SCORE_COLUMNS},
+                }
+                for row in rows
+            ]
+
+    def peer_stats(self, scores, sector=None, year=None, exclude_doc_id=None, top_n=PEER_TOP_N):
+        """
+        Peer comparison of a scored document, for generate_score_summary
+
+        Args:
+            scores (dict): Result of calculate_overall_esg_score
+            sector (str): Peer sector (optional)
+            year (int): Peer report year (optional)
+            exclude_doc_id (str): The scored document itself
+            top_n (int): Top peers to list
+
+        Returns:
+            dict: "peers", "sector", "year", "percentiles" and "top_peers", or None without peers
+        """
+        values = {"overall": scores["overall_score"], **{c: scores[c]["score"] for c in CATEGORIES}}
+        percentiles = {}
+        peers = 0
+        for column, value in values.items():
+            percentiles[column], peers = self.percentile_rank(value, column, sector, year, exclude_doc_id)
+        if not peers:
+            return None
+
+        return {
+            "peers": peers,
+            "sector": normalize_sector(sector) or None,
+            "year": int(year) if year else None,
+            "percentiles": percentiles,
+            "top_peers": self.top_peers("overall", top_n, sector, year, exclude_doc_id),
+        }
+
+
+# Global score store instance
+_score_store = None
+_score_store_lock = threading.Lock()
+
+def get_score_store():
+    """Get or create the global score store"""
+    global _score_store
+    with _score_store_lock:
+        if _score_store is None:
+            _score_store = ScoreStore()
+    return _score_store
@@ -0,0 +1,428 @@
+import os
+import json
+import time
+import glob
+import threading
+from collections import OrderedDict
+from utils.chunk_store import ChunkStore
+from utils.conversation_memory import ConversationMemory
+from utils.metrics import incr, set_gauge
+from config.config import (
+    DATA_DIR, SESSION_MEMORY_BUDGET_MB, SESSION_GLOBAL_MEMORY_BUDGET_MB,
+    SESSION_IDLE_SECONDS, SESSION_RETENTION_SECONDS, SESSION_MIN_MESSAGES
+)
+
+MB = 1024 * 1024
+# Rough per-object overhead of a message dict and its strings
+MESSAGE_OVERHEAD = 400
+
+
+def message_nbytes(message):
+    """Approximate memory held by one chat message"""
+    return len(message["content"].encode("utf-8")) + MESSAGE_OVERHEAD
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class SessionState:
+    """
+    Heavy state of one chat session: message history, conversation memory, ESG score and chunk store
+
+    The state can be spilled to disk while the session is idle and is loaded
+    back on the next access. Messages beyond the session budget are moved to
+    an archive file and read only when asked for.
+    """
+
+    def __init__(self, session_id, path):
+        """
+        Initialize the session state
+
+        Args:
+            session_id (str): Session id
+            path (str): Directory for spill and archive files
+        """
+        self.session_id = session_id
+        self.spill_path = os.path.join(path, f"{session_id}.json")
+        self.archive_path = os.path.join(path, f"{session_id}.archive.jsonl")
+        self.last_active = time.time()
+        self.evicted = False
+        self.archived = 0  # Messages moved to the archive file
+        self.store_path = None
+        self._messages = []
+        self._esg_score = None
+        self._conversation = ConversationMemory()
+        self._chunk_store = None
+        self._sized = (0, 0)  # (messages, bytes) already measured; history only grows at the end
+        self._lock = threading.RLock()
+
+        if os.path.exists(self.spill_path):
+            # Spilled by an earlier process (e.g. before a restart)
+            self.evicted = True
+
+    def _reload(self):
+        """Load spilled state back into memory"""
+        if not self.evicted:
+            return
+        try:
+            with open(self.spill_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"❌ Error reloading session: {e}")
+            data = {}
+        self._messages = data.get("messages", [])
+        self._esg_score = data.get("esg_score")
+        self._conversation = ConversationMemory.from_dict(data.get("conversation", {}))
+        self.store_path = data.get("store_path")
+        self.archived = data.get("archived", 0)
+        self._sized = (0, 0)
+        self.evicted = False
+        incr("session_reloads")
+
+    @property
+    def messages(self):
+        """Recent chat messages (list of {"role", "content"}), reloaded if spilled"""
+        with self._lock:
+            self._reload()
+            return self._messages
+
+    @property
+    def esg_score(self):
+        with self._lock:
+            self._reload()
+            return self._esg_score
+
+    @esg_score.setter
+    def esg_score(self, score):
+        with self._lock:
+            self._reload()
+            self._esg_score = score
+
+    @property
+    def conversation(self):
+        """Bounded history (recent turns and rolling summary) sent with prompts"""
+        with self._lock:
+            self._reload()
+            return self._conversation
+
+    @property
+    def chunk_store(self):
+        """Chunk store of the session's document, memory-mapped from store_path on demand"""
+        with self._lock:
+            self._reload()
+            if self._chunk_store is None and self.store_path:
+                self._chunk_store = ChunkStore.load(self.store_path)
+            return self._chunk_store
+
+    def set_document(self, store_path, store=None):
+        """
+        Switch the session to a document
+
+        Args:
+            store_path (str): Saved ChunkStore directory (None to clear)
+            store (ChunkStore): Already loaded store (optional)
+        """
+        with self._lock:
+            self._reload()
+            self.store_path = store_path
+            self._chunk_store = store
+
+    def clear_messages(self):
+        """Drop the chat history, including archived messages"""
+        with self._lock:
+            self._reload()
+            self._messages.clear()
+            self._conversation.clear()
+            self._sized = (0, 0)
+            self.archived = 0
+            try:
+                os.remove(self.archive_path)
+            except FileNotFoundError:
+                pass
+
+    def archived_messages(self):
+        """Messages moved to the archive file, oldest first"""
+        with self._lock:
+            try:
+                with open(self.archive_path) as f:
+                    return [json.loads(line) for line in f if line.strip()]
+            except (OSError, ValueError):
+                return []
+
+    def _messages_nbytes(self):
+        """Size of the in-memory history, measuring only messages added since the last call"""
+        count, total = self._sized
+        if count > len(self._messages):
+            count, total = 0, 0
+        total += sum(message_nbytes(m) for m in self._messages[count:])
+        self._sized = (len(self._messages), total)
+        return total
+
+    def memory_usage(self):
+        """
+        Approximate memory held in this process
+
+        Returns:
+            dict: Bytes per component ("messages", "conversation", "esg_score", "chunk_store")
+        """
+        with self._lock:
+            if self.evicted:
+                return {"messages": 0, "conversation": 0, "esg_score": 0, "chunk_store": 0}
+            conversation = self._conversation
+            return {
+                "messages": self._messages_nbytes(),
+                "conversation": len(conversation.summary) + sum(len(u) + len(a) for u, a in conversation.turns),
+                "esg_score": len(json.dumps(self._esg_score)) if self._esg_score else 0,
+                "chunk_store": self._chunk_store.nbytes if self._chunk_store is not None else 0,
+            }
+
+    def nbytes(self):
+        return sum(self.memory_usage().values())
+
+    def archive_messages(self, budget):
+        """
+        Move the oldest messages to the archive file until the history fits the budget
+
+        The most recent SESSION_MIN_MESSAGES messages always stay in memory.
+
+        Args:
+            budget (int): Bytes allowed for the in-memory history
+
+        Returns:
+            int: Bytes released
+        """
+        with self._lock:
+            if self.evicted or self._messages_nbytes() <= budget:
+                return 0
+            sizes = [message_nbytes(m) for m in self._messages]
+            total = sum(sizes)
+            count = 0
+            while total > budget and len(sizes) - count > SESSION_MIN_MESSAGES:
+                total -= sizes[count]
+                count += 1
+            if not count:
+                return 0
+
+            with open(self.archive_path, "a") as f:
+                for message in self._messages[:count]:
+                    f.write(json.dumps(message) + "\n")
+            del self._messages[:count]
+            self._sized = (len(self._messages), total)
+            self.archived += count
+            incr("session_messages_archived", count)
+            return sum(sizes[:count])
+
+    def spill(self):
+        """
+        Write the state to disk and release it from memory
+
+        Returns:
+            int: Bytes released
+        """
+        with self._lock:
+            if self.evicted or self._conversation.pending():
+                # A session mid-summary is spilled on a later pass
+                return 0
+            released = self.nbytes()
+            _write_json(self.spill_path, {
+                "messages": self._messages,
+                "esg_score": self._esg_score,
+                "conversation": self._conversation.to_dict(),
+                "store_path": self.store_path,
+                "archived": self.archived,
+            })
+            self._messages = []
+            self._esg_score = None
+            self._conversation = ConversationMemory()
+            self._chunk_store = None
+            self._sized = (0, 0)
+            self.evicted = True
+            incr("session_evictions")
+            return released
+
+    def delete(self):
+        """Remove the session's files"""
+        for path in (self.spill_path, self.archive_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class SessionManager:
+    """
+    Memory accounting for chat sessions
+
+    Each session stays within its own budget by archiving old messages.
+    Sessions idle for longer than idle_seconds, and the least recently active
+    ones while sessions plus loaded document indexes exceed the global budget,
+    are spilled to disk and reloaded transparently on their next access.
+    """
+
+    def __init__(self, path=None, session_budget_mb=SESSION_MEMORY_BUDGET_MB,
+                 global_budget_mb=SESSION_GLOBAL_MEMORY_BUDGET_MB, idle_seconds=SESSION_IDLE_SECONDS,
+                 index_registry=None):
+        """
+        Initialize the session manager
+
+        Args:
+            path (str): Directory for spilled sessions (defaults to DATA_DIR/sessions)
+            session_budget_mb (float): Memory allowed per session
+            global_budget_mb (float): Memory allowed for all sessions and document indexes
+            idle_seconds (int): Inactivity before a session is spilled
+            index_registry (IndexRegistry): Loaded document indexes counted against the global budget
+        """
+        self.path = path or os.path.join(DATA_DIR, "sessions")
+        os.makedirs(self.path, exist_ok=True)
+        self.session_budget = int(session_budget_mb * MB)
+        self.global_budget = int(global_budget_mb * MB)
+        self.idle_seconds = idle_seconds
+        self.index_registry = index_registry
+        self._sessions = OrderedDict()  # Least recently active first
+        self._lock = threading.Lock()
+        self._remove_expired()
+
+    def _remove_expired(self):
+        """Delete spill files of sessions that never came back"""
+        cutoff = time.time() - SESSION_RETENTION_SECONDS
+        for path in glob.glob(os.path.join(self.path, "*.json*")):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, session_id):
+        """
+        Get a session's state and mark it active
+
+        Args:
+            session_id (str): Session id
+
+        Returns:
+            SessionState: The state (spilled state is reloaded on first access)
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = SessionState(session_id, self.path)
+            self._sessions.move_to_end(session_id)
+            session.last_active = time.time()
+            return session
+
+    def remove(self, session_id):
+        """Forget a session and delete its files"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.delete()
+
+    def enforce(self, current=None):
+        """
+        Apply the per-session and global budgets
+
+        Call at the end of each request; the current session is never spilled.
+
+        Args:
+            current (str): Id of the session being served
+        """
+        now = time.time()
+        with self._lock:
+            sessions = list(self._sessions.values())
+
+        for session in sessions:
+            session.archive_messages(self.session_budget)
+
+        idle_cutoff = now - self.idle_seconds
+        retention_cutoff = now - SESSION_RETENTION_SECONDS
+        for session in sessions:
+            if session.session_id == current:
+                continue
+            if session.last_active < retention_cutoff:
+                self.remove(session.session_id)
+            elif session.last_active < idle_cutoff:
+                session.spill()
+
+        # Over the global budget: spill the least recently active sessions, then drop indexes
+        total = self.total_bytes()
+        for session in sessions:
+            if total <= self.global_budget:
+                break
+            if session.session_id != current:
+                total -= session.spill()
+        while total > self.global_budget and self.index_registry is not None and len(self.index_registry) > 1:
+            total -= self.index_registry.evict_oldest()
+
+        self.memory_report()
+
+    def total_bytes(self):
+        """Memory held by all sessions and loaded document indexes"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        total = sum(session.nbytes() for session in sessions)
+        if self.index_registry is not None:
+            total += self.index_registry.nbytes()
+        return total
+
+    def memory_report(self):
+        """
+        Memory held by sessions and document indexes, also published as metrics gauges
+
+        Returns:
+            dict: Totals by component, session counts, budgets and the largest sessions
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+
+        components = {"messages": 0, "conversation": 0, "esg_score": 0, "chunk_store": 0}
+        per_session = []
+        for session in sessions:
+            usage = session.memory_usage()
+            for name, value in usage.items():
+                components[name] += value
+            per_session.append({
+                "session_id": session.session_id,
+                "bytes": sum(usage.values()),
+                "evicted": session.evicted,
+                "archived_messages": session.archived,
+                "idle_seconds": round(time.time() - session.last_active, 1),
+            })
+        per_session.sort(key=lambda entry: entry["bytes"], reverse=True)
+
+        index_bytes = self.index_registry.nbytes() if self.index_registry is not None else 0
+        evicted = sum(1 for entry in per_session if entry["evicted"])
+        report = {
+            "total_bytes": sum(components.values()) + index_bytes,
+            "session_bytes": components,
+            "index_bytes": index_bytes,
+            "sessions": len(per_session),
+            "sessions_evicted": evicted,
+            "session_budget_bytes": self.session_budget,
+            "global_budget_bytes": self.global_budget,
+            "largest_sessions": per_session[:5],
+        }
+
+        for name, value in components.items():
+            set_gauge(f"session_{name}_bytes", value)
+        set_gauge("session_memory_bytes", report["total_bytes"])
+        set_gauge("sessions_in_memory", len(per_session) - evicted)
+        set_gauge("sessions_evicted", evicted)
+        return report
+
+
+# Global session manager instance
+_session_manager = None
+_session_manager_lock = threading.Lock()
+
+def get_session_manager():
+    """Get or create the global session manager"""
+    global _session_manager
+    with _session_manager_lock:
+        if _session_manager is None:
+            from utils.rag_engine import get_index_registry
+            _session_manager = SessionManager(index_registry=get_index_registry())
+    return _session_manager
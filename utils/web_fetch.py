@@ -0,0 +1,315 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+from html.parser import HTMLParser
+from collections import OrderedDict
+from urllib.parse import urlparse
+from models.embeddings import get_embedding_model
+from utils.chunker import iter_chunks
+from utils.chunk_store import ChunkStore
+from utils.rag_engine import embed_store
+from utils.metrics import timed, incr
+from config.config import (
+    DATA_DIR, TOP_K_RESULTS, WEB_FETCH_MAX_CONCURRENCY, WEB_FETCH_TIMEOUT,
+    WEB_FETCH_MAX_BYTES, WEB_CACHE_TTL, WEB_EMBEDDING_CACHE_SIZE
+)
+
+USER_AGENT = "Mozilla/5.0 (compatible; ESG-Risk-Assistant/1.0)"
+TEXT_CONTENT_TYPES = {"text/html", "application/xhtml+xml", "text/plain"}
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text, one line per block element"""
+
+    SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form"}
+    BLOCK_TAGS = {
+        "p", "div", "section", "article", "main", "li", "ul", "ol", "br", "tr", "table",
+        "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "dd", "dt",
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(_WHITESPACE.sub(" ", data))
+
+
+def extract_text(html):
+    """
+    Extract readable text from an HTML page
+
+    Args:
+        html (str): Page source
+
+    Returns:
+        str: Visible text without scripts, styles and navigation, one block per line
+    """
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        print(f"❌ Error parsing HTML: {e}")
+    lines = (line.strip() for line in "".join(parser.parts).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+class PageCache:
+    """Per-URL page text cache on disk, revalidated with ETag / Last-Modified after its TTL"""
+
+    def __init__(self, path=None, ttl=WEB_CACHE_TTL):
+        """
+        Initialize the page cache
+
+        Args:
+            path (str): Cache directory (defaults to DATA_DIR/web_cache)
+            ttl (int): Seconds a cached page is served without asking the server
+        """
+        self.path = path or os.path.join(DATA_DIR, "web_cache")
+        self.ttl = ttl
+        os.makedirs(self.path, exist_ok=True)
+
+    def _entry_path(self, url):
+        return os.path.join(self.path, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url):
+        """Cached entry for a URL (fresh or stale), or None"""
+        try:
+            with open(self._entry_path(url)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url, entry):
+        """Store an entry, replacing the file atomically"""
+        path = self._entry_path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.ttl
+
+
+def fetch_page(url, cache=None, timeout=WEB_FETCH_TIMEOUT, max_bytes=WEB_FETCH_MAX_BYTES):
+    """
+    Fetch one page and extract its text, using the cache when possible
+
+    Args:
+        url (str): http(s) URL
+        cache (PageCache): Page cache (optional)
+        timeout (float): Request timeout in seconds
+        max_bytes (int): Maximum body bytes read
+
+    Returns:
+        dict: "url", "text", "etag", "last_modified" and "fetched_at", or None on failure
+    """
+    if urlparse(url).scheme not in ("http", "https"):
+        return None
+
+    entry = cache.get(url) if cache else None
+    if entry and cache.is_fresh(entry):
+        incr("web_cache_hits")
+        return entry
+
+    headers = {"User-Agent": USER_AGENT}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        request = urllib.request.Request(url, headers=headers)
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            content_type = response.headers.get_content_type()
+            if content_type not in TEXT_CONTENT_TYPES:
+                incr("web_fetch_skipped")
+                return None
+            body = response.read(max_bytes)
+            charset = response.headers.get_content_charset() or "utf-8"
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and entry:
+            # Unchanged since we cached it
+            incr("web_cache_revalidated")
+            entry["fetched_at"] = time.time()
+            cache.put(url, entry)
+            return entry
+        incr("web_fetch_errors")
+        print(f"❌ Error fetching {url}: {e}")
+        return None
+    except Exception as e:
+        incr("web_fetch_errors")
+        print(f"❌ Error fetching {url}: {e}")
+        return None
+
+    try:
+        html = body.decode(charset, errors="replace")
+    except LookupError:
+        # Charset Python doesn't know (e.g. "unknown-8bit")
+        html = body.decode("utf-8", errors="replace")
+    text = html.strip() if content_type == "text/plain" else extract_text(html)
+    entry = {
+        "url": url,
+        "text": text,
+        "etag": etag,
+        "last_modified": last_modified,
+        "fetched_at": time.time(),
+    }
+    if cache:
+        cache.put(url, entry)
+    incr("web_pages_fetched")
+    return entry
+
+
+async def fetch_pages_async(urls, cache=None, max_concurrency=WEB_FETCH_MAX_CONCURRENCY):
+    """
+    Fetch pages concurrently with at most max_concurrency requests in flight
+
+    Args:
+        urls (list): Page URLs (duplicates are fetched once)
+        cache (PageCache): Page cache (optional)
+        max_concurrency (int): Concurrent requests
+
+    Returns:
+        list: Entries of pages with text, in URL order
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch_one(url):
+        async with semaphore:
+            return await asyncio.to_thread(fetch_page, url, cache)
+
+    pages = await asyncio.gather(*(fetch_one(url) for url in dict.fromkeys(urls)))
+    return [page for page in pages if page and page["text"]]
+
+
+@timed("fetch")
+def fetch_pages(urls, cache=None, max_concurrency=WEB_FETCH_MAX_CONCURRENCY):
+    """
+    Fetch pages concurrently from synchronous code (e.g. the chat pipeline)
+
+    Args:
+        urls (list): Page URLs
+        cache (PageCache): Page cache (defaults to the global one)
+        max_concurrency (int): Concurrent requests
+
+    Returns:
+        list: Entries of pages with text
+    """
+    return asyncio.run(fetch_pages_async(urls, cache or get_page_cache(), max_concurrency))
+
+
+# Chunk embeddings of fetched pages, keyed by page content
+_page_embeddings = OrderedDict()
+_page_embeddings_lock = threading.Lock()
+
+
+def embed_page(page, embedding_model=None):
+    """
+    Chunk a fetched page and embed its chunks, reusing earlier work for unchanged pages
+
+    Args:
+        page (dict): Entry from fetch_page
+        embedding_model (EmbeddingModel): Model to use (defaults to the global one)
+
+    Returns:
+        tuple: (ChunkStore, np.ndarray embeddings), or (None, None) if embedding failed
+    """
+    key = hashlib.sha256(page["text"].encode("utf-8")).hexdigest()
+    with _page_embeddings_lock:
+        if key in _page_embeddings:
+            _page_embeddings.move_to_end(key)
+            incr("web_embedding_cache_hits")
+            return _page_embeddings[key]
+
+    store = ChunkStore.from_spans(page["text"], list(iter_chunks(page["text"])))
+    embeddings = embed_store(store, embedding_model=embedding_model)
+    if embeddings is None:
+        return None, None
+
+    with _page_embeddings_lock:
+        _page_embeddings[key] = (store, embeddings)
+        while len(_page_embeddings) > WEB_EMBEDDING_CACHE_SIZE:
+            _page_embeddings.popitem(last=False)
+    return store, embeddings
+
+
+@timed("web_retrieve")
+def retrieve_from_pages(query, pages, top_k=TOP_K_RESULTS, embedding_model=None):
+    """
+    Retrieve the page chunks closest to a query
+
+    Distances are squared L2 like the FAISS document index, so the results
+    can be merged with RAGEngine.retrieve_with_metadata results.
+
+    Args:
+        query (str): Search query
+        pages (list): Entries from fetch_pages
+        top_k (int): Number of results to return
+        embedding_model (EmbeddingModel): Model to use (defaults to the global one)
+
+    Returns:
+        list: Dicts with "text", "page" (None), "source", "index" and "distance"
+    """
+    embedding_model = embedding_model or get_embedding_model()
+    query_embedding = embedding_model.encode_text(query)
+    if query_embedding is None:
+        return []
+
+    results = []
+    for page in pages:
+        store, embeddings = embed_page(page, embedding_model)
+        if not store:
+            continue
+        distances = ((np.asarray(embeddings) - query_embedding) ** 2).sum(axis=1)
+        for idx in np.argsort(distances)[:top_k]:
+            results.append({
+                "text": store[idx],
+                "page": None,
+                "source": page["url"],
+                "index": int(idx),
+                "distance": float(distances[idx]),
+            })
+
+    results.sort(key=lambda result: result["distance"])
+    return results[:top_k]
+
+
+# Global page cache instance
+_page_cache = None
+
+def get_page_cache():
+    """Get or create the global page cache"""
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = PageCache()
+    return _page_cache
@@ -1,6 +1,8 @@
 from duckduckgo_search import DDGS
 import time
+from utils.metrics import timed, incr
 
+@timed("search")
 def search_web(query, max_results=5):
     """
     Search the web using DuckDuckGo
@@ -28,10 +30,12 @@ def search_web(query, max_results=5):
                 # Small delay to avoid rate limiting
                 time.sleep(0.5)
             
+            incr("search_results", len(results))
             print(f"✅ Found {len(results)} search results")
             return results
             
     except Exception as e:
+        incr("search_errors")
         print(f"❌ Error searching web: {e}")
         return []
 